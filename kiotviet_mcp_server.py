@@ -1,514 +1,50 @@
 """
 KiotViet MCP Server - FastMCP implementation
 Stateless: receives access_token and retailer from Culi, no session management.
+Tools live in the kv_tools package, one module per group; this module loads the
+groups, defines resources and prompts, and runs the server.
 
 KiotViet MCP Server - Triển khai FastMCP
 Stateless: nhận access_token và retailer từ Culi, không quản lý phiên.
+Các tool nằm trong package kv_tools, mỗi nhóm một module; module này tải các
+nhóm, định nghĩa resources và prompts, và chạy server.
 """
-from fastmcp import FastMCP
-from fastmcp.prompts.prompt import PromptMessage, TextContent
-from typing import Optional, List, Dict, Any
-from kv_client import KiotVietClient
-
-# Initialize FastMCP server / Khởi tạo FastMCP server
-mcp = FastMCP(name="kiotviet-mcp")
-
-
-def _create_client(access_token: str, retailer: str) -> KiotVietClient:
-    """
-    Create KiotVietClient from access_token and retailer.
-    Tạo KiotVietClient từ access_token và retailer.
-    
-    Args:
-        access_token: OAuth2 access token (obtained by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: Retailer name (tên gian hàng)
-    
-    Returns:
-        KiotVietClient instance / Instance KiotVietClient
-    """
-    return KiotVietClient(access_token=access_token, retailer=retailer)
-
-
-# ============================================================================
-# Product Tools / Công cụ Sản phẩm
-# ============================================================================
-
-@mcp.tool
-def kv_list_products(
-    access_token: str,
-    retailer: str,
-    page_size: int = 50,
-    current_item: int = 0,
-    name: Optional[str] = None,
-    category_id: Optional[int] = None,
-    include_inventory: bool = True,
-    order_by: Optional[str] = None,
-    order_direction: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
-    Get list of KiotViet products.
-    Lấy danh sách sản phẩm KiotViet.
-    Used when agent wants to look up products, reports, price consultation, inventory, etc.
-    Dùng khi agent muốn tra cứu hàng hóa, báo cáo, tư vấn giá, tồn kho,...
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        page_size: Number of items per page (default 50, max 100) / Số items trong 1 trang (mặc định 50, tối đa 100)
-        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
-        name: Search by product name / Tìm kiếm theo tên sản phẩm
-        category_id: Filter by category ID / Lọc theo ID nhóm hàng
-        include_inventory: Whether to include inventory information / Có lấy thông tin tồn kho hay không
-        order_by: Sort by field (e.g., "name", "code") / Sắp xếp theo trường (ví dụ: "name", "code")
-        order_direction: Sort direction ("Asc" or "Desc") / Hướng sắp xếp ("Asc" hoặc "Desc")
-    """
-    client = _create_client(access_token, retailer)
-    params: Dict[str, Any] = {
-        "pageSize": min(page_size, 100),  # Max 100 / Tối đa 100
-        "currentItem": current_item,
-        "includeInventory": include_inventory,
-    }
-    if name:
-        params["name"] = name
-    if category_id:
-        params["categoryId"] = category_id
-    if order_by:
-        params["orderBy"] = order_by
-    if order_direction:
-        params["orderDirection"] = order_direction
-
-    return client.get("/products", params)
-
-
-@mcp.tool
-def kv_get_product(
-    access_token: str,
-    retailer: str,
-    product_id: Optional[int] = None,
-    product_code: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
-    Get detailed information of a product by ID or product code.
-    Lấy thông tin chi tiết của một sản phẩm theo ID hoặc mã sản phẩm.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        product_id: Product ID / ID sản phẩm
-        product_code: Product code (if product_id is not provided) / Mã sản phẩm (nếu không có product_id)
-    """
-    client = _create_client(access_token, retailer)
-    if product_id:
-        return client.get(f"/products/{product_id}")
-    elif product_code:
-        return client.get(f"/products/code/{product_code}")
-    else:
-        raise ValueError("Need to provide product_id or product_code / Cần cung cấp product_id hoặc product_code")
-
-
-# ============================================================================
-# Customer Tools / Công cụ Khách hàng
-# ============================================================================
-
-@mcp.tool
-def kv_search_customers(
-    access_token: str,
-    retailer: str,
-    name: Optional[str] = None,
-    contact_number: Optional[str] = None,
-    code: Optional[str] = None,
-    page_size: int = 20,
-    current_item: int = 0,
-    include_total: bool = False,
-) -> Dict[str, Any]:
-    """
-    Search customers by name, phone number, or customer code.
-    Tìm khách hàng theo tên, số điện thoại hoặc mã khách hàng.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        name: Search by customer name / Tìm kiếm theo tên khách hàng
-        contact_number: Search by phone number / Tìm kiếm theo số điện thoại
-        code: Search by customer code / Tìm kiếm theo mã khách hàng
-        page_size: Number of items per page (default 20, max 100) / Số items trong 1 trang (mặc định 20, tối đa 100)
-        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
-        include_total: Whether to include TotalInvoice, TotalPoint, TotalRevenue / Có lấy thông tin TotalInvoice, TotalPoint, TotalRevenue
-    """
-    client = _create_client(access_token, retailer)
-    params: Dict[str, Any] = {
-        "pageSize": min(page_size, 100),
-        "currentItem": current_item,
-        "includeTotal": include_total,
-    }
-    if name:
-        params["name"] = name
-    if contact_number:
-        params["contactNumber"] = contact_number
-    if code:
-        params["code"] = code
-
-    return client.get("/customers", params)
-
-
-@mcp.tool
-def kv_get_customer(
-    access_token: str,
-    retailer: str,
-    customer_id: Optional[int] = None,
-    customer_code: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
-    Get detailed information of a customer by ID or customer code.
-    Lấy thông tin chi tiết của một khách hàng theo ID hoặc mã khách hàng.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        customer_id: Customer ID / ID khách hàng
-        customer_code: Customer code (if customer_id is not provided) / Mã khách hàng (nếu không có customer_id)
-    """
-    client = _create_client(access_token, retailer)
-    if customer_id:
-        return client.get(f"/customers/{customer_id}")
-    elif customer_code:
-        return client.get(f"/customers/code/{customer_code}")
-    else:
-        raise ValueError("Need to provide customer_id or customer_code / Cần cung cấp customer_id hoặc customer_code")
-
-
-@mcp.tool
-def kv_create_customer(
-    access_token: str,
-    retailer: str,
-    name: str,
-    code: Optional[str] = None,
-    contact_number: Optional[str] = None,
-    email: Optional[str] = None,
-    address: Optional[str] = None,
-    gender: Optional[bool] = None,
-    birth_date: Optional[str] = None,
-    comments: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
-    Create a new customer in KiotViet.
-    Tạo mới khách hàng trong KiotViet.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        name: Customer name (required) / Tên khách hàng (bắt buộc)
-        code: Customer code / Mã khách hàng
-        contact_number: Phone number / Số điện thoại
-        email: Email address / Email
-        address: Address / Địa chỉ
-        gender: Gender (true: male, false: female) / Giới tính (true: nam, false: nữ)
-        birth_date: Birth date (format: YYYY-MM-DD) / Ngày sinh (format: YYYY-MM-DD)
-        comments: Notes / Ghi chú
-    """
-    client = _create_client(access_token, retailer)
-    body: Dict[str, Any] = {
-        "name": name,
-    }
-    if code:
-        body["code"] = code
-    if contact_number:
-        body["contactNumber"] = contact_number
-    if email:
-        body["email"] = email
-    if address:
-        body["address"] = address
-    if gender is not None:
-        body["gender"] = gender
-    if birth_date:
-        body["birthDate"] = birth_date
-    if comments:
-        body["comments"] = comments
-
-    return client.post("/customers", body)
-
-
-# ============================================================================
-# Order Tools / Công cụ Đơn hàng
-# ============================================================================
-
-@mcp.tool
-def kv_list_orders(
-    access_token: str,
-    retailer: str,
-    branch_ids: Optional[List[int]] = None,
-    status: Optional[List[int]] = None,
-    customer_ids: Optional[List[int]] = None,
-    from_date: Optional[str] = None,
-    to_date: Optional[str] = None,
-    page_size: int = 50,
-    current_item: int = 0,
-    include_payment: bool = False,
-) -> Dict[str, Any]:
-    """
-    Get list of orders from KiotViet.
-    Lấy danh sách đơn đặt hàng (orders) từ KiotViet.
-    Used by agent to view revenue, undelivered orders, unpaid orders, etc.
-    Agent dùng để xem doanh thu, đơn chưa giao, đơn chưa thanh toán,...
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
-        status: Filter by order status (list of numbers) / Lọc theo trạng thái đơn hàng (danh sách số)
-        customer_ids: Filter by list of customer IDs / Lọc theo danh sách ID khách hàng
-        from_date: From date (format: YYYY-MM-DD) / Từ ngày (format: YYYY-MM-DD)
-        to_date: To date (format: YYYY-MM-DD) / Đến ngày (format: YYYY-MM-DD)
-        page_size: Number of items per page (default 50, max 100) / Số items trong 1 trang (mặc định 50, tối đa 100)
-        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
-        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
-    """
-    client = _create_client(access_token, retailer)
-    params: Dict[str, Any] = {
-        "pageSize": min(page_size, 100),
-        "currentItem": current_item,
-        "includePayment": include_payment,
-    }
-    if branch_ids:
-        params["branchIds"] = branch_ids
-    if status:
-        params["status"] = status
-    if customer_ids:
-        params["customerIds"] = customer_ids
-    if from_date:
-        params["fromDate"] = from_date
-    if to_date:
-        params["toDate"] = to_date
-
-    return client.get("/orders", params)
-
-
-@mcp.tool
-def kv_get_order(
-    access_token: str,
-    retailer: str,
-    order_id: Optional[int] = None,
-    order_code: Optional[str] = None,
-    include_payment: bool = False,
-) -> Dict[str, Any]:
-    """
-    Get detailed information of an order by ID or order code.
-    Lấy thông tin chi tiết của một đơn hàng theo ID hoặc mã đơn hàng.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        order_id: Order ID / ID đơn hàng
-        order_code: Order code (if order_id is not provided) / Mã đơn hàng (nếu không có order_id)
-        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
-    """
-    client = _create_client(access_token, retailer)
-    params = {"includePayment": include_payment} if include_payment else None
-    
-    if order_id:
-        return client.get(f"/orders/{order_id}", params)
-    elif order_code:
-        return client.get(f"/orders/code/{order_code}", params)
-    else:
-        raise ValueError("Need to provide order_id or order_code / Cần cung cấp order_id hoặc order_code")
-
-
-@mcp.tool
-def kv_create_order(
-    access_token: str,
-    retailer: str,
-    branch_id: int,
-    purchase_date: str,
-    order_details: List[Dict[str, Any]],
-    customer_id: Optional[int] = None,
-    description: Optional[str] = None,
-    total_payment: Optional[float] = None,
-    discount: Optional[float] = None,
-    method: Optional[str] = None,
-) -> Dict[str, Any]:
-    """
-    Create a new KiotViet order. Only call after user has confirmed the content.
-    Tạo mới đơn đặt hàng KiotViet. Chỉ gọi sau khi user đã xác nhận nội dung.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        branch_id: Branch ID / ID chi nhánh
-        purchase_date: Purchase date (format: YYYY-MM-DD) / Ngày đặt hàng (format: YYYY-MM-DD)
-        order_details: List of products, each item includes: / Danh sách sản phẩm, mỗi item gồm:
-            - productId: Product ID / ID sản phẩm
-            - quantity: Quantity / Số lượng
-            - price: Price / Giá
-            - discount (optional): Discount / Giảm giá
-        customer_id: Customer ID (optional) / ID khách hàng (optional)
-        description: Notes / Ghi chú
-        total_payment: Total amount paid by customer / Tổng tiền khách đã trả
-        discount: Order discount / Giảm giá trên đơn
-        method: Payment method (Cash, Card, Transfer) / Phương thức thanh toán (Cash, Card, Transfer)
-    """
-    client = _create_client(access_token, retailer)
-
-    body: Dict[str, Any] = {
-        "branchId": branch_id,
-        "purchaseDate": purchase_date,
-        "orderDetails": order_details,
-    }
-    if customer_id:
-        body["customer"] = {"id": customer_id}
-    if description:
-        body["description"] = description
-    if total_payment is not None:
-        body["totalPayment"] = total_payment
-    if discount is not None:
-        body["discount"] = discount
-    if method:
-        body["method"] = method
-
-    return client.post("/orders", body)
-
-
-# ============================================================================
-# Invoice Tools / Công cụ Hóa đơn
-# ============================================================================
-
-@mcp.tool
-def kv_list_invoices(
-    access_token: str,
-    retailer: str,
-    branch_ids: Optional[List[int]] = None,
-    from_date: Optional[str] = None,
-    to_date: Optional[str] = None,
-    from_purchase_date: Optional[str] = None,
-    to_purchase_date: Optional[str] = None,
-    customer_ids: Optional[List[int]] = None,
-    page_size: int = 50,
-    current_item: int = 0,
-    include_payment: bool = False,
-) -> Dict[str, Any]:
-    """
-    Get list of sales invoices within a time period.
-    Lấy danh sách hóa đơn bán hàng trong khoảng thời gian.
-    Used for use cases: revenue summary, daily analysis, customer analysis, etc.
-    Dùng cho các use case: tổng hợp doanh thu, phân tích theo ngày, theo khách,...
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
-        from_date: From update date (format: YYYY-MM-DD) / Từ ngày cập nhật (format: YYYY-MM-DD)
-        to_date: To update date (format: YYYY-MM-DD) / Đến ngày cập nhật (format: YYYY-MM-DD)
-        from_purchase_date: From transaction date (format: YYYY-MM-DD) / Từ ngày giao dịch (format: YYYY-MM-DD)
-        to_purchase_date: To transaction date (format: YYYY-MM-DD) / Đến ngày giao dịch (format: YYYY-MM-DD)
-        customer_ids: Filter by list of customer IDs / Lọc theo danh sách ID khách hàng
-        page_size: Number of items per page (default 50, max 100) / Số items trong 1 trang (mặc định 50, tối đa 100)
-        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
-        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
-    """
-    client = _create_client(access_token, retailer)
-    params: Dict[str, Any] = {
-        "pageSize": min(page_size, 100),
-        "currentItem": current_item,
-        "includePayment": include_payment,
-    }
-    if branch_ids:
-        params["branchIds"] = branch_ids
-    if from_date:
-        params["fromDate"] = from_date
-    if to_date:
-        params["toDate"] = to_date
-    if from_purchase_date:
-        params["fromPurchaseDate"] = from_purchase_date
-    if to_purchase_date:
-        params["toPurchaseDate"] = to_purchase_date
-    if customer_ids:
-        params["customerIds"] = customer_ids
-
-    return client.get("/invoices", params)
-
-
-@mcp.tool
-def kv_get_invoice(
-    access_token: str,
-    retailer: str,
-    invoice_id: Optional[int] = None,
-    invoice_code: Optional[str] = None,
-    include_payment: bool = False,
-) -> Dict[str, Any]:
-    """
-    Get detailed information of an invoice by ID or invoice code.
-    Lấy thông tin chi tiết của một hóa đơn theo ID hoặc mã hóa đơn.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        invoice_id: Invoice ID / ID hóa đơn
-        invoice_code: Invoice code (if invoice_id is not provided) / Mã hóa đơn (nếu không có invoice_id)
-        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
-    """
-    client = _create_client(access_token, retailer)
-    params = {"includePayment": include_payment} if include_payment else None
-    
-    if invoice_id:
-        return client.get(f"/invoices/{invoice_id}", params)
-    elif invoice_code:
-        return client.get(f"/invoices/code/{invoice_code}", params)
-    else:
-        raise ValueError("Need to provide invoice_id or invoice_code / Cần cung cấp invoice_id hoặc invoice_code")
+import asyncio
+import hmac
+import os
+import signal
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+from fastmcp.prompts.prompt import PromptMessage, TextContent
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
-# ============================================================================
-# Category Tools / Công cụ Nhóm hàng
-# ============================================================================
+from kv_bulk import map_bounded
+from kv_cache import reference_cache
+from kv_freshness import invalidate_reads
+from kv_scheduler import BULK
+from kv_tools import groups_from_env, load_groups
+# _create_client and token_provider are re-exported for existing imports / _create_client và token_provider được re-export cho code đang import từ đây
+from kv_tools.common import (  # noqa: F401
+    _cached_branches, _category_index, _create_client, _customer_index, _index_customer, _unindex_customer, mcp,
+    token_provider,
+)
 
-@mcp.tool
-def kv_list_categories(
-    access_token: str,
-    retailer: str,
-    hierarchical_data: bool = True,
-    page_size: int = 100,
-    current_item: int = 0,
-) -> Dict[str, Any]:
-    """
-    Get list of product categories.
-    Lấy danh sách nhóm hàng hóa (categories).
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-        hierarchical_data: If True, returns hierarchical data (with children) / Nếu True, trả về dữ liệu phân cấp (có children)
-        page_size: Number of items per page (default 100) / Số items trong 1 trang (mặc định 100)
-        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
-    """
-    client = _create_client(access_token, retailer)
-    params: Dict[str, Any] = {
-        "pageSize": min(page_size, 100),
-        "currentItem": current_item,
-        "hierachicalData": hierarchical_data,  # Note: API uses "hierachicalData" (typo in API) / Lưu ý: API dùng "hierachicalData" (lỗi chính tả trong API)
-    }
-    return client.get("/categories", params)
+if TYPE_CHECKING:
+    from kv_webhook import WebhookEvent, WebhookReceiver
 
+# Tool groups registered at import, KIOTVIET_TOOL_GROUPS limits them
+# Các nhóm tool được đăng ký khi import, KIOTVIET_TOOL_GROUPS để giới hạn
+tool_modules = load_groups(groups_from_env())
 
-# ============================================================================
-# Branch Tools / Công cụ Chi nhánh
-# ============================================================================
 
-@mcp.tool
-def kv_list_branches(
-    access_token: str,
-    retailer: str,
-) -> Dict[str, Any]:
-    """
-    Get list of store branches.
-    Lấy danh sách chi nhánh của cửa hàng.
-    Used to get branch_id when creating orders or filtering data.
-    Dùng để lấy branch_id khi tạo đơn hàng hoặc lọc dữ liệu.
-    
-    Args:
-        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
-        retailer: KiotViet retailer name / Tên gian hàng KiotViet
-    """
-    client = _create_client(access_token, retailer)
-    return client.get("/branches")
+def __getattr__(name: str) -> Any:
+    # Tools used to be defined here; keep kiotviet_mcp_server.kv_* working
+    # Trước đây tool được định nghĩa ở đây; giữ kiotviet_mcp_server.kv_* hoạt động
+    for module in tool_modules:
+        if hasattr(module, name):
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ============================================================================
@@ -593,10 +129,20 @@ Nguyên tắc:
 - Không bịa dữ liệu. Nếu cần thêm thông tin (chi nhánh, ngày, khách hàng) hãy hỏi lại user.
 - Khi user muốn tra cứu hàng hóa, hãy dùng kv_list_products hoặc kv_get_product.
 - Khi user muốn tìm khách hàng, hãy dùng kv_search_customers hoặc kv_get_customer.
+- Khi user muốn nhập danh sách khách hàng, hãy dùng kv_upsert_customers_bulk (có thể dry_run trước để xem kế hoạch).
 - Khi user muốn xem/hoặc lập đơn hàng, hãy dùng kv_list_orders, kv_get_order hoặc kv_create_order.
+- Khi user muốn lập đơn từ mã/tên sản phẩm, số điện thoại khách và tên chi nhánh, hãy gọi kv_prepare_order trước, xác nhận với user, rồi truyền "order" cho kv_create_order.
+- Khi user muốn lập nhiều đơn hàng cùng lúc, hãy dùng kv_create_orders_bulk.
 - Khi user muốn xem hóa đơn bán hàng, hãy dùng kv_list_invoices hoặc kv_get_invoice.
+- Khi cần toàn bộ hóa đơn/đơn hàng trong một khoảng ngày (báo cáo, tổng hợp), hãy dùng kv_scan_invoices hoặc kv_scan_orders thay vì tự phân trang.
+- Khi chỉ cần đếm số đơn/hóa đơn theo trạng thái, chi nhánh hoặc ngày, hãy dùng kv_counts.
+- Khi user hỏi khách nào nợ nhiều/nợ lâu, hãy dùng kv_customer_receivables; khi hỏi khách hàng tốt nhất hoặc phân khúc khách hàng, hãy dùng kv_customer_rfm thay vì tự quét hóa đơn.
+- Khi user muốn đối soát đơn hàng với hóa đơn (đơn chưa xuất hóa đơn, lệch tiền, chưa thanh toán), hãy dùng kv_reconcile thay vì so từng trang kv_list_orders/kv_list_invoices.
 - Khi cần lấy danh sách chi nhánh, hãy dùng kv_list_branches.
-- Khi cần lấy danh sách nhóm hàng, hãy dùng kv_list_categories.
+- Khi cần theo dõi dữ liệu mới/thay đổi (hóa đơn mới, giá thay đổi...), hãy dùng kv_changes_since và giữ cursor cho lần gọi sau thay vì tải lại toàn bộ danh sách để so sánh.
+- Với báo cáo/phân tích không cần dữ liệu tức thời, truyền max_staleness (ví dụ 600) cho các tool đọc để dùng dữ liệu cache; khi lập đơn hàng thì không truyền để lấy dữ liệu trực tiếp.
+- Khi cần lấy danh sách nhóm hàng, hãy dùng kv_list_categories; khi cần cấu trúc cây (nhóm cha/con), hãy dùng kv_category_tree.
+- Khi user hỏi sản phẩm của cả một nhóm hàng (kể cả nhóm con, ví dụ "tất cả đồ uống"), hãy dùng kv_list_products_in_category thay vì gọi kv_list_products cho từng nhóm.
 
 BẢO MẬT:
 - Tất cả tools yêu cầu access_token và retailer (do hệ thống cung cấp).
@@ -606,9 +152,191 @@ BẢO MẬT:
     return PromptMessage(role="system", content=TextContent(type="text", text=text))
 
 
+# ============================================================================
+# Webhooks / Webhook
+# ============================================================================
+
+def _camel_keys(value: Any) -> Any:
+    """Webhook payloads use PascalCase, the API uses camelCase. / Webhook dùng PascalCase, API dùng camelCase."""
+    if isinstance(value, dict):
+        return {(k[:1].lower() + k[1:]) if isinstance(k, str) else k: _camel_keys(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_camel_keys(v) for v in value]
+    return value
+
+
+# Webhook entity -> read tool results it makes stale / Loại webhook -> kết quả tool đọc bị cũ
+_READ_ENTITIES = {
+    "product": ("products",),
+    "stock": ("products",),
+    "customer": ("customers", "reports"),
+    "order": ("orders", "counts", "reports"),
+    "invoice": ("invoices", "counts", "reports"),
+    "branch": ("branches",),
+    "category": ("categories", "products"),
+}
+
+
+def _apply_webhook_events(events: List["WebhookEvent"]) -> None:
+    """
+    Apply a batch of webhook events to the caches.
+    Áp dụng một lô sự kiện webhook vào cache.
+    """
+    # Entries changed in place, written back to the disk tier once per batch
+    # Các entry bị sửa tại chỗ, ghi lại xuống tầng đĩa một lần mỗi lô
+    changed = set()
+    for event in events:
+        retailer = event.retailer
+        rows = [_camel_keys(row) if isinstance(row, dict) else {"id": row} for row in event.data]
+        for entity in _READ_ENTITIES.get(event.entity, ()):
+            invalidate_reads(retailer, entity)
+        if event.entity == "product":
+            for row in rows:
+                if row.get("code"):
+                    reference_cache.invalidate((retailer, "product_code", row["code"]))
+        elif event.entity == "stock":
+            for row in rows:
+                product = reference_cache.get((retailer, "product_code", row.get("productCode")))
+                if product is None:
+                    continue
+                inventories = product.setdefault("inventories", [])
+                inventory = next((inv for inv in inventories if inv.get("branchId") == row.get("branchId")), None)
+                if inventory is None:
+                    inventories.append({"branchId": row.get("branchId"), "onHand": row.get("onHand")})
+                else:
+                    inventory["onHand"] = row.get("onHand")
+                changed.add((retailer, "product_code", row.get("productCode")))
+        elif event.entity == "customer":
+            index = reference_cache.get((retailer, "customer_index"))
+            if index is None:
+                continue
+            for row in rows:
+                if event.action == "delete":
+                    existing = index["id"].get(row.get("id"))
+                    if existing is not None:
+                        _unindex_customer(index, existing)
+                else:
+                    _index_customer(index, row)
+            changed.add((retailer, "customer_index"))
+        elif event.entity == "branch":
+            reference_cache.invalidate((retailer, "branches"))
+        elif event.entity == "category":
+            reference_cache.invalidate((retailer, "category_index"))
+    for key in changed:
+        reference_cache.persist(key)
+
+
+def _start_webhook_receiver() -> Optional["WebhookReceiver"]:
+    """
+    Start the webhook receiver when KIOTVIET_WEBHOOK_PORT is set.
+    Khởi động webhook receiver khi có KIOTVIET_WEBHOOK_PORT.
+    """
+    port = os.getenv("KIOTVIET_WEBHOOK_PORT")
+    if not port:
+        return None
+    from kv_webhook import WebhookReceiver, parse_retailer_ids
+
+    secret = os.getenv("KIOTVIET_WEBHOOK_SECRET")
+    if not secret:
+        raise ValueError("KIOTVIET_WEBHOOK_SECRET is required / Cần cấu hình KIOTVIET_WEBHOOK_SECRET")
+    retailer_ids = parse_retailer_ids(os.getenv("KIOTVIET_WEBHOOK_RETAILERS", ""))
+    if not retailer_ids:
+        raise ValueError("KIOTVIET_WEBHOOK_RETAILERS is required / Cần cấu hình KIOTVIET_WEBHOOK_RETAILERS")
+    return WebhookReceiver(
+        secret,
+        retailer_ids,
+        _apply_webhook_events,
+        host=os.getenv("KIOTVIET_WEBHOOK_HOST", "127.0.0.1"),
+        port=int(port),
+        max_queue=int(os.getenv("KIOTVIET_WEBHOOK_MAX_QUEUE", "1000")),
+        max_body=int(float(os.getenv("KIOTVIET_WEBHOOK_MAX_KB", "1024")) * 1024),
+    ).start()
+
+
+# ============================================================================
+# Gateway hand-off (HTTP transport only) / Chuyển giao từ gateway (chỉ với HTTP transport)
+# ============================================================================
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health(request: Request) -> JSONResponse:
+    """Liveness probe used by kv_gateway. / Kiểm tra sống, dùng bởi kv_gateway."""
+    return JSONResponse({"status": "ok"})
+
+
+def _warm_up(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Load the reference data of one retailer into the caches.
+    Nạp dữ liệu tham chiếu của một gian hàng vào cache.
+    """
+    retailer = item.get("retailer")
+    try:
+        client = _create_client(item.get("access_token") or "", retailer)
+        client.priority = BULK
+        _cached_branches(client, retailer)
+        _category_index(client, retailer)
+        _customer_index(client, retailer)
+    except Exception as e:
+        return {"retailer": retailer, "status": "failed", "error": str(e)}
+    return {"retailer": retailer, "status": "done"}
+
+
+@mcp.custom_route("/cache/warm", methods=["POST"])
+async def cache_warm(request: Request) -> JSONResponse:
+    """
+    Warm the caches of retailers this replica now owns, called by kv_gateway on
+    rebalancing. Needs "Authorization: Bearer <KIOTVIET_GATEWAY_TOKEN>".
+    Làm nóng cache của các gian hàng mà replica này vừa nhận, do kv_gateway gọi
+    khi cân bằng lại. Cần "Authorization: Bearer <KIOTVIET_GATEWAY_TOKEN>".
+    Body: {"retailers": [{"retailer": ..., "access_token": ...}]}
+    """
+    expected = os.getenv("KIOTVIET_GATEWAY_TOKEN")
+    if not expected:
+        return JSONResponse({"error": "Gateway hand-off is disabled / Chưa bật chuyển giao gateway"}, status_code=404)
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode("utf-8"), expected.encode("utf-8")):
+        return JSONResponse({"error": "Invalid gateway token / Token gateway không hợp lệ"}, status_code=401)
+    try:
+        items = (await request.json()).get("retailers") or []
+    except ValueError:
+        return JSONResponse({"error": "Invalid JSON body / Body JSON không hợp lệ"}, status_code=400)
+    results = await asyncio.to_thread(map_bounded, _warm_up, items, 4)
+    return JSONResponse({"results": results})
+
+
+# ============================================================================
+# Diagnostics / Chẩn đoán
+# ============================================================================
+
+def _install_profile_signal() -> None:
+    """
+    SIGUSR2 runs the sampling profiler for KIOTVIET_PROFILE_SECONDS (default 30) in the background.
+    SIGUSR2 chạy sampling profiler trong KIOTVIET_PROFILE_SECONDS giây (mặc định 30) ở nền.
+    """
+    if not hasattr(signal, "SIGUSR2"):
+        return
+    from kv_profiler import profiler
+
+    def handle(signum: int, frame: Any) -> None:
+        if not profiler.running:
+            profiler.start(float(os.getenv("KIOTVIET_PROFILE_SECONDS", "30")))
+
+    signal.signal(signal.SIGUSR2, handle)
+
+
 # ============================================================================
 # Main entry point / Điểm vào chính
 # ============================================================================
 
 if __name__ == "__main__":
-    mcp.run()
+    _start_webhook_receiver()
+    _install_profile_signal()
+    http_port = os.getenv("KIOTVIET_HTTP_PORT")
+    if http_port:
+        # Stateless HTTP so any replica behind kv_gateway can answer any request
+        # HTTP stateless để mọi replica sau kv_gateway đều trả lời được mọi request
+        mcp.run(
+            transport="http", host=os.getenv("KIOTVIET_HTTP_HOST", "127.0.0.1"), port=int(http_port),
+            stateless_http=True,
+        )
+    else:
+        mcp.run()
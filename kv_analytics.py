@@ -0,0 +1,168 @@
+"""
+Server-side customer analytics: receivables aging and RFM scoring.
+Invoices are folded into small per-customer aggregates page by page, so only
+the aggregates and the top-N rows are kept.
+
+Phân tích khách hàng phía server: tuổi nợ phải thu và chấm điểm RFM.
+Hóa đơn được gộp vào các tổng hợp nhỏ theo khách hàng từng trang một, nên chỉ
+giữ lại các tổng hợp và top-N dòng.
+"""
+import bisect
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# (label, max age in days or None) / (nhãn, số ngày tối đa hoặc None)
+AGING_BUCKETS: Tuple[Tuple[str, Optional[int]], ...] = (
+    ("0_30", 30), ("31_60", 60), ("61_90", 90), ("over_90", None),
+)
+
+# Invoice status "cancelled" / Trạng thái hóa đơn "đã hủy"
+CANCELLED_INVOICE = 2
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """KiotViet timestamps, with or without fractional seconds. / Thời gian KiotViet, có hoặc không có phần lẻ giây."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value[:19])
+    except ValueError:
+        return None
+
+
+def aging_bucket(age_days: int) -> str:
+    for label, limit in AGING_BUCKETS:
+        if limit is None or age_days <= limit:
+            return label
+    return AGING_BUCKETS[-1][0]
+
+
+def age_debt(debt: float, invoices: List[Tuple[datetime, float]], as_of: datetime) -> Tuple[Dict[str, float], Optional[int]]:
+    """
+    Spread a customer's current debt over their invoices, newest first (payments
+    settle the oldest invoices first). Debt not covered by the scanned invoices is
+    older than the scan and goes to the last bucket.
+    Chia dư nợ hiện tại của khách hàng cho các hóa đơn, mới nhất trước (thanh toán
+    trả cho hóa đơn cũ nhất trước). Phần nợ không khớp hóa đơn nào đã quét thì cũ
+    hơn khoảng quét và được tính vào nhóm cuối.
+    Returns (amount per bucket, age in days of the oldest unpaid invoice).
+    Trả về (số tiền theo nhóm, số ngày của hóa đơn chưa trả cũ nhất).
+    """
+    buckets = {label: 0.0 for label, _ in AGING_BUCKETS}
+    remaining = debt
+    oldest: Optional[int] = None
+    for purchased, total in sorted(invoices, key=lambda item: item[0], reverse=True):
+        if remaining <= 0:
+            break
+        if total <= 0:
+            continue
+        amount = min(total, remaining)
+        age = max((as_of - purchased).days, 0)
+        buckets[aging_bucket(age)] += amount
+        remaining -= amount
+        oldest = age
+    if remaining > 0:
+        buckets[AGING_BUCKETS[-1][0]] += remaining
+    return buckets, oldest
+
+
+def quantile_edges(values: Sequence[float], scores: int = 5) -> List[float]:
+    """
+    Cut points splitting values into equal-sized groups: edge k is the largest
+    value of group k. Tied values stay together in the lowest group they reach.
+    Các điểm cắt chia values thành các nhóm bằng nhau: điểm cắt k là giá trị lớn
+    nhất của nhóm k. Các giá trị bằng nhau nằm chung ở nhóm thấp nhất mà chúng chạm tới.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return []
+    return [ordered[max(0, -(-len(ordered) * k // scores) - 1)] for k in range(1, scores)]
+
+
+def score(value: float, edges: List[float]) -> int:
+    """
+    1 (lowest group) .. len(edges) + 1 (highest group): one more than the number of
+    edges below value, so ties get the lowest score of their rank range.
+    1 (nhóm thấp nhất) .. len(edges) + 1 (nhóm cao nhất): một cộng số điểm cắt nhỏ
+    hơn value, nên các giá trị bằng nhau nhận điểm thấp nhất trong khoảng hạng của chúng.
+    """
+    return bisect.bisect_left(edges, value) + 1
+
+
+def rfm_segment(recency: int, frequency: int, monetary: int) -> str:
+    """Common RFM segments from 1-5 scores. / Phân khúc RFM phổ biến từ điểm 1-5."""
+    if recency >= 4 and frequency >= 4 and monetary >= 4:
+        return "champions"
+    if recency >= 3 and frequency >= 3:
+        return "loyal"
+    if recency >= 4 and frequency <= 2:
+        return "new_or_promising"
+    if recency <= 2 and frequency >= 3:
+        return "at_risk"
+    if recency <= 1:
+        return "lost"
+    return "needs_attention"
+
+
+class RFMAccumulator:
+    """
+    Folds invoice pages into per-customer (last purchase, count, total, code, name).
+    Gộp các trang hóa đơn thành (lần mua cuối, số lần, tổng tiền, mã, tên) theo khách hàng.
+    """
+
+    def __init__(self):
+        self.customers: Dict[Any, List[Any]] = {}
+        self.invoices = 0
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            customer_id = row.get("customerId")
+            purchased = parse_timestamp(row.get("purchaseDate"))
+            if not customer_id or purchased is None or row.get("status") == CANCELLED_INVOICE:
+                continue
+            self.invoices += 1
+            stats = self.customers.get(customer_id)
+            if stats is None:
+                self.customers[customer_id] = [purchased, 1, float(row.get("total") or 0),
+                                               row.get("customerCode"), row.get("customerName")]
+            else:
+                stats[0] = max(stats[0], purchased)
+                stats[1] += 1
+                stats[2] += float(row.get("total") or 0)
+
+    def scores(self, as_of: datetime) -> Tuple[Dict[Any, Dict[str, Any]], Dict[str, List[float]]]:
+        """
+        RFM rows per customer and the cut points used.
+        Dòng RFM theo khách hàng và các điểm cắt đã dùng.
+        """
+        ids = list(self.customers)
+        recency_days = [(as_of - self.customers[c][0]).days for c in ids]
+        frequency = [self.customers[c][1] for c in ids]
+        monetary = [self.customers[c][2] for c in ids]
+        # Fewer days since the last purchase is better, so score the negated value
+        # Số ngày từ lần mua cuối càng ít càng tốt, nên chấm điểm trên giá trị âm
+        edges = {
+            "recency": quantile_edges([-d for d in recency_days]),
+            "frequency": quantile_edges(frequency),
+            "monetary": quantile_edges(monetary),
+        }
+        rows: Dict[Any, Dict[str, Any]] = {}
+        for customer_id, days, count, total in zip(ids, recency_days, frequency, monetary):
+            r = score(-days, edges["recency"])
+            f = score(count, edges["frequency"])
+            m = score(total, edges["monetary"])
+            stats = self.customers[customer_id]
+            rows[customer_id] = {
+                "customerId": customer_id,
+                "customerCode": stats[3],
+                "customerName": stats[4],
+                "lastPurchase": stats[0].isoformat(),
+                "recencyDays": days,
+                "frequency": count,
+                "monetary": total,
+                "r": r, "f": f, "m": m,
+                "rfm": f"{r}{f}{m}",
+                "score": r + f + m,
+                "segment": rfm_segment(r, f, m),
+            }
+        return rows, {name: [-e for e in values] if name == "recency" else values for name, values in edges.items()}
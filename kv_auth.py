@@ -0,0 +1,168 @@
+"""
+Optional OAuth2 client_credentials token provider.
+Used only when the server is configured with client_id/client_secret per retailer;
+otherwise tools keep receiving access_token from Culi.
+
+Token provider OAuth2 client_credentials (tùy chọn).
+Chỉ dùng khi server được cấu hình client_id/client_secret cho từng gian hàng;
+nếu không, tools vẫn nhận access_token từ Culi.
+"""
+import json
+import os
+import threading
+import time
+import httpx
+from typing import Dict, Optional, Tuple
+
+from kv_client import sessions
+
+
+TOKEN_URL = "https://id.kiotviet.vn/connect/token"
+
+
+class _CachedToken:
+    """Token and its expiry time (monotonic). / Token và thời điểm hết hạn (monotonic)."""
+
+    __slots__ = ("access_token", "expires_at", "margin")
+
+    def __init__(self, access_token: str, expires_at: float, margin: float):
+        self.access_token = access_token
+        self.expires_at = expires_at
+        self.margin = margin
+
+
+class TokenProvider:
+    """
+    Caches client_credentials tokens per retailer and refreshes them before expiry.
+    Cache token client_credentials theo gian hàng và làm mới trước khi hết hạn.
+    Refreshes are single-flight per retailer; a background thread refreshes
+    tokens early so tool calls do not wait on the identity endpoint.
+    Mỗi gian hàng chỉ có một lần refresh tại một thời điểm; thread nền refresh
+    sớm để tool không phải chờ identity endpoint.
+    """
+
+    def __init__(
+        self,
+        credentials: Dict[str, Tuple[str, str]],
+        token_url: str = TOKEN_URL,
+        refresh_margin: float = 300.0,
+        background_interval: float = 30.0,
+    ):
+        """
+        Args:
+            credentials: Mapping retailer -> (client_id, client_secret) / Ánh xạ gian hàng -> (client_id, client_secret)
+            token_url: OAuth2 token endpoint / Endpoint lấy token OAuth2
+            refresh_margin: Seconds before expires_in at which a token is no longer used / Số giây trước expires_in thì token không còn được dùng
+            background_interval: Seconds between background refresh checks / Số giây giữa các lần kiểm tra refresh nền
+        """
+        self.credentials = dict(credentials)
+        self.token_url = token_url
+        self.refresh_margin = refresh_margin
+        self.background_interval = background_interval
+        self._tokens: Dict[str, _CachedToken] = {}
+        self._locks: Dict[str, threading.Lock] = {retailer: threading.Lock() for retailer in self.credentials}
+        self._background: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["TokenProvider"]:
+        """
+        Build a provider from the environment, or None when not configured.
+        Tạo provider từ biến môi trường, hoặc None nếu chưa cấu hình.
+
+        KIOTVIET_CREDENTIALS_FILE: JSON file {"retailer": {"client_id": ..., "client_secret": ...}} with one retailer / với một gian hàng
+        RETAILER, CLIENT_ID, CLIENT_SECRET: single retailer (same variables as tests/) / một gian hàng (giống tests/)
+        KIOTVIET_TOKEN_URL: token endpoint override, e.g. a local stand-in / thay endpoint token, ví dụ server giả lập local
+        """
+        credentials: Dict[str, Tuple[str, str]] = {}
+        path = os.getenv("KIOTVIET_CREDENTIALS_FILE")
+        if path:
+            with open(path, encoding="utf-8") as f:
+                for retailer, item in json.load(f).items():
+                    credentials[retailer] = (item["client_id"], item["client_secret"])
+        retailer, client_id, client_secret = os.getenv("RETAILER"), os.getenv("CLIENT_ID"), os.getenv("CLIENT_SECRET")
+        if retailer and client_id and client_secret:
+            credentials.setdefault(retailer, (client_id, client_secret))
+        if not credentials:
+            return None
+        # An empty access_token does not say who is calling, so one server serves one retailer
+        # access_token rỗng không cho biết ai đang gọi, nên mỗi server chỉ phục vụ một gian hàng
+        if len(credentials) > 1:
+            raise ValueError(
+                f"Token provider mode serves a single retailer, {len(credentials)} are configured; run one server per retailer"
+                f" / Chế độ token provider chỉ phục vụ một gian hàng, đang cấu hình {len(credentials)}; chạy mỗi gian hàng một server"
+            )
+        return cls(credentials, token_url=os.getenv("KIOTVIET_TOKEN_URL", TOKEN_URL))
+
+    def has(self, retailer: str) -> bool:
+        """Whether credentials are configured for the retailer. / Gian hàng đã được cấu hình credentials chưa."""
+        return retailer in self.credentials
+
+    def get_token(self, retailer: str) -> str:
+        """
+        Get a valid access_token for the retailer, fetching one if needed.
+        Lấy access_token hợp lệ cho gian hàng, gọi token endpoint nếu cần.
+        """
+        if not self.has(retailer):
+            raise ValueError(f"No credentials configured for retailer '{retailer}' / Chưa cấu hình credentials cho gian hàng '{retailer}'")
+        self._ensure_background()
+        cached = self._tokens.get(retailer)
+        if self._usable(retailer, cached, 1):
+            return cached.access_token
+        return self._refresh(retailer, 1)
+
+    def _usable(self, retailer: str, cached: Optional[_CachedToken], margin_factor: float) -> bool:
+        if cached is None or time.monotonic() >= cached.expires_at - cached.margin * margin_factor:
+            return False
+        # A token KiotViet answered 401 for is refreshed right away / Token đã bị 401 được refresh ngay
+        return not sessions.is_rejected(cached.access_token, retailer)
+
+    def _refresh(self, retailer: str, margin_factor: float) -> str:
+        with self._locks[retailer]:
+            # Another thread may have refreshed while we waited / Thread khác có thể đã refresh trong lúc chờ
+            cached = self._tokens.get(retailer)
+            if self._usable(retailer, cached, margin_factor):
+                return cached.access_token
+            client_id, client_secret = self.credentials[retailer]
+            data = {
+                "scopes": "PublicApi.Access",
+                "grant_type": "client_credentials",
+                "client_id": client_id,
+                "client_secret": client_secret,
+            }
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            started = time.monotonic()
+            resp = httpx.post(self.token_url, data=data, headers=headers, timeout=15)
+            resp.raise_for_status()
+            result = resp.json()
+            lifetime = float(result.get("expires_in", 0))
+            # Short-lived tokens get a proportional margin / Token ngắn hạn dùng margin theo tỷ lệ
+            cached = _CachedToken(result["access_token"], started + lifetime, min(self.refresh_margin, lifetime / 4))
+            self._tokens[retailer] = cached
+            return cached.access_token
+
+    def _ensure_background(self) -> None:
+        if self._background is not None:
+            return
+        with self._start_lock:
+            if self._background is None:
+                self._background = threading.Thread(target=self._run_background, name="kv-token-refresh", daemon=True)
+                self._background.start()
+
+    def _run_background(self) -> None:
+        # Refresh tokens that enter twice the margin, so foreground calls find them fresh
+        # Refresh token khi vào vùng gấp đôi margin, để lời gọi tool luôn thấy token mới
+        while not self._stop.wait(self.background_interval):
+            for retailer in list(self._tokens):
+                if self._usable(retailer, self._tokens.get(retailer), 2):
+                    continue
+                try:
+                    self._refresh(retailer, 2)
+                except Exception:
+                    # Foreground calls retry and surface the error / Lời gọi tool sẽ thử lại và báo lỗi
+                    pass
+
+    def stop(self) -> None:
+        """Stop the background refresh thread. / Dừng thread refresh nền."""
+        self._stop.set()
@@ -0,0 +1,127 @@
+"""
+Helpers for bulk tools: bounded concurrency and an idempotency ledger.
+Tiện ích cho các tool hàng loạt: giới hạn số request song song và sổ ghi idempotency.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from kv_cache import DiskCache
+from kv_deadline import run_tagged
+
+# Recorded when a request is claimed, so a restart mid-send does not resend it
+# Ghi khi nhận khóa, để khởi động lại giữa chừng không gửi lại request
+_INTERRUPTED = (
+    "Server stopped before KiotViet answered, the request may have been applied"
+    " / Server dừng trước khi KiotViet phản hồi, request có thể đã được xử lý"
+)
+
+
+def map_bounded(fn: Callable[[Any], Any], items: Iterable[Any], max_workers: int = 4) -> List[Any]:
+    """
+    Apply fn to every item with at most max_workers calls in flight, keeping input order.
+    Áp dụng fn cho từng item với tối đa max_workers lời gọi song song, giữ nguyên thứ tự.
+    Workers run in a copy of the caller's context, so they share its tool call deadline.
+    Worker chạy trong bản sao context của người gọi, nên dùng chung thời hạn của lần gọi tool.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [fn(item) for item in items]
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(lambda item: context.copy().run(run_tagged, fn, item), items))
+
+
+class _Entry:
+    __slots__ = ("state", "result", "done", "created_at")
+
+    def __init__(self):
+        self.state = "pending"
+        self.result: Any = None
+        self.done = threading.Event()
+        self.created_at = time.monotonic()
+
+
+class IdempotencyLedger:
+    """
+    Remembers the outcome of write requests per (retailer, key).
+    Ghi nhớ kết quả các request ghi theo (retailer, khóa).
+    States: "pending" (in flight), "done" (succeeded), "unknown" (sent but no
+    answer, may exist upstream). Failed requests are forgotten so they can be retried.
+    Trạng thái: "pending" (đang gửi), "done" (thành công), "unknown" (đã gửi nhưng
+    không có phản hồi, có thể đã tạo). Request lỗi bị xóa để có thể thử lại.
+    With a disk tier, outcomes survive restarts and are shared by processes using
+    the same file; a key claimed when the process stopped reads back as "unknown".
+    Without it, keys are only remembered by this process while it runs.
+    Khi có tầng đĩa, kết quả được giữ qua các lần khởi động lại và dùng chung giữa
+    các tiến trình cùng file; khóa đang gửi khi tiến trình dừng được đọc lại là "unknown".
+    Nếu không, khóa chỉ được nhớ trong tiến trình này khi nó còn chạy.
+    """
+
+    def __init__(self, ttl: float = 86400.0, max_entries: int = 10000, disk: Optional[DiskCache] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk = disk
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _disk_key(retailer: str, key: str) -> Tuple[str, str, str]:
+        return retailer, "idempotency", key
+
+    def begin(self, retailer: str, key: str) -> Tuple[bool, _Entry]:
+        """
+        Claim a key. Returns (True, entry) if the caller must send the request,
+        otherwise (False, entry) for a request already sent.
+        Nhận một khóa. Trả về (True, entry) nếu người gọi phải gửi request,
+        ngược lại (False, entry) nếu request đã được gửi.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((retailer, key))
+            if entry is not None and now - entry.created_at < self.ttl:
+                return False, entry
+            stored = self.disk.get(self._disk_key(retailer, key)) if self.disk is not None else None
+            self._evict(now)
+            entry = _Entry()
+            self._entries[(retailer, key)] = entry
+            if stored is not None:
+                expires_at, (entry.state, entry.result), _ = stored
+                entry.created_at = now - self.ttl + (expires_at - time.time())
+                entry.done.set()
+                return False, entry
+            if self.disk is not None:
+                self.disk.set(self._disk_key(retailer, key), ("unknown", _INTERRUPTED), time.time() + self.ttl)
+            return True, entry
+
+    def wait(self, entry: _Entry, timeout: Optional[float] = None) -> _Entry:
+        """Wait for an in-flight request with the same key. / Chờ request cùng khóa đang gửi."""
+        entry.done.wait(timeout)
+        return entry
+
+    def finish(self, retailer: str, key: str, entry: _Entry, state: str, result: Any = None) -> None:
+        """
+        Record the outcome; state "failed" forgets the key.
+        Ghi nhận kết quả; trạng thái "failed" xóa khóa.
+        """
+        with self._lock:
+            entry.state = state
+            entry.result = result
+            if state == "failed" and self._entries.get((retailer, key)) is entry:
+                del self._entries[(retailer, key)]
+            if self.disk is not None:
+                if state == "failed":
+                    self.disk.delete(self._disk_key(retailer, key))
+                else:
+                    wall_expiry = time.time() + self.ttl - (time.monotonic() - entry.created_at)
+                    self.disk.set(self._disk_key(retailer, key), (state, result), wall_expiry)
+        entry.done.set()
+
+    def _evict(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if e.state != "pending" and now - e.created_at >= self.ttl]
+        for k in expired:
+            del self._entries[k]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
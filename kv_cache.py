@@ -0,0 +1,272 @@
+"""
+In-memory TTL cache for slow-changing reference data (branches, categories, indexes),
+with an optional SQLite tier on disk so a restarted server starts warm.
+Cache TTL trong bộ nhớ cho dữ liệu tham chiếu ít thay đổi (chi nhánh, nhóm hàng, chỉ mục),
+kèm tầng SQLite trên đĩa (tùy chọn) để server khởi động lại vẫn có cache.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class DiskCache:
+    """
+    Size-bounded SQLite store of cache entries with their expiry time.
+    Kho SQLite giới hạn dung lượng cho các entry cache kèm thời điểm hết hạn.
+    Entries are read lazily, one key at a time, when the memory tier misses.
+    When the file grows past max_bytes, expired entries go first, then the least
+    recently used ones. Values are pickled, so the file must only be writable by the server.
+    Entry được đọc dần theo từng key khi tầng bộ nhớ không có. Khi file vượt max_bytes,
+    entry hết hạn bị xóa trước, sau đó là entry lâu không dùng nhất. Giá trị được pickle,
+    nên chỉ server được phép ghi file này.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["DiskCache"]:
+        """KIOTVIET_CACHE_PATH (unset = disabled / bỏ trống = tắt), KIOTVIET_CACHE_MAX_MB (default 256)."""
+        path = os.getenv("KIOTVIET_CACHE_PATH")
+        if not path:
+            return None
+        return cls(path, max_bytes=int(float(os.getenv("KIOTVIET_CACHE_MAX_MB", "256")) * 1024 * 1024))
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so startup stays fast / Mở khi dùng lần đầu để khởi động nhanh
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, retailer TEXT, kind TEXT,"
+                " expires_at REAL, accessed_at REAL, size INTEGER, value BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_retailer_kind ON entries (retailer, kind)")
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            self._size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _key(key: Hashable) -> Tuple[str, Optional[str], Optional[str]]:
+        parts = key if isinstance(key, tuple) else (key,)
+        retailer = parts[0] if parts and isinstance(parts[0], str) else None
+        kind = parts[1] if len(parts) > 1 and isinstance(parts[1], str) else None
+        return repr(key), retailer, kind
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, Any, int]]:
+        """
+        (expires_at as wall-clock time, value, size in bytes) or None.
+        (thời điểm hết hạn theo giờ thực, giá trị, kích thước byte) hoặc None.
+        """
+        text, _, _ = self._key(key)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT expires_at, value, size FROM entries WHERE key = ?", (text,)).fetchone()
+            if row is None:
+                return None
+            if row[0] <= now:
+                self._delete(conn, "key = ?", (text,))
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, text))
+        try:
+            return row[0], pickle.loads(row[1]), row[2]
+        except Exception:
+            self.delete(key)
+            return None
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """Store a value until expires_at (wall-clock time). / Lưu giá trị đến expires_at (giờ thực)."""
+        text, retailer, kind = self._key(key)
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Not picklable or mutated while pickling: keep it in memory only
+            # Không pickle được hoặc bị sửa trong lúc pickle: chỉ giữ trong bộ nhớ
+            return
+        with self._lock:
+            conn = self._connect()
+            self._delete(conn, "key = ?", (text,))
+            conn.execute(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (text, retailer, kind, expires_at, time.time(), len(blob), blob),
+            )
+            self._size += len(blob)
+            if self._size > self.max_bytes:
+                self._evict(conn)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._delete(self._connect(), "key = ?", (self._key(key)[0],))
+
+    def delete_kind(self, retailer: str, kind: str) -> None:
+        with self._lock:
+            self._delete(self._connect(), "retailer = ? AND kind = ?", (retailer, kind))
+
+    def delete_retailer(self, retailer: str) -> None:
+        with self._lock:
+            self._delete(self._connect(), "retailer = ?", (retailer,))
+
+    def _delete(self, conn: sqlite3.Connection, where: str, args: Tuple[Any, ...]) -> None:
+        freed = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE {where}", args).fetchone()[0]
+        if freed:
+            conn.execute(f"DELETE FROM entries WHERE {where}", args)
+            self._size -= freed
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        self._delete(conn, "expires_at <= ?", (time.time(),))
+        target = self.max_bytes * 0.9
+        for text, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            if self._size <= target:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (text,))
+            self._size -= size
+
+
+class TTLCache:
+    """
+    Thread-safe key/value cache where every entry expires after its TTL.
+    Cache key/value an toàn đa luồng, mỗi entry hết hạn sau TTL.
+    Keys are tuples starting with the retailer, so one tenant can be invalidated at once.
+    Key là tuple bắt đầu bằng retailer, để có thể xóa toàn bộ một gian hàng.
+    With max_bytes, the sizes given to set() are summed and the oldest entries are
+    dropped past the bound; a single value larger than the bound is not kept.
+    Với max_bytes, kích thước truyền vào set() được cộng dồn và entry cũ nhất bị xóa
+    khi vượt giới hạn; giá trị đơn lẻ lớn hơn giới hạn không được giữ.
+    """
+
+    def __init__(self, default_ttl: float = 300.0, max_entries: int = 10000, disk: Optional[DiskCache] = None,
+                 max_bytes: Optional[int] = None):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk = disk
+        # key -> (expires_at, value, size) / key -> (thời điểm hết hạn, giá trị, kích thước)
+        self._entries: Dict[Hashable, Tuple[float, Any, int]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a live value or None. / Lấy giá trị còn hạn hoặc None."""
+        found = self.lookup(key)
+        return None if found is None else found[0]
+
+    def lookup(self, key: Hashable, use_disk: bool = True) -> Optional[Tuple[Any, str]]:
+        """
+        Get (value, tier) where tier is "memory" or "disk", or None.
+        Lấy (giá trị, tầng) với tầng là "memory" hoặc "disk", hoặc None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() < entry[0]:
+                    return entry[1], "memory"
+                self._pop(key)
+        if self.disk is None or not use_disk:
+            return None
+        stored = self.disk.get(key)
+        if stored is None:
+            return None
+        # Promote to memory with the remaining TTL / Đưa lên bộ nhớ với TTL còn lại
+        expires_at, value, size = stored
+        self._store(key, value, time.monotonic() + (expires_at - time.time()), size)
+        return value, "disk"
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, size: int = 0,
+            to_disk: bool = True) -> None:
+        """
+        Store a value; size (bytes) counts against max_bytes, to_disk=False keeps it in memory only.
+        Lưu giá trị; size (byte) tính vào max_bytes, to_disk=False chỉ giữ trong bộ nhớ.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        self._store(key, value, time.monotonic() + ttl, size)
+        if self.disk is not None and to_disk:
+            self.disk.set(key, value, time.time() + ttl)
+
+    def persist(self, key: Hashable) -> None:
+        """
+        Write a value changed in place back to disk, keeping its expiry.
+        Ghi lại xuống đĩa giá trị đã bị sửa tại chỗ, giữ nguyên thời điểm hết hạn.
+        """
+        if self.disk is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            self.disk.set(key, entry[1], time.time() + (entry[0] - time.monotonic()))
+
+    def _store(self, key: Hashable, value: Any, expires_at: float, size: int = 0) -> None:
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            while self._entries and (
+                len(self._entries) >= self.max_entries
+                or (self.max_bytes is not None and self._bytes + size > self.max_bytes)
+            ):
+                self._pop(next(iter(self._entries)))
+            self._entries[key] = (expires_at, value, size)
+            self._bytes += size
+
+    def _pop(self, key: Hashable) -> None:
+        # Caller holds the lock / Nơi gọi đang giữ lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Get a live value or load and store it. / Lấy giá trị còn hạn hoặc tải và lưu."""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop one entry. / Xóa một entry."""
+        with self._lock:
+            self._pop(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def invalidate_kind(self, retailer: str, kind: str) -> None:
+        """Drop every (retailer, kind, ...) entry. / Xóa mọi entry (retailer, kind, ...)."""
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k[:2] == (retailer, kind)]:
+                self._pop(key)
+        if self.disk is not None:
+            self.disk.delete_kind(retailer, kind)
+
+    def invalidate_retailer(self, retailer: str) -> None:
+        """Drop every entry of a retailer. / Xóa mọi entry của một gian hàng."""
+        with self._lock:
+            for key in [k for k in self._entries if isinstance(k, tuple) and k and k[0] == retailer]:
+                self._pop(key)
+        if self.disk is not None:
+            self.disk.delete_retailer(retailer)
+
+
+# Optional disk tier shared by the caches below / Tầng đĩa tùy chọn dùng chung cho các cache bên dưới
+disk_cache = DiskCache.from_env()
+
+# Shared reference data cache, keys are (retailer, kind, ...)
+# Cache dữ liệu tham chiếu dùng chung, key là (retailer, loại, ...)
+reference_cache = TTLCache(disk=disk_cache)
+
+# Responses of read tools for max_staleness routing, kept up to KIOTVIET_READ_CACHE_TTL seconds
+# and KIOTVIET_READ_CACHE_MAX_MB (default 64) in memory
+# Kết quả của các tool đọc cho định tuyến max_staleness, giữ tối đa KIOTVIET_READ_CACHE_TTL giây
+# và KIOTVIET_READ_CACHE_MAX_MB (mặc định 64) trong bộ nhớ
+read_cache = TTLCache(
+    default_ttl=float(os.getenv("KIOTVIET_READ_CACHE_TTL", "3600")), max_entries=2000, disk=disk_cache,
+    max_bytes=int(float(os.getenv("KIOTVIET_READ_CACHE_MAX_MB", "64")) * 1024 * 1024),
+)
@@ -0,0 +1,105 @@
+"""
+Flattened category tree of a retailer: parent/child maps, depth, path and
+descendant sets, so subtree queries need no extra API calls.
+
+Cây nhóm hàng dạng phẳng của một gian hàng: map cha/con, độ sâu, đường dẫn và
+tập nhóm con cháu, để truy vấn theo nhánh không cần gọi thêm API.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class CategoryIndex:
+    """
+    Built from /categories rows, flat (parentId) or hierarchical (children).
+    Dựng từ các dòng /categories, dạng phẳng (parentId) hoặc phân cấp (children).
+    """
+
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self.names: Dict[int, str] = {}
+        self.parent: Dict[int, Optional[int]] = {}
+        self.children: Dict[int, List[int]] = {}
+        self._add(rows, None)
+        for category_id, parent_id in self.parent.items():
+            if parent_id is not None and parent_id in self.names:
+                self.children.setdefault(parent_id, []).append(category_id)
+            else:
+                self.parent[category_id] = None
+        self.roots = sorted(c for c, p in self.parent.items() if p is None)
+        self.depth: Dict[int, int] = {}
+        self.path: Dict[int, List[str]] = {}
+        self.descendants: Dict[int, List[int]] = {}
+        for root in self.roots:
+            self._walk(root, 0, [])
+
+    def _add(self, rows: Iterable[Dict[str, Any]], parent_id: Optional[int]) -> None:
+        for row in rows:
+            category_id = row.get("categoryId", row.get("id"))
+            if category_id is None:
+                continue
+            self.names[category_id] = row.get("categoryName") or row.get("name") or ""
+            self.parent[category_id] = row.get("parentId", parent_id)
+            self._add(row.get("children") or [], category_id)
+
+    def _walk(self, category_id: int, depth: int, path: List[str]) -> List[int]:
+        # Iterative would only matter for trees thousands of levels deep
+        # Chỉ cần duyệt không đệ quy khi cây sâu hàng nghìn cấp
+        self.depth[category_id] = depth
+        self.path[category_id] = path + [self.names[category_id]]
+        below = [category_id]
+        for child in sorted(self.children.get(category_id, [])):
+            below.extend(self._walk(child, depth + 1, self.path[category_id]))
+        self.descendants[category_id] = below
+        return below
+
+    def subtree(self, category_id: int) -> List[int]:
+        """
+        The category and every category below it.
+        Nhóm hàng và mọi nhóm con cháu của nó.
+        """
+        if category_id not in self.names:
+            raise ValueError(f"Category {category_id} not found / Không tìm thấy nhóm hàng {category_id}")
+        return self.descendants[category_id]
+
+    def subtrees(self, roots: Iterable[int]) -> List[int]:
+        """Union of several subtrees, in tree order. / Hợp của nhiều nhánh, theo thứ tự cây."""
+        seen = set()
+        ids: List[int] = []
+        for root in roots:
+            for category_id in self.subtree(root):
+                if category_id not in seen:
+                    seen.add(category_id)
+                    ids.append(category_id)
+        return ids
+
+    def resolve(self, category_id: Optional[int] = None, category_name: Optional[str] = None) -> List[int]:
+        """
+        Category IDs from an ID or a name; nested name matches are collapsed into their ancestor.
+        ID nhóm hàng từ ID hoặc tên; các kết quả lồng nhau được gộp vào nhóm cha.
+        """
+        if category_id is not None:
+            self.subtree(category_id)
+            return [category_id]
+        if not category_name:
+            raise ValueError("category_id or category_name is required / Cần category_id hoặc category_name")
+        found = self.find(category_name)
+        if not found:
+            raise ValueError(f"Category '{category_name}' not found / Không tìm thấy nhóm hàng '{category_name}'")
+        return [c for c in found if not any(c != other and c in self.descendants[other] for other in found)]
+
+    def find(self, name: str) -> List[int]:
+        """Exact (case-insensitive) name matches, else substring matches. / Khớp tên chính xác, nếu không thì khớp chuỗi con."""
+        wanted = name.strip().lower()
+        exact = [c for c, n in self.names.items() if n.strip().lower() == wanted]
+        return sorted(exact or [c for c, n in self.names.items() if wanted in n.lower()])
+
+    def row(self, category_id: int) -> Dict[str, Any]:
+        """Flattened view of one category. / Dạng phẳng của một nhóm hàng."""
+        return {
+            "categoryId": category_id,
+            "categoryName": self.names[category_id],
+            "parentId": self.parent[category_id],
+            "depth": self.depth[category_id],
+            "path": " > ".join(self.path[category_id]),
+            "childIds": sorted(self.children.get(category_id, [])),
+            "descendantCount": len(self.descendants[category_id]) - 1,
+        }
@@ -5,12 +5,135 @@ Receives access_token and retailer from Culi, no session management.
 Client API KiotViet - Triển khai Stateless.
 Nhận access_token và retailer từ Culi, không quản lý phiên.
 """
+import hashlib
+import threading
+import time
 import httpx
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from kv_bulk import map_bounded
+from kv_deadline import CallCancelled, current_call
+from kv_scheduler import NORMAL, scheduler
 
 
 BASE_URL = "https://public.kiotapi.com"
 
+# Seconds a successful request vouches for a token before cached data needs a new check
+# Số giây một request thành công bảo chứng cho token trước khi dữ liệu cache cần kiểm tra lại
+VERIFY_TTL = 60.0
+
+
+class RequestNotSent(Exception):
+    """
+    The request was given up before it reached KiotViet (deadline, cancellation,
+    no scheduler slot), so it is safe to send again.
+    Request bị bỏ trước khi tới KiotViet (quá hạn, bị hủy, không có slot scheduler),
+    nên có thể gửi lại an toàn.
+    """
+
+
+class TokenRejectedError(RequestNotSent):
+    """
+    Raised without calling the API when KiotViet already answered 401 for this token.
+    Được raise mà không gọi API khi KiotViet đã trả 401 cho token này.
+    """
+
+
+def token_hash(access_token: str) -> str:
+    """Hash of a token, used wherever a token identifies a caller. / Hash của token, dùng khi token định danh người gọi."""
+    return hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+
+
+class _Session:
+    """
+    Prebuilt headers, 401 state and last accepted request for one (token, retailer).
+    Headers dựng sẵn, trạng thái 401 và lần được chấp nhận gần nhất cho một (token, retailer).
+    """
+
+    __slots__ = ("headers", "rejected", "verified_at")
+
+    def __init__(self, access_token: str, retailer: str):
+        self.headers: Dict[str, str] = {
+            "Retailer": retailer,
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
+        self.rejected = False
+        # time.monotonic() of the last 2xx answer, 0 = never / time.monotonic() của phản hồi 2xx gần nhất, 0 = chưa có
+        self.verified_at = 0.0
+
+
+class SessionRegistry:
+    """
+    Per-(token hash, retailer) registry of prebuilt headers and rejected tokens.
+    Registry theo (hash token, retailer) chứa headers dựng sẵn và các token bị từ chối.
+    Only a hash of the token is used as key; the token itself lives in the headers.
+    Chỉ dùng hash của token làm khóa; token nằm trong headers.
+    """
+
+    def __init__(self, max_sessions: int = 1024):
+        self._max_sessions = max_sessions
+        self._sessions: Dict[Tuple[str, str], _Session] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(access_token: str, retailer: str) -> Tuple[str, str]:
+        return token_hash(access_token), retailer
+
+    def get(self, access_token: str, retailer: str) -> _Session:
+        """Get or create the session. / Lấy hoặc tạo session."""
+        key = self._key(access_token, retailer)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                return session
+            # A new token for this retailer clears its rejected tokens
+            # Token mới cho retailer này xóa các token đã bị từ chối
+            for other_key in [k for k, s in self._sessions.items() if k[1] == retailer and s.rejected]:
+                del self._sessions[other_key]
+            if len(self._sessions) >= self._max_sessions:
+                del self._sessions[next(iter(self._sessions))]
+            session = _Session(access_token, retailer)
+            self._sessions[key] = session
+            return session
+
+    def mark_rejected(self, session: _Session) -> None:
+        """Record a 401 for the session. / Ghi nhận 401 cho session."""
+        with self._lock:
+            session.rejected = True
+
+    def is_rejected(self, access_token: str, retailer: str) -> bool:
+        """Whether KiotViet already answered 401 for this token. / KiotViet đã trả 401 cho token này chưa."""
+        session = self._sessions.get(self._key(access_token, retailer))
+        return session is not None and session.rejected
+
+    def clear(self) -> None:
+        """Drop all sessions. / Xóa toàn bộ session."""
+        with self._lock:
+            self._sessions.clear()
+
+
+# Shared by every client in the process / Dùng chung cho mọi client trong tiến trình
+sessions = SessionRegistry()
+
+# Connection pool shared by every client, sized to the scheduler's global limit
+# Connection pool dùng chung cho mọi client, theo giới hạn toàn cục của scheduler
+_shared_client: Optional[httpx.Client] = None
+_shared_client_lock = threading.Lock()
+
+
+def _get_shared_client() -> httpx.Client:
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                limits = httpx.Limits(
+                    max_connections=scheduler.max_concurrency,
+                    max_keepalive_connections=scheduler.max_concurrency,
+                )
+                _shared_client = httpx.Client(timeout=30.0, limits=limits)
+    return _shared_client
+
 
 class KiotVietClient:
     """
@@ -22,7 +145,7 @@ class KiotVietClient:
     Không quản lý token, không có trạng thái phiên.
     """
     
-    def __init__(self, access_token: str, retailer: str):
+    def __init__(self, access_token: str, retailer: str, priority: Optional[int] = None):
         """
         Initialize client with access_token and retailer.
         Khởi tạo client với access_token và retailer.
@@ -30,59 +153,153 @@ class KiotVietClient:
         Args:
             access_token: OAuth2 access token (obtained by Culi) / Token OAuth2 (do Culi cung cấp)
             retailer: Retailer name (tên gian hàng)
+            priority: Scheduler lane (kv_scheduler.INTERACTIVE, NORMAL, BULK), defaults to the current tool call's lane / Làn ưu tiên của scheduler, mặc định theo lần gọi tool hiện tại
         """
         self.access_token = access_token
         self.retailer = retailer
+        if priority is None:
+            call = current_call.get()
+            priority = call.priority if call is not None else NORMAL
+        self.priority = priority
+        self._session = sessions.get(access_token, retailer)
         self._client: Optional[httpx.Client] = None
 
     def _headers(self) -> Dict[str, str]:
         """Get headers with authentication for API requests. / Lấy headers với xác thực cho các request API."""
-        return {
-            "Retailer": self.retailer,
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
+        return self._session.headers
 
     def _get_client(self) -> httpx.Client:
-        """Get or create HTTP client. / Lấy hoặc tạo HTTP client."""
+        """Get the shared HTTP client. / Lấy HTTP client dùng chung."""
         if self._client is None:
-            self._client = httpx.Client(timeout=30.0)
+            self._client = _get_shared_client()
         return self._client
 
-    def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
-        """Make a GET request to the KiotViet API. / Thực hiện GET request đến KiotViet API."""
+    def _request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                 json_body: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """
+        Send a request, failing fast for tokens already rejected with 401.
+        Gửi request, báo lỗi ngay với token đã bị từ chối (401).
+        Inside a tool call, the call's deadline bounds both the scheduler wait and
+        the HTTP timeout, and a cancelled call sends no further requests.
+        Trong một lần gọi tool, thời hạn của lần gọi giới hạn cả thời gian chờ
+        scheduler và timeout HTTP; lần gọi đã bị hủy không gửi thêm request.
+        Failures before the request is sent raise RequestNotSent.
+        Lỗi xảy ra trước khi gửi request được raise dưới dạng RequestNotSent.
+        """
+        call = current_call.get()
+        if self._session.rejected:
+            raise TokenRejectedError(
+                f"access_token was rejected by KiotViet (401) for retailer '{self.retailer}', a new token is required"
+                f" / access_token đã bị KiotViet từ chối (401) cho gian hàng '{self.retailer}', cần token mới"
+            )
         url = f"{BASE_URL}{path}"
         client = self._get_client()
-        resp = client.get(url, headers=self._headers(), params=params)
+        sent = False
+        try:
+            if call is None:
+                with scheduler.slot(self.retailer, self.priority):
+                    sent = True
+                    resp = client.request(method, url, headers=self._headers(), params=params, json=json_body)
+            else:
+                call.check()
+                call.on_cancel(scheduler.wake)
+                with scheduler.slot(self.retailer, self.priority, timeout=call.remaining(), check=call.check):
+                    call.check()
+                    sent = True
+                    try:
+                        resp = client.request(
+                            method, url, headers=self._headers(), params=params, json=json_body,
+                            timeout=min(30.0, call.remaining()),
+                        )
+                    except httpx.TimeoutException:
+                        # Report the call deadline rather than the shortened HTTP timeout / Báo lỗi thời hạn của lần gọi thay vì timeout HTTP đã rút ngắn
+                        call.check()
+                        raise
+        except (TimeoutError, CallCancelled) as e:
+            if sent:
+                raise
+            # Deadline, cancellation or scheduler wait before sending / Quá hạn, bị hủy hoặc chờ scheduler trước khi gửi
+            raise RequestNotSent(str(e)) from e
+        if resp.status_code == 401:
+            sessions.mark_rejected(self._session)
         resp.raise_for_status()
-        return resp.json()
+        self._session.verified_at = time.monotonic()
+        return resp
+
+    def ensure_authenticated(self) -> None:
+        """
+        Make sure KiotViet accepted this token within VERIFY_TTL seconds, with one
+        cheap request otherwise. Call before serving shared cached data.
+        Đảm bảo KiotViet đã chấp nhận token này trong VERIFY_TTL giây, nếu không thì
+        gửi một request nhẹ. Gọi trước khi trả dữ liệu cache dùng chung.
+        """
+        if time.monotonic() - self._session.verified_at >= VERIFY_TTL:
+            self.get("/branches", {"pageSize": 1, "currentItem": 0})
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Make a GET request to the KiotViet API. / Thực hiện GET request đến KiotViet API."""
+        return self._request("GET", path, params=params).json()
+
+    def get_all(self, path: str, params: Optional[Dict[str, Any]] = None, page_size: int = 100,
+                max_workers: int = 4, max_items: Optional[int] = None,
+                on_page: Optional[Callable[[List[Dict[str, Any]], int], None]] = None,
+                collect: bool = True) -> List[Dict[str, Any]]:
+        """
+        Fetch every page of a list endpoint and return the rows, deduplicated by id.
+        Lấy tất cả các trang của endpoint danh sách và trả về các dòng, loại trùng theo id.
+        The first page gives the total; remaining pages are fetched concurrently.
+        Trang đầu cho biết total; các trang còn lại được lấy song song.
+        on_page(rows, total) is called for every page as it arrives, possibly from
+        several threads; with collect=False pages are not kept and [] is returned.
+        on_page(rows, total) được gọi cho mỗi trang khi nhận được, có thể từ nhiều
+        luồng; với collect=False các trang không được giữ lại và trả về [].
+        """
+        base = dict(params or {})
+        base["pageSize"] = min(page_size, 100)
+        first = self.get(path, dict(base, currentItem=0))
+        rows: List[Dict[str, Any]] = list(first.get("data") or [])
+        total = first.get("total") or 0
+        if max_items is not None:
+            total = min(total, max_items)
+        if on_page is not None:
+            on_page(rows, total)
+
+        def fetch(offset: int) -> Dict[str, Any]:
+            page = self.get(path, dict(base, currentItem=offset))
+            if on_page is not None:
+                on_page(page.get("data") or [], total)
+            return page if collect else {}
+
+        offsets = range(len(rows), total, base["pageSize"]) if rows else range(0)
+        pages = map_bounded(fetch, offsets, max_workers)
+        if not collect:
+            return []
+        for page in pages:
+            rows.extend(page.get("data") or [])
+        seen = set()
+        unique = []
+        for row in rows:
+            row_id = row.get("id")
+            if row_id is not None:
+                if row_id in seen:
+                    continue
+                seen.add(row_id)
+            unique.append(row)
+        return unique[:max_items] if max_items is not None else unique
 
     def post(self, path: str, json_body: Dict[str, Any]) -> Any:
         """Make a POST request to the KiotViet API. / Thực hiện POST request đến KiotViet API."""
-        url = f"{BASE_URL}{path}"
-        client = self._get_client()
-        resp = client.post(url, headers=self._headers(), json=json_body)
-        resp.raise_for_status()
-        return resp.json()
+        return self._request("POST", path, json_body=json_body).json()
 
     def put(self, path: str, json_body: Dict[str, Any]) -> Any:
         """Make a PUT request to the KiotViet API. / Thực hiện PUT request đến KiotViet API."""
-        url = f"{BASE_URL}{path}"
-        client = self._get_client()
-        resp = client.put(url, headers=self._headers(), json=json_body)
-        resp.raise_for_status()
-        return resp.json()
+        return self._request("PUT", path, json_body=json_body).json()
 
     def delete(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
         """Make a DELETE request to the KiotViet API. / Thực hiện DELETE request đến KiotViet API."""
-        url = f"{BASE_URL}{path}"
-        client = self._get_client()
-        resp = client.delete(url, headers=self._headers(), params=params)
-        resp.raise_for_status()
+        resp = self._request("DELETE", path, params=params)
         return resp.json() if resp.text else {"message": "success"}
 
     def close(self) -> None:
-        """Close the HTTP client. / Đóng HTTP client."""
-        if self._client is not None:
-            self._client.close()
-            self._client = None
+        """Release the HTTP client; the shared pool stays open. / Bỏ HTTP client; pool dùng chung vẫn mở."""
+        self._client = None
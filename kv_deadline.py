@@ -0,0 +1,238 @@
+"""
+Per-call deadlines and cancellation for tools.
+Each tool call gets a CallContext; KiotVietClient checks it before every request,
+so a cancelled or expired call stops fetching pages and leaves the scheduler queue.
+
+Thời hạn và hủy cho từng lần gọi tool.
+Mỗi lần gọi tool có một CallContext; KiotVietClient kiểm tra trước mỗi request,
+nên lần gọi bị hủy hoặc hết hạn sẽ dừng lấy trang và rời hàng đợi scheduler.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from kv_scheduler import BULK, INTERACTIVE, NORMAL
+
+
+# Default deadline in seconds per scheduler lane / Thời hạn mặc định (giây) theo làn scheduler
+DEFAULT_TIMEOUTS: Dict[int, float] = {INTERACTIVE: 15.0, NORMAL: 30.0, BULK: 120.0}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The tool call ran past its deadline. / Lần gọi tool đã quá thời hạn."""
+
+
+class CallCancelled(Exception):
+    """The MCP client cancelled the tool call. / MCP client đã hủy lần gọi tool."""
+
+
+class CallContext:
+    """
+    Deadline, cancellation flag and scheduler lane of one tool call.
+    Thời hạn, cờ hủy và làn scheduler của một lần gọi tool.
+    """
+
+    def __init__(self, timeout: float, priority: int = NORMAL, tool: Optional[str] = None):
+        self.timeout = timeout
+        self.priority = priority
+        self.tool = tool
+        self.deadline = time.monotonic() + timeout
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        # Set by with_deadline when the MCP request context is available
+        # Được with_deadline gán khi có MCP request context
+        self.notify: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._last_progress = 0.0
+        self._chunks = 0
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline. / Số giây còn lại trước thời hạn."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self) -> None:
+        """Raise if the call was cancelled or is past its deadline. / Raise nếu lần gọi đã bị hủy hoặc quá hạn."""
+        if self._cancelled.is_set():
+            raise CallCancelled("Tool call was cancelled / Lần gọi tool đã bị hủy")
+        if time.monotonic() >= self.deadline:
+            raise DeadlineExceeded(
+                f"Tool call exceeded its {self.timeout:g}s deadline / Lần gọi tool đã quá thời hạn {self.timeout:g} giây"
+            )
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Run callback when the call is cancelled (once per callback). / Chạy callback khi lần gọi bị hủy."""
+        with self._lock:
+            if callback not in self._callbacks:
+                self._callbacks.append(callback)
+
+    def report_progress(self, progress: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        """
+        Send an MCP progress notification, at most every 0.2s except the final one.
+        Gửi MCP progress notification, tối đa 0.2 giây một lần trừ lần cuối.
+        """
+        if self.notify is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_progress < 0.2 and (total is None or progress < total):
+                return
+            self._last_progress = now
+        self.notify("progress", {"progress": progress, "total": total, "message": message})
+
+    def send_partial(self, rows: List[Any], message: Optional[str] = None) -> None:
+        """
+        Stream a chunk of partial results as an MCP log notification.
+        Gửi một phần kết quả dưới dạng MCP log notification.
+        """
+        if self.notify is None:
+            return
+        with self._lock:
+            self._chunks += 1
+            chunk = self._chunks
+        self.notify("partial", {"chunk": chunk, "rows": rows, "message": message or f"chunk {chunk}"})
+
+    def cancel(self) -> None:
+        """Cancel the call and wake anything waiting for it. / Hủy lần gọi và đánh thức các bên đang chờ."""
+        self._cancelled.set()
+        with self._lock:
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            callback()
+
+
+# Call context of the running tool, copied into worker threads
+# Context của tool đang chạy, được sao chép sang các worker thread
+current_call: contextvars.ContextVar[Optional[CallContext]] = contextvars.ContextVar("kv_current_call", default=None)
+
+
+# Thread id -> tool running on it, read by the sampling profiler
+# Thread id -> tool đang chạy trên thread đó, được sampling profiler đọc
+thread_tools: Dict[int, str] = {}
+
+
+def run_tagged(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run fn with the current thread tagged by the current call's tool name.
+    Chạy fn, gắn thread hiện tại với tên tool của lần gọi hiện tại.
+    """
+    call = current_call.get()
+    if call is None or call.tool is None:
+        return fn(*args, **kwargs)
+    ident = threading.get_ident()
+    previous = thread_tools.get(ident)
+    thread_tools[ident] = call.tool
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if previous is None:
+            thread_tools.pop(ident, None)
+        else:
+            thread_tools[ident] = previous
+
+
+def report_progress(progress: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+    """Report progress of the current tool call, if any. / Báo tiến độ của lần gọi tool hiện tại (nếu có)."""
+    call = current_call.get()
+    if call is not None:
+        call.report_progress(progress, total, message)
+
+
+def send_partial(rows: List[Any], message: Optional[str] = None) -> None:
+    """Stream partial rows of the current tool call, if any. / Gửi một phần kết quả của lần gọi tool hiện tại (nếu có)."""
+    call = current_call.get()
+    if call is not None:
+        call.send_partial(rows, message)
+
+
+class ProgressCounter:
+    """
+    Thread-safe counter that reports "done/total unit" progress for the current call.
+    Bộ đếm an toàn đa luồng, báo tiến độ "đã xong/tổng đơn vị" cho lần gọi hiện tại.
+    """
+
+    def __init__(self, total: int, unit: str = "items"):
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self._lock = threading.Lock()
+        report_progress(0, total, f"0/{total} {unit}")
+
+    def step(self, count: int = 1) -> None:
+        with self._lock:
+            self.done += count
+            done = self.done
+        report_progress(done, self.total, f"{done}/{self.total} {self.unit}")
+
+
+def _mcp_notifier() -> Optional[Callable[[str, Dict[str, Any]], None]]:
+    """
+    Bridge notifications from worker threads to the MCP session on the event loop.
+    Chuyển notification từ worker thread sang MCP session trên event loop.
+    """
+    from fastmcp.server.dependencies import get_context
+
+    try:
+        ctx = get_context()
+    except RuntimeError:
+        return None
+    loop = asyncio.get_running_loop()
+
+    def notify(kind: str, payload: Dict[str, Any]) -> None:
+        if kind == "progress":
+            coro = ctx.report_progress(payload["progress"], payload["total"], payload["message"])
+        else:
+            coro = ctx.log(payload["message"], level="info", logger_name="kiotviet.partial", extra=payload)
+        asyncio.run_coroutine_threadsafe(coro, loop)
+
+    return notify
+
+
+def with_deadline(priority: int = NORMAL) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Run a sync tool in a worker thread under a CallContext.
+    Chạy tool đồng bộ trong worker thread với một CallContext.
+    Adds a timeout_seconds parameter (default from DEFAULT_TIMEOUTS[priority]);
+    an MCP cancellation cancels the context so upstream fetches stop.
+    Thêm tham số timeout_seconds (mặc định theo DEFAULT_TIMEOUTS[priority]);
+    khi MCP hủy lần gọi, context bị hủy để dừng các request tới KiotViet.
+    """
+    default_timeout = DEFAULT_TIMEOUTS[priority]
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, timeout_seconds: Optional[float] = None, **kwargs: Any) -> Any:
+            call = CallContext(timeout_seconds or default_timeout, priority, tool=fn.__name__)
+            call.notify = _mcp_notifier()
+            token = current_call.set(call)
+            try:
+                # asyncio.to_thread copies the context, so the worker sees the call
+                # asyncio.to_thread sao chép context, nên worker thấy được call
+                return await asyncio.to_thread(run_tagged, fn, *args, **kwargs)
+            except asyncio.CancelledError:
+                call.cancel()
+                raise
+            finally:
+                current_call.reset(token)
+
+        signature = inspect.signature(fn)
+        timeout_param = inspect.Parameter(
+            "timeout_seconds", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Optional[float]
+        )
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), timeout_param])
+        wrapper.__annotations__ = {**fn.__annotations__, "timeout_seconds": Optional[float]}
+        wrapper.__doc__ = (fn.__doc__ or "").rstrip() + (
+            f"\n\n    timeout_seconds: Overall deadline for this call (default {default_timeout:g}s)"
+            f" / Thời hạn tổng cho lần gọi này (mặc định {default_timeout:g} giây)\n    "
+        )
+        del wrapper.__wrapped__
+        return wrapper
+
+    return decorate
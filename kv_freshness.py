@@ -0,0 +1,112 @@
+"""
+Freshness-aware routing for read tools.
+A read tool called with max_staleness (seconds) is answered from the fastest
+source holding a recent enough copy: the in-memory cache, the disk tier, or the
+live KiotViet API. Calls without max_staleness always go to the API.
+Cached answers are scoped to the token that fetched them, so a caller only gets
+data its own token could already read. Answers larger than
+KIOTVIET_READ_CACHE_MAX_ROWS rows (default 1000) are not cached, and only tools
+that opt in are written to the disk tier.
+
+Định tuyến theo độ mới cho các tool đọc.
+Tool đọc được gọi với max_staleness (giây) sẽ được trả lời từ nguồn nhanh nhất
+có bản sao đủ mới: cache bộ nhớ, tầng đĩa, hoặc API KiotViet. Lời gọi không có
+max_staleness luôn đi tới API.
+Kết quả cache gắn với token đã lấy chúng, nên người gọi chỉ nhận được dữ liệu mà
+chính token của họ đã đọc được. Kết quả lớn hơn KIOTVIET_READ_CACHE_MAX_ROWS dòng
+(mặc định 1000) không được cache, và chỉ các tool chọn bật mới được ghi xuống tầng đĩa.
+"""
+import functools
+import inspect
+import json
+import os
+import time
+from typing import Any, Callable, Optional
+
+from kv_cache import read_cache
+from kv_client import sessions, token_hash
+
+# Larger answers (scans, reports) are not cached / Kết quả lớn hơn (scan, báo cáo) không được cache
+MAX_CACHED_ROWS = int(os.getenv("KIOTVIET_READ_CACHE_MAX_ROWS", "1000"))
+
+
+def invalidate_reads(retailer: str, entity: str) -> None:
+    """
+    Drop cached read results of one entity after a write or webhook event.
+    Xóa kết quả đọc đã cache của một loại dữ liệu sau khi ghi hoặc có sự kiện webhook.
+    """
+    read_cache.invalidate_kind(retailer, f"read_{entity}")
+
+
+def with_staleness(entity: str, persist: bool = False) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Add a max_staleness parameter to a read tool and route it.
+    Thêm tham số max_staleness cho tool đọc và định tuyến lời gọi.
+    Live answers up to MAX_CACHED_ROWS rows are kept in memory, so later calls that
+    accept stale data can use them; persist=True also writes them to the disk tier.
+    With max_staleness, the result gets "freshness": {"source", "age_seconds"}.
+    Kết quả lấy trực tiếp tối đa MAX_CACHED_ROWS dòng được giữ trong bộ nhớ để các
+    lời gọi chấp nhận dữ liệu cũ dùng lại; persist=True ghi thêm xuống tầng đĩa.
+    Khi có max_staleness, kết quả có thêm "freshness": {"source", "age_seconds"}.
+    """
+    kind = f"read_{entity}"
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, max_staleness: Optional[float] = None, **kwargs: Any) -> Any:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            access_token = arguments.pop("access_token", None) or ""
+            retailer = arguments.pop("retailer")
+            key = (retailer, kind, token_hash(access_token), fn.__name__, repr(sorted(arguments.items())))
+
+            # A rejected token goes live so KiotViet's 401 is reported / Token bị từ chối đi thẳng tới API để báo lỗi 401
+            if max_staleness is not None and not sessions.is_rejected(access_token, retailer):
+                found = read_cache.lookup(key, use_disk=persist)
+                if found is not None:
+                    (fetched_at, value), tier = found
+                    age = time.time() - fetched_at
+                    if age <= max_staleness:
+                        return _with_freshness(value, tier, age)
+
+            value = fn(*args, **kwargs)
+            size = _payload_size(value)
+            if size is not None:
+                read_cache.set(key, (time.time(), value), size=size, to_disk=persist)
+            if max_staleness is None:
+                return value
+            return _with_freshness(value, "live", 0.0)
+
+        staleness_param = inspect.Parameter(
+            "max_staleness", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Optional[float]
+        )
+        wrapper.__signature__ = signature.replace(parameters=[*signature.parameters.values(), staleness_param])
+        wrapper.__annotations__ = {**fn.__annotations__, "max_staleness": Optional[float]}
+        wrapper.__doc__ = (fn.__doc__ or "").rstrip() + (
+            "\n\n    max_staleness: Accept cached data up to this many seconds old (omit for live data)"
+            " / Chấp nhận dữ liệu cache cũ tối đa số giây này (bỏ trống để lấy dữ liệu trực tiếp)\n    "
+        )
+        del wrapper.__wrapped__
+        return wrapper
+
+    return decorate
+
+
+def _payload_size(value: Any) -> Optional[int]:
+    """Approximate size in bytes, None when the answer is too large to cache. / Kích thước byte ước lượng, None khi quá lớn để cache."""
+    rows = value.get("data") if isinstance(value, dict) else value
+    if isinstance(rows, list) and len(rows) > MAX_CACHED_ROWS:
+        return None
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return None
+
+
+def _with_freshness(value: Any, source: str, age: float) -> Any:
+    if not isinstance(value, dict):
+        return value
+    return {**value, "freshness": {"source": source, "age_seconds": round(age, 1)}}
@@ -0,0 +1,473 @@
+"""
+Retailer-affinity gateway for several replicas of the MCP server.
+Tool calls are routed by consistent hashing of their "retailer" argument, so each
+retailer's caches, connection pool and scheduler state stay on one replica.
+Replicas joining or leaving only move the retailers on their part of the ring;
+the new owner is asked to warm its caches for the retailers it takes over.
+
+Replicas run the HTTP transport (KIOTVIET_HTTP_PORT). Run the gateway with:
+    python kv_gateway.py
+
+Gateway định tuyến theo gian hàng cho nhiều replica của MCP server.
+Lời gọi tool được định tuyến bằng băm nhất quán tham số "retailer", nên cache,
+pool kết nối và trạng thái scheduler của mỗi gian hàng nằm trên một replica.
+Khi replica tham gia hoặc rời đi, chỉ các gian hàng thuộc phần vòng băm của nó
+bị chuyển; replica nhận mới được yêu cầu làm nóng cache cho các gian hàng đó.
+
+Các replica chạy HTTP transport (KIOTVIET_HTTP_PORT). Chạy gateway bằng:
+    python kv_gateway.py
+"""
+import bisect
+import hashlib
+import hmac
+import http.client
+import itertools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger("kiotviet.gateway")
+
+# Failures talking to a replica: network errors, malformed HTTP, non-JSON replies
+# Lỗi khi gọi replica: lỗi mạng, HTTP sai định dạng, phản hồi không phải JSON
+REPLICA_ERRORS = (OSError, http.client.HTTPException, ValueError)
+
+# Headers not forwarded between hops / Header không chuyển tiếp giữa các chặng
+HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "upgrade", "proxy-connection", "host"}
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+    Vòng băm nhất quán với các node ảo.
+    Each node owns vnodes points on the ring; a key belongs to the first point
+    clockwise from its hash, so adding or removing a node only moves the keys
+    next to its points.
+    Mỗi node sở hữu vnodes điểm trên vòng; một khóa thuộc về điểm đầu tiên theo
+    chiều kim đồng hồ tính từ giá trị băm của nó, nên thêm/bớt node chỉ chuyển
+    các khóa nằm cạnh các điểm của node đó.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), vnodes: int = 160):
+        self.vnodes = max(1, vnodes)
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: set = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for i in range(self.vnodes):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def preference(self, key: str) -> List[str]:
+        """
+        Distinct nodes clockwise from the key: the owner first, then fallbacks.
+        Các node khác nhau theo chiều kim đồng hồ từ khóa: node sở hữu trước, sau đó là dự phòng.
+        """
+        if not self._points:
+            return []
+        start = bisect.bisect(self._points, self._hash(key))
+        found: List[str] = []
+        for i in range(len(self._points)):
+            owner = self._owners[(start + i) % len(self._points)]
+            if owner not in found:
+                found.append(owner)
+                if len(found) == len(self._nodes):
+                    break
+        return found
+
+    def owner(self, key: str) -> Optional[str]:
+        nodes = self.preference(key)
+        return nodes[0] if nodes else None
+
+    def copy(self) -> "HashRing":
+        ring = HashRing(vnodes=self.vnodes)
+        ring._points, ring._owners, ring._nodes = list(self._points), list(self._owners), set(self._nodes)
+        return ring
+
+
+def tool_call_retailer(body: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (retailer, access_token) of a JSON-RPC tools/call request, or (None, None).
+    (retailer, access_token) của request JSON-RPC tools/call, hoặc (None, None).
+    Batches are routed by their first tool call.
+    Batch được định tuyến theo lời gọi tool đầu tiên.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return None, None
+    for message in payload if isinstance(payload, list) else [payload]:
+        if isinstance(message, dict) and message.get("method") == "tools/call":
+            arguments = (message.get("params") or {}).get("arguments") or {}
+            if arguments.get("retailer"):
+                return str(arguments["retailer"]), arguments.get("access_token")
+    return None, None
+
+
+class Gateway:
+    """
+    HTTP reverse proxy in front of the replicas.
+    Reverse proxy HTTP đứng trước các replica.
+    Endpoints besides the proxied MCP traffic / Endpoint ngoài lưu lượng MCP được chuyển tiếp:
+        GET  /gateway/ring      ring members and health / thành viên vòng băm và tình trạng
+        POST /gateway/replicas  {"url": ..., "action": "join" | "leave"} (Bearer KIOTVIET_GATEWAY_TOKEN)
+    """
+
+    def __init__(
+        self,
+        replicas: Iterable[str],
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        vnodes: int = 160,
+        token: Optional[str] = None,
+        health_interval: float = 5.0,
+        timeout: float = 300.0,
+        max_tracked: int = 10000,
+    ):
+        self.replicas = [url.rstrip("/") for url in replicas]
+        self.ring = HashRing(self.replicas, vnodes)
+        self.down: set = set()
+        self.token = token
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.max_tracked = max_tracked
+        # Recently routed retailers and their last access_token, for warm-up hand-off
+        # Các gian hàng được định tuyến gần đây và access_token cuối, dùng khi chuyển giao làm nóng
+        self._recent: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._stop = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @classmethod
+    def from_env(cls) -> "Gateway":
+        """
+        KIOTVIET_GATEWAY_REPLICAS (comma separated URLs, required), KIOTVIET_GATEWAY_HOST, KIOTVIET_GATEWAY_PORT,
+        KIOTVIET_GATEWAY_VNODES, KIOTVIET_GATEWAY_TOKEN, KIOTVIET_GATEWAY_HEALTH_INTERVAL.
+        """
+        replicas = [url.strip() for url in os.getenv("KIOTVIET_GATEWAY_REPLICAS", "").split(",") if url.strip()]
+        if not replicas:
+            raise ValueError("KIOTVIET_GATEWAY_REPLICAS is required / Cần cấu hình KIOTVIET_GATEWAY_REPLICAS")
+        return cls(
+            replicas,
+            host=os.getenv("KIOTVIET_GATEWAY_HOST", "127.0.0.1"),
+            port=int(os.getenv("KIOTVIET_GATEWAY_PORT", "8080")),
+            vnodes=int(os.getenv("KIOTVIET_GATEWAY_VNODES", "160")),
+            token=os.getenv("KIOTVIET_GATEWAY_TOKEN"),
+            health_interval=float(os.getenv("KIOTVIET_GATEWAY_HEALTH_INTERVAL", "5")),
+        )
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ------------------------------------------------------------------
+    # Routing / Định tuyến
+    # ------------------------------------------------------------------
+
+    def route(self, retailer: Optional[str], access_token: Optional[str] = None) -> List[str]:
+        """
+        Replicas to try for a request, best first.
+        Các replica cần thử cho một request, tốt nhất trước.
+        Requests without a retailer (initialize, tools/list...) are spread round robin.
+        Request không có retailer (initialize, tools/list...) được chia vòng tròn.
+        """
+        with self._lock:
+            ring = self.ring
+            if retailer is None:
+                nodes = ring.nodes
+                if not nodes:
+                    return []
+                start = next(self._round_robin) % len(nodes)
+                return nodes[start:] + nodes[:start]
+            self._recent[retailer] = access_token or self._recent.get(retailer)
+            self._recent.move_to_end(retailer)
+            while len(self._recent) > self.max_tracked:
+                self._recent.popitem(last=False)
+        return ring.preference(retailer)
+
+    def join(self, url: str, warm: bool = True) -> Dict[str, int]:
+        """
+        Add a replica. Retailers moving to it are warmed there before traffic switches.
+        Thêm replica. Các gian hàng chuyển sang được làm nóng trước khi chuyển lưu lượng.
+        A replica that left or went down during the warm-up is not added.
+        Replica đã rời đi hoặc không phản hồi trong lúc làm nóng sẽ không được thêm.
+        """
+        url = url.rstrip("/")
+        with self._lock:
+            if url not in self.replicas:
+                self.replicas.append(url)
+            self.down.discard(url)
+            ring = self.ring.copy()
+            ring.add(url)
+            moved = self._moved(self.ring, ring)
+        if warm:
+            self._hand_off(moved)
+        with self._lock:
+            # Apply to the current ring: replicas may have left during the warm-up
+            # Áp dụng lên ring hiện tại: replica khác có thể đã rời đi trong lúc làm nóng
+            if url in self.replicas and url not in self.down:
+                ring = self.ring.copy()
+                ring.add(url)
+                self.ring = ring
+        return {owner: len(retailers) for owner, retailers in moved.items()}
+
+    def leave(self, url: str, forget: bool = True) -> Dict[str, int]:
+        """
+        Remove a replica (forget=False keeps it for health checks to bring back).
+        Traffic switches first, then the new owners warm up in the background.
+        Bỏ replica (forget=False để kiểm tra sống có thể thêm lại).
+        Lưu lượng được chuyển trước, sau đó replica nhận mới làm nóng ở nền.
+        """
+        url = url.rstrip("/")
+        with self._lock:
+            if forget and url in self.replicas:
+                self.replicas.remove(url)
+            ring = self.ring.copy()
+            ring.remove(url)
+            moved = self._moved(self.ring, ring)
+            self.ring = ring
+        threading.Thread(target=self._hand_off, args=(moved,), daemon=True).start()
+        return {owner: len(retailers) for owner, retailers in moved.items()}
+
+    def _moved(self, before: HashRing, after: HashRing) -> Dict[str, List[Tuple[str, Optional[str]]]]:
+        """Recent retailers whose owner changes, by new owner. / Gian hàng gần đây đổi node sở hữu, theo node mới."""
+        moved: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        for retailer, access_token in self._recent.items():
+            owner = after.owner(retailer)
+            if owner is not None and owner != before.owner(retailer):
+                moved.setdefault(owner, []).append((retailer, access_token))
+        return moved
+
+    def _hand_off(self, moved: Dict[str, List[Tuple[str, Optional[str]]]]) -> None:
+        if not self.token:
+            return
+        for owner, retailers in moved.items():
+            body = json.dumps({
+                "retailers": [{"retailer": retailer, "access_token": token} for retailer, token in retailers],
+            }).encode("utf-8")
+            try:
+                status, reply = self._call(owner, "POST", "/cache/warm", body, {
+                    "Content-Type": "application/json", "Authorization": f"Bearer {self.token}",
+                })
+                payload = json.loads(reply) if status == 200 else {}
+                results = payload.get("results") or [] if isinstance(payload, dict) else []
+                warmed = sum(1 for result in results if isinstance(result, dict) and result.get("status") == "done")
+                logger.info("Warm-up on %s: HTTP %s, %d/%d retailers warmed", owner, status, warmed, len(retailers))
+            except REPLICA_ERRORS as e:
+                logger.warning("Warm-up on %s failed / Làm nóng trên %s lỗi: %s", owner, owner, e)
+
+    # ------------------------------------------------------------------
+    # Health checks / Kiểm tra sống
+    # ------------------------------------------------------------------
+
+    def check_health(self) -> None:
+        """Probe every replica once; move failed ones out of the ring and recovered ones back in."""
+        for url in list(self.replicas):
+            try:
+                healthy = self._call(url, "GET", "/health", None, {}, timeout=min(self.health_interval, 5.0))[0] == 200
+            except REPLICA_ERRORS:
+                healthy = False
+            with self._lock:
+                went_down = not healthy and url not in self.down
+                if went_down:
+                    self.down.add(url)
+                came_back = healthy and url in self.down
+            if went_down:
+                logger.warning("Replica %s is down / Replica %s không phản hồi", url, url)
+                self.leave(url, forget=False)
+            elif came_back:
+                logger.info("Replica %s is back / Replica %s hoạt động lại", url, url)
+                self.join(url)
+
+    def _run_health_checks(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_health()
+            except Exception:
+                # Keep checking; a dead thread would freeze the ring / Tiếp tục kiểm tra; thread chết sẽ làm ring đứng yên
+                logger.exception("Health check failed / Kiểm tra sống lỗi")
+
+    # ------------------------------------------------------------------
+    # HTTP / HTTP
+    # ------------------------------------------------------------------
+
+    def _call(
+        self, url: str, method: str, path: str, body: Optional[bytes], headers: Dict[str, str],
+        timeout: Optional[float] = None,
+    ) -> Tuple[int, bytes]:
+        connection = self._connect(url, timeout or self.timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _connect(url: str, timeout: float) -> http.client.HTTPConnection:
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        return connection_class(parts.hostname, parts.port, timeout=timeout)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            nodes = self.ring.nodes
+            owned: Dict[str, int] = {node: 0 for node in nodes}
+            for retailer in self._recent:
+                owner = self.ring.owner(retailer)
+                if owner is not None:
+                    owned[owner] += 1
+            return {
+                "replicas": list(self.replicas),
+                "ring": nodes,
+                "down": sorted(self.down),
+                "vnodes": self.ring.vnodes,
+                "tracked_retailers": len(self._recent),
+                "retailers_per_replica": owned,
+            }
+
+    def _handler(self) -> type:
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format, *args)
+
+            def _reply(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+            def _admin(self, body: bytes) -> None:
+                supplied = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+                if not gateway.token or not hmac.compare_digest(supplied.encode("utf-8"), gateway.token.encode("utf-8")):
+                    self._reply(401, {"error": "Invalid gateway token / Token gateway không hợp lệ"})
+                    return
+                try:
+                    request = json.loads(body)
+                    url, action = request["url"], request["action"]
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400, {"error": 'Expected {"url", "action"} / Cần {"url", "action"}'})
+                    return
+                if action == "join":
+                    self._reply(200, {"moved": gateway.join(url), **gateway.status()})
+                elif action == "leave":
+                    self._reply(200, {"moved": gateway.leave(url), **gateway.status()})
+                else:
+                    self._reply(400, {"error": "action must be join or leave / action phải là join hoặc leave"})
+
+            def _proxy(self, body: Optional[bytes]) -> None:
+                retailer, access_token = tool_call_retailer(body) if body else (None, None)
+                headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+                for url in gateway.route(retailer, access_token):
+                    connection = gateway._connect(url, gateway.timeout)
+                    try:
+                        connection.request(self.command, self.path, body=body, headers=headers)
+                    except REPLICA_ERRORS as e:
+                        # Not delivered, safe to try the next replica / Chưa gửi được, có thể thử replica tiếp theo
+                        logger.warning("Replica %s unreachable / Không kết nối được replica %s: %s", url, url, e)
+                        connection.close()
+                        continue
+                    try:
+                        try:
+                            response = connection.getresponse()
+                        except REPLICA_ERRORS as e:
+                            # May have been applied, so no retry / Có thể đã được xử lý, nên không thử lại
+                            self._reply(502, {"error": f"Replica {url} failed / Replica {url} lỗi: {e}"})
+                            return
+                        self.send_response(response.status, response.reason)
+                        for key, value in response.getheaders():
+                            if key.lower() not in HOP_HEADERS:
+                                self.send_header(key, value)
+                        self.send_header("Connection", "close")
+                        self.end_headers()
+                        # Stream as it arrives (SSE responses) / Chuyển tiếp ngay khi nhận (phản hồi SSE)
+                        while True:
+                            chunk = response.read1(65536)
+                            if not chunk:
+                                break
+                            self.wfile.write(chunk)
+                            self.wfile.flush()
+                    finally:
+                        connection.close()
+                    return
+                self._reply(503, {"error": "No replica available / Không có replica nào khả dụng"})
+
+            def do_GET(self) -> None:
+                if self.path == "/gateway/ring":
+                    self._reply(200, gateway.status())
+                else:
+                    self._proxy(None)
+
+            def do_POST(self) -> None:
+                body = self._body()
+                if self.path == "/gateway/replicas":
+                    self._admin(body)
+                else:
+                    self._proxy(body)
+
+            def do_DELETE(self) -> None:
+                self._proxy(None)
+
+        return Handler
+
+    def start(self) -> "Gateway":
+        threading.Thread(target=self._server.serve_forever, name="kv-gateway", daemon=True).start()
+        if self.health_interval > 0:
+            threading.Thread(target=self._run_health_checks, name="kv-gateway-health", daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        if self.health_interval > 0:
+            threading.Thread(target=self._run_health_checks, name="kv-gateway-health", daemon=True).start()
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    gateway = Gateway.from_env()
+    logger.info("kv_gateway on %s -> %s", gateway.address, ", ".join(gateway.replicas))
+    gateway.serve_forever()
@@ -0,0 +1,114 @@
+"""
+Low-overhead sampling profiler that can be switched on at runtime.
+Samples the stacks of threads running kv_* tools and writes a collapsed-stack
+file ("frame;frame;frame count" per line) for flamegraph.pl or speedscope.
+
+Sampling profiler nhẹ, có thể bật khi server đang chạy.
+Lấy mẫu stack của các thread đang chạy tool kv_* và ghi file collapsed-stack
+(mỗi dòng "frame;frame;frame số_lần") cho flamegraph.pl hoặc speedscope.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from kv_deadline import thread_tools
+
+
+def _frame_label(frame: Any) -> str:
+    module = frame.f_globals.get("__name__") or os.path.basename(frame.f_code.co_filename)
+    return f"{module}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Samples tool threads every interval seconds; one profile runs at a time.
+    Lấy mẫu các thread tool mỗi interval giây; mỗi lúc chỉ chạy một profile.
+    """
+
+    def __init__(self, output_dir: Optional[str] = None):
+        self.output_dir = output_dir or os.getenv("KIOTVIET_PROFILE_DIR") or tempfile.gettempdir()
+        self._running = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._running.locked()
+
+    def profile(self, seconds: float, interval: float = 0.005) -> Dict[str, Any]:
+        """
+        Sample for the given seconds in the calling thread, write the file and return a summary.
+        Lấy mẫu trong số giây đã cho ngay trên thread gọi, ghi file và trả về tóm tắt.
+        """
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("A profile is already running / Đang có một profile chạy")
+        try:
+            stacks, samples = self._sample(seconds, interval)
+        finally:
+            self._running.release()
+        path = os.path.join(self.output_dir, f"kv-profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return self._summary(path, stacks, samples, seconds, interval)
+
+    def start(self, seconds: float, interval: float = 0.005) -> threading.Thread:
+        """
+        Profile in a background thread (used by the signal handler).
+        Chạy profile trên thread nền (dùng cho signal handler).
+        """
+        thread = threading.Thread(
+            target=self.profile, args=(seconds, interval), name="kv-profiler", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _sample(self, seconds: float, interval: float) -> Tuple[Counter, int]:
+        stacks: Counter = Counter()
+        samples = 0
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            tagged = dict(thread_tools)
+            tagged.pop(own, None)
+            if tagged:
+                frames = sys._current_frames()
+                for ident, tool in tagged.items():
+                    frame = frames.get(ident)
+                    labels: List[str] = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if labels:
+                        stacks[";".join([tool, *reversed(labels)])] += 1
+                samples += 1
+            time.sleep(interval)
+        return stacks, samples
+
+    @staticmethod
+    def _summary(path: str, stacks: Counter, samples: int, seconds: float, interval: float) -> Dict[str, Any]:
+        per_tool: Counter = Counter()
+        leaves: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")
+            per_tool[frames[0]] += count
+            leaves[frames[-1]] += count
+        total = sum(stacks.values())
+        return {
+            "path": path,
+            "seconds": seconds,
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "stack_samples": total,
+            "tools": dict(per_tool.most_common()),
+            "top_frames": [
+                {"frame": frame, "samples": count, "share": round(count / total, 3)}
+                for frame, count in leaves.most_common(15)
+            ],
+        }
+
+
+# Shared by the admin tool and the signal handler / Dùng chung cho tool admin và signal handler
+profiler = SamplingProfiler()
@@ -0,0 +1,181 @@
+"""
+Order-vs-invoice reconciliation.
+Orders and invoice pages are folded into hash indexes keyed by order code as
+they arrive, then joined once, so the work is linear in the number of rows and
+only compact per-row tuples are kept.
+
+Đối soát đơn hàng với hóa đơn.
+Các trang đơn hàng và hóa đơn được gộp vào chỉ mục băm theo mã đơn ngay khi
+nhận được, sau đó nối một lần, nên thời gian tỉ lệ tuyến tính với số dòng và chỉ
+giữ lại các tuple gọn cho từng dòng.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from kv_analytics import CANCELLED_INVOICE, parse_timestamp
+
+# Order status "cancelled" / Trạng thái đơn "đã hủy"
+CANCELLED_ORDER = 4
+
+# Amounts closer than this are equal / Chênh lệch nhỏ hơn mức này được xem là bằng nhau
+AMOUNT_TOLERANCE = 0.5
+
+MISMATCH_KINDS = (
+    "not_invoiced",
+    "amount_mismatch",
+    "unpaid",
+    "cancelled_order_invoiced",
+    "invoice_without_order",
+)
+
+
+class _Order(NamedTuple):
+    id: Any
+    code: str
+    branch_id: Any
+    status: Any
+    total: float
+    purchased: Optional[datetime]
+
+
+class _Invoice(NamedTuple):
+    id: Any
+    code: str
+    branch_id: Any
+    total: float
+    paid: float
+    purchased: Optional[datetime]
+
+
+class Reconciler:
+    """
+    Hash join of orders and invoices on the order code.
+    Nối băm đơn hàng và hóa đơn theo mã đơn.
+    add_orders / add_invoices can be used as scan on_rows callbacks.
+    add_orders / add_invoices có thể dùng làm callback on_rows của scan.
+    Invoices are keyed by id per order, so a row seen twice counts once.
+    Hóa đơn được lưu theo id trong từng đơn, nên dòng gặp hai lần chỉ tính một lần.
+    """
+
+    def __init__(self):
+        self.orders: Dict[str, _Order] = {}
+        # order code -> invoice id (or code) -> invoice / mã đơn -> id hóa đơn (hoặc mã) -> hóa đơn
+        self.invoices: Dict[str, Dict[Any, _Invoice]] = {}
+
+    def add_orders(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            code = row.get("code")
+            if not code:
+                continue
+            self.orders[code] = _Order(
+                row.get("id"), code, row.get("branchId"), row.get("status"),
+                float(row.get("total") or 0), parse_timestamp(row.get("purchaseDate")),
+            )
+
+    def add_invoices(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            order_code = row.get("orderCode")
+            # Direct sales have no order / Hóa đơn bán trực tiếp không có đơn hàng
+            if not order_code or row.get("status") == CANCELLED_INVOICE:
+                continue
+            invoice_id = row.get("id")
+            key = invoice_id if invoice_id is not None else row.get("code")
+            self.invoices.setdefault(order_code, {})[key] = _Invoice(
+                invoice_id, row.get("code"), row.get("branchId"),
+                float(row.get("total") or 0), float(row.get("totalPayment") or 0),
+                parse_timestamp(row.get("purchaseDate")),
+            )
+
+    def result(self, end: datetime, max_mismatches: int = 500) -> Dict[str, Any]:
+        """
+        Join both sides and list the mismatches.
+        Nối hai phía và liệt kê các chênh lệch.
+        Invoices purchased on or after end only count when they settle an order
+        of the window (they were fetched to catch late invoicing).
+        Hóa đơn có ngày từ end trở đi chỉ được tính khi thuộc đơn trong khoảng
+        (chúng được lấy thêm để bắt các đơn xuất hóa đơn muộn).
+        """
+        mismatches: List[Dict[str, Any]] = []
+        counts = {kind: 0 for kind in MISMATCH_KINDS}
+        totals = {"ordered": 0.0, "invoiced": 0.0, "paid": 0.0}
+        groups: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+        matched = invoice_count = 0
+
+        def group(purchased: Optional[datetime], branch_id: Any) -> Dict[str, Any]:
+            day = purchased.date().isoformat() if purchased else None
+            found = groups.get((day, branch_id))
+            if found is None:
+                found = groups[(day, branch_id)] = {
+                    "date": day, "branchId": branch_id, "orders": 0, "invoices": 0, "mismatches": 0,
+                }
+            return found
+
+        def record(kind: str, cell: Dict[str, Any], **fields: Any) -> None:
+            counts[kind] += 1
+            cell["mismatches"] += 1
+            if len(mismatches) < max_mismatches:
+                mismatches.append({"type": kind, **fields})
+
+        for code, order in self.orders.items():
+            cell = group(order.purchased, order.branch_id)
+            cell["orders"] += 1
+            invoices = list(self.invoices.get(code, {}).values())
+            invoiced = sum(invoice.total for invoice in invoices)
+            paid = sum(invoice.paid for invoice in invoices)
+            cell["invoices"] += len(invoices)
+            invoice_count += len(invoices)
+            fields = {
+                "orderId": order.id, "orderCode": code, "branchId": order.branch_id,
+                "purchaseDate": order.purchased.isoformat() if order.purchased else None,
+                "orderTotal": order.total, "invoiceCodes": [invoice.code for invoice in invoices],
+                "invoiced": invoiced, "paid": paid,
+            }
+            if order.status == CANCELLED_ORDER:
+                if invoices:
+                    record("cancelled_order_invoiced", cell, **fields)
+                continue
+            totals["ordered"] += order.total
+            totals["invoiced"] += invoiced
+            totals["paid"] += paid
+            if not invoices:
+                record("not_invoiced", cell, **fields)
+            elif abs(invoiced - order.total) > AMOUNT_TOLERANCE:
+                record("amount_mismatch", cell, difference=invoiced - order.total, **fields)
+            elif invoiced - paid > AMOUNT_TOLERANCE:
+                record("unpaid", cell, outstanding=invoiced - paid, **fields)
+            else:
+                matched += 1
+
+        for order_code, invoices in self.invoices.items():
+            if order_code in self.orders:
+                continue
+            for invoice in invoices.values():
+                if invoice.purchased is not None and invoice.purchased >= end:
+                    continue
+                cell = group(invoice.purchased, invoice.branch_id)
+                cell["invoices"] += 1
+                invoice_count += 1
+                record(
+                    "invoice_without_order", cell,
+                    invoiceId=invoice.id, invoiceCode=invoice.code, orderCode=order_code,
+                    branchId=invoice.branch_id,
+                    purchaseDate=invoice.purchased.isoformat() if invoice.purchased else None,
+                    invoiced=invoice.total, paid=invoice.paid,
+                )
+
+        totals["unpaid"] = totals["invoiced"] - totals["paid"]
+        return {
+            "summary": {
+                "orders": len(self.orders),
+                "invoices": invoice_count,
+                "matched": matched,
+                "mismatches": counts,
+                "totals": totals,
+                "by_day_branch": [
+                    cell for _, cell in sorted(groups.items(), key=lambda item: (item[0][0] or "", str(item[0][1])))
+                    if cell["mismatches"]
+                ],
+            },
+            "truncated": sum(counts.values()) > len(mismatches),
+            "data": mismatches,
+        }
@@ -0,0 +1,203 @@
+"""
+Scan planner for full date-range scans of /invoices and /orders.
+Splits the range into windows sized by cheap pageSize=1 probes, then fetches
+windows in parallel instead of paging deep offsets.
+
+Bộ lập kế hoạch quét toàn bộ /invoices và /orders theo khoảng ngày.
+Chia khoảng thời gian thành các cửa sổ dựa trên probe pageSize=1, sau đó lấy
+các cửa sổ song song thay vì phân trang với offset lớn.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from kv_bulk import map_bounded
+from kv_client import KiotVietClient
+from kv_deadline import ProgressCounter, send_partial
+
+
+DAY = timedelta(days=1)
+HOUR = timedelta(hours=1)
+
+# (start, end, total) with end exclusive / (bắt đầu, kết thúc, total), không gồm kết thúc
+Window = Tuple[datetime, datetime, int]
+
+
+def parse_date(value: str, end: bool = False) -> datetime:
+    """
+    Parse "YYYY-MM-DD" or an ISO datetime. A date-only end covers the whole day.
+    Đọc "YYYY-MM-DD" hoặc datetime ISO. Ngày kết thúc không có giờ được tính hết ngày.
+    """
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) <= 10:
+        parsed += DAY
+    return parsed
+
+
+def format_date(value: datetime) -> str:
+    """Format a datetime for KiotViet date filters. / Định dạng datetime cho bộ lọc ngày của KiotViet."""
+    return value.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def probe_total(client: KiotVietClient, path: str, params: Dict[str, Any]) -> int:
+    """
+    Read only the total of a filtered list with a pageSize=1 request.
+    Chỉ đọc total của danh sách đã lọc bằng một request pageSize=1.
+    """
+    return client.get(path, dict(params, pageSize=1, currentItem=0)).get("total") or 0
+
+
+def _window_params(params: Dict[str, Any], keys: Tuple[str, str], start: datetime, end: datetime) -> Dict[str, Any]:
+    return dict(params, **{keys[0]: format_date(start), keys[1]: format_date(end)})
+
+
+def _floor(value: datetime, unit: timedelta) -> datetime:
+    if unit == DAY:
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _split(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    """
+    Halve a window near its midpoint, snapped to a midnight or, failing that, to a full hour.
+    Windows of one hour or less are not split.
+    Chia đôi cửa sổ gần điểm giữa, làm tròn về nửa đêm hoặc, nếu không được, về đầu giờ.
+    Cửa sổ dài một giờ trở xuống không được chia.
+    """
+    if end - start <= HOUR:
+        return [(start, end)]
+    middle = start + (end - start) / 2
+    for unit in (DAY, HOUR) if end - start > DAY else (HOUR,):
+        floor = _floor(middle, unit)
+        for cut in (floor, floor + unit):
+            if start < cut < end:
+                return [(start, cut), (cut, end)]
+    return [(start, end)]
+
+
+def plan_windows(
+    client: KiotVietClient,
+    path: str,
+    params: Dict[str, Any],
+    start: datetime,
+    end: datetime,
+    keys: Tuple[str, str] = ("fromPurchaseDate", "toPurchaseDate"),
+    max_window_rows: int = 2000,
+    max_workers: int = 4,
+) -> List[Window]:
+    """
+    Split [start, end) until each window holds at most max_window_rows rows or is one hour long or less.
+    Chia [start, end) cho đến khi mỗi cửa sổ có tối đa max_window_rows dòng hoặc dài không quá một giờ.
+    Dense windows are halved level by level; each level is probed concurrently. Empty windows are dropped.
+    Cửa sổ dày được chia đôi theo từng mức; mỗi mức được probe song song. Cửa sổ rỗng bị bỏ qua.
+    """
+    pending = [(start, end)]
+    done: List[Window] = []
+    while pending:
+        totals = map_bounded(
+            lambda window: probe_total(client, path, _window_params(params, keys, *window)), pending, max_workers
+        )
+        next_level: List[Tuple[datetime, datetime]] = []
+        for (window_start, window_end), total in zip(pending, totals):
+            if total == 0:
+                continue
+            halves = _split(window_start, window_end) if total > max_window_rows else [(window_start, window_end)]
+            if len(halves) == 1:
+                done.append((window_start, window_end, total))
+            else:
+                next_level.extend(halves)
+        pending = next_level
+    return sorted(done)
+
+
+def scan(
+    client: KiotVietClient,
+    path: str,
+    params: Dict[str, Any],
+    start: datetime,
+    end: datetime,
+    keys: Tuple[str, str] = ("fromPurchaseDate", "toPurchaseDate"),
+    max_rows: Optional[int] = None,
+    max_window_rows: int = 2000,
+    max_workers: int = 4,
+    stream_chunks: bool = False,
+    on_rows: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    collect: bool = True,
+) -> Dict[str, Any]:
+    """
+    Plan windows, fetch them in parallel and merge the rows, deduplicated by id.
+    Lập kế hoạch cửa sổ, lấy song song và gộp các dòng, loại trùng theo id.
+    With max_rows, only the earliest windows that fit are fetched and "truncated" is set.
+    Với max_rows, chỉ lấy các cửa sổ sớm nhất vừa đủ và đặt "truncated".
+    Progress (rows fetched / planned) is reported per page; with stream_chunks,
+    each page is also sent as a partial result.
+    Tiến độ (số dòng đã lấy / dự kiến) được báo theo từng trang; với stream_chunks,
+    mỗi trang cũng được gửi như một phần kết quả.
+    on_rows receives every page, one call at a time, without rows already passed
+    (windows share their boundary second); with collect=False rows are not kept
+    and "data" is empty, so only the ids seen stay in memory.
+    on_rows nhận từng trang, mỗi lần một lời gọi, bỏ các dòng đã chuyển trước đó
+    (các cửa sổ dùng chung giây ở mốc); với collect=False các dòng không được giữ
+    lại và "data" rỗng, nên bộ nhớ chỉ giữ các id đã gặp.
+    """
+    windows = plan_windows(client, path, params, start, end, keys, max_window_rows, max_workers)
+    planned = sum(window[2] for window in windows)
+    truncated = False
+    if max_rows is not None and planned > max_rows:
+        selected, running = [], 0
+        for window in windows:
+            if selected and running + window[2] > max_rows:
+                break
+            selected.append(window)
+            running += window[2]
+        windows, truncated = selected, True
+
+    progress = ProgressCounter(sum(window[2] for window in windows), "rows")
+    rows_lock = threading.Lock()
+    passed: Set[Any] = set()
+
+    def on_page(rows: List[Dict[str, Any]], _total: int) -> None:
+        progress.step(len(rows))
+        if stream_chunks and rows:
+            send_partial(rows, f"{len(rows)} rows")
+        if on_rows is not None:
+            with rows_lock:
+                fresh = []
+                for row in rows:
+                    row_id = row.get("id")
+                    if row_id is not None:
+                        if row_id in passed:
+                            continue
+                        passed.add(row_id)
+                    fresh.append(row)
+                if fresh:
+                    on_rows(fresh)
+
+    def fetch(window: Window) -> List[Dict[str, Any]]:
+        window_params = _window_params(params, keys, window[0], window[1])
+        return client.get_all(path, window_params, max_workers=1, on_page=on_page, collect=collect)
+
+    # Windows run in parallel, pages within a window run in order / Các cửa sổ chạy song song, các trang trong cửa sổ chạy tuần tự
+    pages = map_bounded(fetch, windows, max_workers)
+    seen = set()
+    rows: List[Dict[str, Any]] = []
+    for page in pages:
+        for row in page:
+            row_id = row.get("id")
+            if row_id is not None:
+                if row_id in seen:
+                    continue
+                seen.add(row_id)
+            rows.append(row)
+    if max_rows is not None and len(rows) > max_rows:
+        rows, truncated = rows[:max_rows], True
+    return {
+        "total": len(rows),
+        "planned_total": planned,
+        "truncated": truncated,
+        "windows": [
+            {"from": format_date(window_start), "to": format_date(window_end), "total": total}
+            for window_start, window_end, total in windows
+        ],
+        "data": rows,
+    }
@@ -0,0 +1,208 @@
+"""
+Per-retailer fair scheduler in front of KiotVietClient requests.
+Caps concurrent requests per retailer, shares the connection pool between
+retailers with weighted fair queuing, and lets interactive lookups go first.
+
+Bộ lập lịch công bằng theo gian hàng cho các request của KiotVietClient.
+Giới hạn số request đồng thời mỗi gian hàng, chia connection pool giữa các
+gian hàng theo trọng số, và ưu tiên các tra cứu tương tác.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+# Priority lanes, lower goes first / Làn ưu tiên, số nhỏ chạy trước
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BULK: "bulk"}
+
+
+class _Ticket:
+    __slots__ = ("retailer", "priority", "seq", "enqueued_at", "granted")
+
+    def __init__(self, retailer: str, priority: int, seq: int):
+        self.retailer = retailer
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class _Tenant:
+    __slots__ = ("active", "queued", "virtual_time", "dispatched", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.active = 0
+        self.queued = [0, 0, 0]
+        self.virtual_time = 0.0
+        self.dispatched = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+
+class FairScheduler:
+    """
+    Grants request slots: strict priority between lanes, then weighted fair
+    queuing between retailers (lowest virtual time first), then FIFO.
+    Cấp slot cho request: ưu tiên tuyệt đối giữa các làn, sau đó xếp hàng công bằng
+    có trọng số giữa các gian hàng (virtual time nhỏ nhất trước), sau đó FIFO.
+    Interactive requests may use one slot above the retailer cap, so a
+    retailer's own bulk scan does not block its lookups.
+    Request interactive được dùng thêm một slot trên giới hạn gian hàng, để
+    bulk scan của chính gian hàng đó không chặn tra cứu.
+    """
+
+    def __init__(self, max_concurrency: int = 16, per_tenant: int = 4, weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            max_concurrency: Requests in flight across all retailers (pool size) / Số request đồng thời toàn server (kích thước pool)
+            per_tenant: Requests in flight per retailer / Số request đồng thời mỗi gian hàng
+            weights: Optional retailer -> weight (default 1) / Trọng số theo gian hàng (mặc định 1)
+        """
+        self.max_concurrency = max_concurrency
+        self.per_tenant = per_tenant
+        self.weights = dict(weights or {})
+        self._cond = threading.Condition()
+        self._waiting: List[_Ticket] = []
+        self._tenants: Dict[str, _Tenant] = {}
+        self._active = 0
+        self._seq = 0
+        self._virtual_time = 0.0
+
+    @classmethod
+    def from_env(cls) -> "FairScheduler":
+        """
+        KIOTVIET_MAX_CONCURRENCY, KIOTVIET_TENANT_CONCURRENCY, KIOTVIET_TENANT_WEIGHTS (JSON {"retailer": weight}).
+        """
+        weights = os.getenv("KIOTVIET_TENANT_WEIGHTS")
+        return cls(
+            max_concurrency=int(os.getenv("KIOTVIET_MAX_CONCURRENCY", "16")),
+            per_tenant=int(os.getenv("KIOTVIET_TENANT_CONCURRENCY", "4")),
+            weights=json.loads(weights) if weights else None,
+        )
+
+    @contextmanager
+    def slot(self, retailer: str, priority: int = NORMAL, timeout: Optional[float] = None,
+             check: Optional[Callable[[], None]] = None) -> Iterator[None]:
+        """
+        Hold one request slot for the retailer.
+        Giữ một slot request cho gian hàng.
+        Raises TimeoutError if no slot is granted within timeout seconds; check is
+        called while waiting and may raise to abandon the wait (e.g. cancellation).
+        Raise TimeoutError nếu không được cấp slot trong timeout giây; check được gọi
+        trong lúc chờ và có thể raise để bỏ chờ (ví dụ khi bị hủy).
+        """
+        self.acquire(retailer, priority, timeout, check)
+        try:
+            yield
+        finally:
+            self.release(retailer)
+
+    def acquire(self, retailer: str, priority: int = NORMAL, timeout: Optional[float] = None,
+                check: Optional[Callable[[], None]] = None) -> None:
+        """Wait for a slot. / Chờ được cấp slot."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            tenant = self._tenant(retailer)
+            if not tenant.active and not any(tenant.queued):
+                # A retailer that was idle starts at the current virtual time / Gian hàng vừa rảnh bắt đầu từ virtual time hiện tại
+                tenant.virtual_time = max(tenant.virtual_time, self._virtual_time)
+            self._seq += 1
+            ticket = _Ticket(retailer, priority, self._seq)
+            self._waiting.append(ticket)
+            tenant.queued[priority] += 1
+            self._dispatch()
+            while not ticket.granted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                try:
+                    if check is not None:
+                        check()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(
+                            f"No request slot for retailer '{retailer}' within {timeout:g}s"
+                            f" / Không có slot request cho gian hàng '{retailer}' trong {timeout:g}s"
+                        )
+                except BaseException:
+                    self._waiting.remove(ticket)
+                    tenant.queued[priority] -= 1
+                    raise
+                self._cond.wait(remaining)
+
+    def wake(self) -> None:
+        """Wake waiting requests so they re-run their check. / Đánh thức các request đang chờ để chạy lại check."""
+        with self._cond:
+            self._cond.notify_all()
+
+    def release(self, retailer: str) -> None:
+        """Return a slot. / Trả lại slot."""
+        with self._cond:
+            self._active -= 1
+            self._tenants[retailer].active -= 1
+            self._dispatch()
+
+    def _tenant(self, retailer: str) -> _Tenant:
+        tenant = self._tenants.get(retailer)
+        if tenant is None:
+            tenant = self._tenants[retailer] = _Tenant()
+        return tenant
+
+    def _dispatch(self) -> None:
+        granted = False
+        while self._active < self.max_concurrency:
+            best = None
+            best_key = None
+            for ticket in self._waiting:
+                tenant = self._tenants[ticket.retailer]
+                limit = self.per_tenant + (1 if ticket.priority == INTERACTIVE else 0)
+                if tenant.active >= limit:
+                    continue
+                key = (ticket.priority, tenant.virtual_time, ticket.seq)
+                if best_key is None or key < best_key:
+                    best, best_key = ticket, key
+            if best is None:
+                break
+            self._waiting.remove(best)
+            tenant = self._tenants[best.retailer]
+            tenant.queued[best.priority] -= 1
+            tenant.active += 1
+            tenant.dispatched += 1
+            waited = time.monotonic() - best.enqueued_at
+            tenant.wait_total += waited
+            tenant.wait_max = max(tenant.wait_max, waited)
+            self._virtual_time = tenant.virtual_time
+            tenant.virtual_time += 1.0 / self.weights.get(best.retailer, 1.0)
+            self._active += 1
+            best.granted = True
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and wait metrics per retailer. / Độ sâu hàng đợi và thời gian chờ theo gian hàng."""
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "per_tenant": self.per_tenant,
+                "active": self._active,
+                "queued": len(self._waiting),
+                "tenants": {
+                    retailer: {
+                        "active": tenant.active,
+                        "queued": {PRIORITY_NAMES[p]: n for p, n in enumerate(tenant.queued)},
+                        "dispatched": tenant.dispatched,
+                        "wait_avg": tenant.wait_total / tenant.dispatched if tenant.dispatched else 0.0,
+                        "wait_max": tenant.wait_max,
+                    }
+                    for retailer, tenant in self._tenants.items()
+                },
+            }
+
+
+# Shared by every client in the process / Dùng chung cho mọi client trong tiến trình
+scheduler = FairScheduler.from_env()
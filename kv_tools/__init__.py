@@ -0,0 +1,41 @@
+"""
+Tool groups of the KiotViet MCP server. Importing a group module registers its
+tools on the shared FastMCP instance (kv_tools.common.mcp).
+Các nhóm tool của KiotViet MCP server. Import một module nhóm sẽ đăng ký các
+tool của nhóm đó vào FastMCP instance dùng chung (kv_tools.common.mcp).
+"""
+import importlib
+import os
+from types import ModuleType
+from typing import Iterable, List, Optional
+
+TOOL_GROUPS = ("products", "customers", "orders", "invoices", "counts", "categories", "branches", "reports", "changes", "admin")
+
+
+def groups_from_env() -> List[str]:
+    """
+    KIOTVIET_TOOL_GROUPS: comma separated groups to load (default: all, "admin"
+    only when KIOTVIET_ADMIN_TOKEN is set).
+    KIOTVIET_TOOL_GROUPS: các nhóm cần tải, cách nhau bởi dấu phẩy (mặc định: tất cả,
+    "admin" chỉ khi có KIOTVIET_ADMIN_TOKEN).
+    """
+    value = os.getenv("KIOTVIET_TOOL_GROUPS")
+    if not value:
+        return [group for group in TOOL_GROUPS if group != "admin" or os.getenv("KIOTVIET_ADMIN_TOKEN")]
+    return [group.strip() for group in value.split(",") if group.strip()]
+
+
+def load_groups(groups: Optional[Iterable[str]] = None) -> List[ModuleType]:
+    """
+    Import and register the given tool groups.
+    Import và đăng ký các nhóm tool đã chọn.
+    """
+    modules = []
+    for group in TOOL_GROUPS if groups is None else groups:
+        if group not in TOOL_GROUPS:
+            raise ValueError(
+                f"Unknown tool group '{group}', expected one of {', '.join(TOOL_GROUPS)}"
+                f" / Nhóm tool '{group}' không tồn tại, cần là một trong {', '.join(TOOL_GROUPS)}"
+            )
+        modules.append(importlib.import_module(f"kv_tools.{group}"))
+    return modules
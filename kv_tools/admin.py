@@ -0,0 +1,60 @@
+"""
+Admin tools, loaded only when KIOTVIET_ADMIN_TOKEN is set / Công cụ quản trị, chỉ tải khi có KIOTVIET_ADMIN_TOKEN
+"""
+import hmac
+import os
+from typing import Any, Dict
+
+from kv_deadline import with_deadline
+from kv_profiler import profiler
+from kv_scheduler import BULK, INTERACTIVE, scheduler
+from kv_tools.common import mcp
+
+
+def _check_admin(admin_token: str) -> None:
+    expected = os.getenv("KIOTVIET_ADMIN_TOKEN")
+    if not expected or not hmac.compare_digest(admin_token.encode("utf-8"), expected.encode("utf-8")):
+        raise ValueError("Invalid admin token / Admin token không hợp lệ")
+
+
+@mcp.tool
+@with_deadline(BULK)
+def kv_admin_profile(
+    admin_token: str,
+    seconds: float = 10.0,
+    interval_ms: float = 5.0,
+) -> Dict[str, Any]:
+    """
+    Run the sampling profiler for a few seconds and write a collapsed-stack (flamegraph) file.
+    Chạy sampling profiler trong vài giây và ghi file collapsed-stack (flamegraph).
+    Stacks are grouped by the kv_* tool running on each thread.
+    Stack được nhóm theo tool kv_* đang chạy trên từng thread.
+    
+    Args:
+        admin_token: Value of KIOTVIET_ADMIN_TOKEN / Giá trị KIOTVIET_ADMIN_TOKEN
+        seconds: Sampling duration (1-100, default 10) / Thời gian lấy mẫu (1-100, mặc định 10)
+        interval_ms: Sampling interval in milliseconds (default 5) / Chu kỳ lấy mẫu tính bằng mili giây (mặc định 5)
+    
+    Returns:
+        path: Collapsed-stack file / File collapsed-stack
+        tools: Samples per tool / Số mẫu theo tool
+        top_frames: Frames where the most samples were taken / Các frame có nhiều mẫu nhất
+    """
+    _check_admin(admin_token)
+    return profiler.profile(min(max(seconds, 1.0), 100.0), max(interval_ms, 1.0) / 1000)
+
+
+@mcp.tool
+@with_deadline(INTERACTIVE)
+def kv_admin_scheduler_stats(admin_token: str) -> Dict[str, Any]:
+    """
+    Request scheduler metrics: slots in use and queue depth per retailer and lane.
+    Số liệu bộ lập lịch request: slot đang dùng và độ sâu hàng đợi theo gian hàng và làn.
+    Lists every retailer served by this process, so it is admin only.
+    Liệt kê mọi gian hàng do tiến trình này phục vụ, nên chỉ dành cho quản trị.
+
+    Args:
+        admin_token: Value of KIOTVIET_ADMIN_TOKEN / Giá trị KIOTVIET_ADMIN_TOKEN
+    """
+    _check_admin(admin_token)
+    return scheduler.stats()
@@ -0,0 +1,30 @@
+"""
+Branch tools / Công cụ Chi nhánh
+"""
+from typing import Any, Dict
+
+from kv_deadline import with_deadline
+from kv_freshness import with_staleness
+from kv_scheduler import NORMAL
+from kv_tools.common import _create_client, mcp
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("branches", persist=True)
+def kv_list_branches(
+    access_token: str,
+    retailer: str,
+) -> Dict[str, Any]:
+    """
+    Get list of store branches.
+    Lấy danh sách chi nhánh của cửa hàng.
+    Used to get branch_id when creating orders or filtering data.
+    Dùng để lấy branch_id khi tạo đơn hàng hoặc lọc dữ liệu.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+    """
+    client = _create_client(access_token, retailer)
+    return client.get("/branches")
@@ -0,0 +1,75 @@
+"""
+Category tools / Công cụ Nhóm hàng
+"""
+from typing import Any, Dict, Optional
+
+from kv_deadline import with_deadline
+from kv_freshness import with_staleness
+from kv_scheduler import NORMAL
+from kv_tools.common import _category_index, _create_client, mcp
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("categories", persist=True)
+def kv_list_categories(
+    access_token: str,
+    retailer: str,
+    hierarchical_data: bool = True,
+    page_size: int = 100,
+    current_item: int = 0,
+) -> Dict[str, Any]:
+    """
+    Get list of product categories.
+    Lấy danh sách nhóm hàng hóa (categories).
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        hierarchical_data: If True, returns hierarchical data (with children) / Nếu True, trả về dữ liệu phân cấp (có children)
+        page_size: Number of items per page (default 100) / Số items trong 1 trang (mặc định 100)
+        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {
+        "pageSize": min(page_size, 100),
+        "currentItem": current_item,
+        "hierachicalData": hierarchical_data,  # Note: API uses "hierachicalData" (typo in API) / Lưu ý: API dùng "hierachicalData" (lỗi chính tả trong API)
+    }
+    return client.get("/categories", params)
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("categories", persist=True)
+def kv_category_tree(
+    access_token: str,
+    retailer: str,
+    category_id: Optional[int] = None,
+    category_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Get the category tree as flat rows with parent, depth, path and child IDs (cached).
+    Lấy cây nhóm hàng dạng phẳng gồm nhóm cha, độ sâu, đường dẫn và ID nhóm con (có cache).
+    Use it to find which categories belong to a branch of the tree, e.g. "all drinks".
+    Dùng để biết các nhóm hàng thuộc một nhánh của cây, ví dụ "tất cả đồ uống".
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        category_id: Only return this category and its descendants / Chỉ trả về nhóm này và các nhóm con cháu
+        category_name: Same as category_id, matched by name / Như category_id, tìm theo tên
+    
+    Returns:
+        total: Number of rows / Số dòng
+        data: Rows with categoryId, categoryName, parentId, depth, path, childIds, descendantCount
+        data: Các dòng gồm categoryId, categoryName, parentId, depth, path, childIds, descendantCount
+    """
+    client = _create_client(access_token, retailer)
+    index = _category_index(client, retailer)
+    if category_id is not None or category_name:
+        ids = index.subtrees(index.resolve(category_id, category_name))
+    else:
+        ids = [c for root in index.roots for c in index.subtree(root)]
+    rows = [index.row(c) for c in ids]
+    return {"total": len(rows), "data": rows}
@@ -0,0 +1,131 @@
+"""
+Change feed tools / Công cụ theo dõi thay đổi
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from kv_deadline import with_deadline
+from kv_scan import format_date, parse_date
+from kv_scheduler import NORMAL
+from kv_tools.common import _create_client, mcp
+
+# entity -> (path, modified-date filter) / loại dữ liệu -> (path, bộ lọc ngày cập nhật)
+CHANGE_FEEDS: Dict[str, Tuple[str, str]] = {
+    "products": ("/products", "lastModifiedFrom"),
+    "customers": ("/customers", "lastModifiedFrom"),
+    "orders": ("/orders", "lastModifiedFrom"),
+    "invoices": ("/invoices", "fromDate"),
+}
+
+
+def _modified(row: Dict[str, Any]) -> Optional[str]:
+    return row.get("modifiedDate") or row.get("createdDate")
+
+
+def _encode_cursor(entity: str, watermark: str, seen: Set[Tuple[Any, str]]) -> str:
+    payload = {"e": entity, "w": watermark, "s": sorted([row_id, modified] for row_id, modified in seen)}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(entity: str, cursor: str) -> Tuple[str, Set[Tuple[Any, str]]]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        watermark, seen = payload["w"], {(row_id, modified) for row_id, modified in payload["s"]}
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor / Cursor không hợp lệ: {e}") from e
+    if payload.get("e") != entity:
+        raise ValueError(
+            f"Cursor belongs to '{payload.get('e')}', not '{entity}'"
+            f" / Cursor thuộc '{payload.get('e')}', không phải '{entity}'"
+        )
+    return watermark, seen
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+def kv_changes_since(
+    access_token: str,
+    retailer: str,
+    entity: str,
+    cursor: Optional[str] = None,
+    since: Optional[str] = None,
+    branch_ids: Optional[List[int]] = None,
+    max_rows: int = 500,
+) -> Dict[str, Any]:
+    """
+    Only the products, customers, orders or invoices created or changed since the last call.
+    Chỉ lấy sản phẩm, khách hàng, đơn hàng hoặc hóa đơn được tạo/thay đổi từ lần gọi trước.
+    Start with since, then pass the returned cursor to the next call. The cursor is
+    opaque; records on the watermark boundary are never returned twice.
+    Bắt đầu với since, sau đó truyền cursor nhận được cho lần gọi tiếp theo. Cursor là
+    chuỗi mờ; các bản ghi nằm đúng mốc watermark không bị trả về hai lần.
+
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        entity: "products", "customers", "orders" or "invoices" / "products", "customers", "orders" hoặc "invoices"
+        cursor: Cursor returned by the previous call / Cursor trả về từ lần gọi trước
+        since: Start time when there is no cursor (format: YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS) /
+            Thời điểm bắt đầu khi chưa có cursor (format: YYYY-MM-DD hoặc YYYY-MM-DDTHH:MM:SS)
+        branch_ids: Filter orders/invoices by list of branch IDs / Lọc đơn hàng/hóa đơn theo danh sách ID chi nhánh
+        max_rows: Maximum records per call (default 500); call again with the cursor while has_more /
+            Số bản ghi tối đa mỗi lần gọi (mặc định 500); gọi tiếp với cursor khi has_more
+
+    Returns:
+        data: New or changed records, oldest change first / Bản ghi mới hoặc thay đổi, thay đổi cũ nhất trước
+        cursor: Pass to the next call / Truyền cho lần gọi tiếp theo
+        has_more: More changes are waiting / Còn thay đổi chưa lấy
+    """
+    if entity not in CHANGE_FEEDS:
+        raise ValueError(
+            f"entity must be one of {', '.join(CHANGE_FEEDS)} / entity phải là một trong {', '.join(CHANGE_FEEDS)}"
+        )
+    if cursor:
+        watermark, seen = _decode_cursor(entity, cursor)
+    elif since:
+        watermark, seen = format_date(parse_date(since)), set()
+    else:
+        raise ValueError("Need to provide cursor or since / Cần cung cấp cursor hoặc since")
+
+    path, modified_filter = CHANGE_FEEDS[entity]
+    client = _create_client(access_token, retailer)
+    # The filter has second precision and is inclusive, so the boundary second is
+    # fetched again and filtered against the ids already returned
+    # Bộ lọc tính theo giây và bao gồm mốc, nên giây ở mốc được lấy lại và lọc bỏ
+    # các id đã trả về
+    params: Dict[str, Any] = {
+        modified_filter: watermark[:19],
+        "orderBy": "modifiedDate",
+        "orderDirection": "Asc",
+    }
+    if branch_ids and entity in ("orders", "invoices"):
+        params["branchIds"] = branch_ids
+    limit = max(1, max_rows)
+    # One extra row tells whether more changes are waiting / Thêm một dòng để biết còn thay đổi hay không
+    rows = client.get_all(path, params, max_items=limit + len(seen) + 1)
+
+    changes = [row for row in rows if (row.get("id"), _modified(row)) not in seen]
+    changes.sort(key=lambda row: _modified(row) or "")
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    latest = max((_modified(row) or "" for row in changes), default="")
+    if latest > watermark:
+        boundary = latest[:19]
+        seen = {key for key in seen if key[1][:19] == boundary}
+        watermark = latest
+    else:
+        boundary = watermark[:19]
+    seen |= {(row.get("id"), _modified(row)) for row in changes if (_modified(row) or "")[:19] == boundary}
+    return {
+        "entity": entity,
+        "total": len(changes),
+        "has_more": has_more,
+        "watermark": watermark,
+        "cursor": _encode_cursor(entity, watermark, seen),
+        "data": changes,
+    }
@@ -0,0 +1,118 @@
+"""
+Shared pieces of the tool groups: the FastMCP instance, client creation and
+reference data helpers used by more than one group.
+Phần dùng chung của các nhóm tool: FastMCP instance, tạo client và các hàm
+dữ liệu tham chiếu dùng ở nhiều nhóm.
+"""
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from fastmcp import FastMCP
+
+from kv_auth import TokenProvider
+from kv_cache import reference_cache
+from kv_categories import CategoryIndex
+from kv_client import KiotVietClient
+
+# Initialize FastMCP server / Khởi tạo FastMCP server
+mcp = FastMCP(name="kiotviet-mcp")
+
+# Optional token provider mode, None unless credentials are configured
+# Chế độ token provider tùy chọn, None nếu chưa cấu hình credentials
+token_provider = TokenProvider.from_env()
+
+
+def _create_client(access_token: str, retailer: str) -> KiotVietClient:
+    """
+    Create KiotVietClient from access_token and retailer.
+    Tạo KiotVietClient từ access_token và retailer.
+    
+    Args:
+        access_token: OAuth2 access token (obtained by Culi), empty to use the token provider / Token OAuth2 (do Culi cung cấp), để trống để dùng token provider
+        retailer: Retailer name (tên gian hàng)
+    
+    Returns:
+        KiotVietClient instance / Instance KiotVietClient
+    """
+    if not access_token:
+        if token_provider is None or not token_provider.has(retailer):
+            raise ValueError("access_token is required / Cần cung cấp access_token")
+        access_token = token_provider.get_token(retailer)
+    return KiotVietClient(access_token=access_token, retailer=retailer)
+
+
+def _cached(client: KiotVietClient, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+    """
+    Reference data shared by every caller of a retailer. A cache hit still needs one
+    authenticated request per client, so a token KiotViet never accepted reads nothing.
+    Dữ liệu tham chiếu dùng chung cho mọi người gọi của gian hàng. Khi trúng cache vẫn
+    cần một request đã xác thực cho mỗi client, nên token chưa được KiotViet chấp nhận
+    không đọc được gì.
+    """
+    value = reference_cache.get(key)
+    if value is None:
+        value = loader()
+        reference_cache.set(key, value, ttl)
+    else:
+        client.ensure_authenticated()
+    return value
+
+
+def _normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Keep digits only, +84 -> 0. / Chỉ giữ chữ số, +84 -> 0."""
+    if not phone:
+        return None
+    digits = "".join(ch for ch in phone if ch.isdigit())
+    if digits.startswith("84") and len(digits) == 11:
+        digits = "0" + digits[2:]
+    return digits or None
+
+
+def _customer_index(client: KiotVietClient, retailer: str) -> Dict[str, Dict[Any, Dict[str, Any]]]:
+    """
+    Cached phone/code -> customer index of a retailer.
+    Chỉ mục số điện thoại/mã -> khách hàng của gian hàng (có cache).
+    """
+    def load() -> Dict[str, Dict[Any, Dict[str, Any]]]:
+        index: Dict[str, Dict[Any, Dict[str, Any]]] = {"id": {}, "phone": {}, "code": {}}
+        for customer in client.get_all("/customers"):
+            _index_customer(index, customer)
+        return index
+
+    return _cached(client, (retailer, "customer_index"), load)
+
+
+def _index_customer(index: Dict[str, Dict[Any, Dict[str, Any]]], customer: Dict[str, Any]) -> None:
+    previous = index["id"].get(customer.get("id"))
+    if previous is not None:
+        _unindex_customer(index, previous)
+        customer = {**previous, **customer}
+    if customer.get("id") is not None:
+        index["id"][customer["id"]] = customer
+    phone = _normalize_phone(customer.get("contactNumber"))
+    if phone:
+        index["phone"][phone] = customer
+    if customer.get("code"):
+        index["code"][customer["code"]] = customer
+
+
+def _unindex_customer(index: Dict[str, Dict[Any, Dict[str, Any]]], customer: Dict[str, Any]) -> None:
+    index["id"].pop(customer.get("id"), None)
+    phone = _normalize_phone(customer.get("contactNumber"))
+    if phone and index["phone"].get(phone) is customer:
+        del index["phone"][phone]
+    if customer.get("code") and index["code"].get(customer["code"]) is customer:
+        del index["code"][customer["code"]]
+
+
+def _category_index(client: KiotVietClient, retailer: str) -> CategoryIndex:
+    """Flattened category tree of a retailer (cached). / Cây nhóm hàng dạng phẳng của gian hàng (có cache)."""
+    return _cached(
+        client,
+        (retailer, "category_index"),
+        lambda: CategoryIndex(client.get_all("/categories", {"hierachicalData": False})),
+    )
+
+
+def _cached_branches(client: KiotVietClient, retailer: str) -> List[Dict[str, Any]]:
+    """Branches of a retailer (cached). / Danh sách chi nhánh của gian hàng (có cache)."""
+    return _cached(client, (retailer, "branches"), lambda: client.get("/branches").get("data") or [])
@@ -0,0 +1,113 @@
+"""
+Count tools / Công cụ Đếm
+"""
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from kv_bulk import map_bounded
+from kv_deadline import ProgressCounter, with_deadline
+from kv_freshness import with_staleness
+from kv_scan import format_date, parse_date, probe_total
+from kv_scheduler import BULK
+from kv_tools.common import _cached_branches, _create_client, mcp
+
+# Default order statuses: draft, delivering, completed, cancelled, confirmed
+# Trạng thái đơn mặc định: phiếu tạm, đang giao, hoàn thành, đã hủy, đã xác nhận
+ORDER_STATUSES = [1, 2, 3, 4, 5]
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("counts", persist=True)
+def kv_counts(
+    access_token: str,
+    retailer: str,
+    entity: str = "orders",
+    branch_ids: Optional[List[int]] = None,
+    status: Optional[List[int]] = None,
+    from_purchase_date: Optional[str] = None,
+    to_purchase_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Count orders or invoices per group without fetching rows (for dashboards).
+    Đếm đơn hàng hoặc hóa đơn theo nhóm mà không tải dữ liệu (dùng cho dashboard).
+    orders: status x branch. invoices: branch x day (date range required, max 62 days).
+    orders: trạng thái x chi nhánh. invoices: chi nhánh x ngày (bắt buộc khoảng ngày, tối đa 62 ngày).
+    Each cell is one concurrent pageSize=1 request; pass max_staleness to reuse cached counts.
+    Mỗi ô là một request pageSize=1 chạy song song; truyền max_staleness để dùng số đếm đã cache.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        entity: "orders" or "invoices" / "orders" hoặc "invoices"
+        branch_ids: Branch IDs (default all branches) / ID chi nhánh (mặc định tất cả)
+        status: Order statuses (default 1-5) / Trạng thái đơn hàng (mặc định 1-5)
+        from_purchase_date: From purchase date (format: YYYY-MM-DD) / Từ ngày (format: YYYY-MM-DD)
+        to_purchase_date: To purchase date, inclusive (format: YYYY-MM-DD) / Đến ngày, tính cả ngày (format: YYYY-MM-DD)
+    
+    Returns:
+        rows, columns: Group names / Tên các nhóm
+        counts: {row: {column: count}}
+        row_totals, column_totals, total: Sums / Tổng
+    """
+    client = _create_client(access_token, retailer)
+    if entity not in ("orders", "invoices"):
+        raise ValueError("entity must be 'orders' or 'invoices' / entity phải là 'orders' hoặc 'invoices'")
+    if not branch_ids:
+        branch_ids = [b["id"] for b in _cached_branches(client, retailer)]
+    start = parse_date(from_purchase_date) if from_purchase_date else None
+    end = parse_date(to_purchase_date, end=True) if to_purchase_date else None
+
+    # (row, column, params) per cell / (hàng, cột, params) cho mỗi ô
+    cells: List[Any] = []
+    if entity == "orders":
+        base: Dict[str, Any] = {}
+        if start:
+            base["fromPurchaseDate"] = format_date(start)
+        if end:
+            base["toPurchaseDate"] = format_date(end - timedelta(seconds=1))
+        for order_status in status or ORDER_STATUSES:
+            for branch_id in branch_ids:
+                cells.append((order_status, branch_id, dict(base, status=[order_status], branchIds=[branch_id])))
+    else:
+        if start is None or end is None or end - start > timedelta(days=62):
+            raise ValueError(
+                "invoices need from/to purchase dates within 62 days / invoices cần khoảng ngày tối đa 62 ngày"
+            )
+        for branch_id in branch_ids:
+            day = start
+            while day < end:
+                next_day = min(day + timedelta(days=1), end)
+                params = {
+                    "branchIds": [branch_id],
+                    "fromPurchaseDate": format_date(day),
+                    "toPurchaseDate": format_date(next_day - timedelta(seconds=1)),
+                }
+                cells.append((branch_id, day.date().isoformat(), params))
+                day = next_day
+
+    path = f"/{entity}"
+
+    progress = ProgressCounter(len(cells), "cells")
+
+    def count(cell: Any) -> int:
+        total = probe_total(client, path, cell[2])
+        progress.step()
+        return total
+
+    totals = map_bounded(count, cells, max_workers=8)
+    counts: Dict[Any, Dict[Any, int]] = {}
+    column_totals: Dict[Any, int] = {}
+    for (row, column, _), total in zip(cells, totals):
+        counts.setdefault(row, {})[column] = total
+        column_totals[column] = column_totals.get(column, 0) + total
+    row_totals = {row: sum(columns.values()) for row, columns in counts.items()}
+    return {
+        "entity": entity,
+        "rows": "status" if entity == "orders" else "branch",
+        "columns": "branch" if entity == "orders" else "day",
+        "counts": counts,
+        "row_totals": row_totals,
+        "column_totals": column_totals,
+        "total": sum(row_totals.values()),
+    }
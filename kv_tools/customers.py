@@ -0,0 +1,267 @@
+"""
+Customer tools / Công cụ Khách hàng
+"""
+from typing import Any, Dict, List, Optional
+
+from kv_bulk import map_bounded
+from kv_cache import reference_cache
+from kv_deadline import ProgressCounter, with_deadline
+from kv_freshness import invalidate_reads, with_staleness
+from kv_scheduler import BULK, INTERACTIVE, NORMAL
+from kv_tools.common import _create_client, _customer_index, _index_customer, _normalize_phone, mcp
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("customers")
+def kv_search_customers(
+    access_token: str,
+    retailer: str,
+    name: Optional[str] = None,
+    contact_number: Optional[str] = None,
+    code: Optional[str] = None,
+    page_size: int = 20,
+    current_item: int = 0,
+    include_total: bool = False,
+) -> Dict[str, Any]:
+    """
+    Search customers by name, phone number, or customer code.
+    Tìm khách hàng theo tên, số điện thoại hoặc mã khách hàng.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        name: Search by customer name / Tìm kiếm theo tên khách hàng
+        contact_number: Search by phone number / Tìm kiếm theo số điện thoại
+        code: Search by customer code / Tìm kiếm theo mã khách hàng
+        page_size: Number of items per page (default 20, max 100) / Số items trong 1 trang (mặc định 20, tối đa 100)
+        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
+        include_total: Whether to include TotalInvoice, TotalPoint, TotalRevenue / Có lấy thông tin TotalInvoice, TotalPoint, TotalRevenue
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {
+        "pageSize": min(page_size, 100),
+        "currentItem": current_item,
+        "includeTotal": include_total,
+    }
+    if name:
+        params["name"] = name
+    if contact_number:
+        params["contactNumber"] = contact_number
+    if code:
+        params["code"] = code
+
+    return client.get("/customers", params)
+
+
+@mcp.tool
+@with_deadline(INTERACTIVE)
+@with_staleness("customers")
+def kv_get_customer(
+    access_token: str,
+    retailer: str,
+    customer_id: Optional[int] = None,
+    customer_code: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Get detailed information of a customer by ID or customer code.
+    Lấy thông tin chi tiết của một khách hàng theo ID hoặc mã khách hàng.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        customer_id: Customer ID / ID khách hàng
+        customer_code: Customer code (if customer_id is not provided) / Mã khách hàng (nếu không có customer_id)
+    """
+    client = _create_client(access_token, retailer)
+    if customer_id:
+        return client.get(f"/customers/{customer_id}")
+    elif customer_code:
+        return client.get(f"/customers/code/{customer_code}")
+    else:
+        raise ValueError("Need to provide customer_id or customer_code / Cần cung cấp customer_id hoặc customer_code")
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+def kv_create_customer(
+    access_token: str,
+    retailer: str,
+    name: str,
+    code: Optional[str] = None,
+    contact_number: Optional[str] = None,
+    email: Optional[str] = None,
+    address: Optional[str] = None,
+    gender: Optional[bool] = None,
+    birth_date: Optional[str] = None,
+    comments: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Create a new customer in KiotViet.
+    Tạo mới khách hàng trong KiotViet.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        name: Customer name (required) / Tên khách hàng (bắt buộc)
+        code: Customer code / Mã khách hàng
+        contact_number: Phone number / Số điện thoại
+        email: Email address / Email
+        address: Address / Địa chỉ
+        gender: Gender (true: male, false: female) / Giới tính (true: nam, false: nữ)
+        birth_date: Birth date (format: YYYY-MM-DD) / Ngày sinh (format: YYYY-MM-DD)
+        comments: Notes / Ghi chú
+    """
+    client = _create_client(access_token, retailer)
+    body = _build_customer_body(
+        name, code=code, contact_number=contact_number, email=email, address=address,
+        gender=gender, birth_date=birth_date, comments=comments,
+    )
+    created = client.post("/customers", body)
+    reference_cache.invalidate((retailer, "customer_index"))
+    invalidate_reads(retailer, "customers")
+    return created
+
+
+def _build_customer_body(
+    name: Optional[str],
+    code: Optional[str] = None,
+    contact_number: Optional[str] = None,
+    email: Optional[str] = None,
+    address: Optional[str] = None,
+    gender: Optional[bool] = None,
+    birth_date: Optional[str] = None,
+    comments: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build the /customers body. / Tạo body cho /customers."""
+    body: Dict[str, Any] = {}
+    if name:
+        body["name"] = name
+    if code:
+        body["code"] = code
+    if contact_number:
+        body["contactNumber"] = contact_number
+    if email:
+        body["email"] = email
+    if address:
+        body["address"] = address
+    if gender is not None:
+        body["gender"] = gender
+    if birth_date:
+        body["birthDate"] = birth_date
+    if comments:
+        body["comments"] = comments
+    return body
+
+
+def _customer_changes(existing: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields of body that differ from the existing customer. / Các trường khác với khách hàng hiện có."""
+    changes: Dict[str, Any] = {}
+    for field, value in body.items():
+        current = existing.get(field)
+        if field == "contactNumber":
+            same = _normalize_phone(current) == _normalize_phone(value)
+        elif field == "birthDate":
+            same = str(current or "")[:10] == str(value)[:10]
+        else:
+            same = current == value
+        if not same:
+            changes[field] = value
+    return changes
+
+
+@mcp.tool
+@with_deadline(BULK)
+def kv_upsert_customers_bulk(
+    access_token: str,
+    retailer: str,
+    customers: List[Dict[str, Any]],
+    max_concurrency: int = 4,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Create or update many customers in one call, matching existing ones by code or phone number.
+    Tạo mới hoặc cập nhật nhiều khách hàng trong một lần gọi, khớp khách hàng có sẵn theo mã hoặc số điện thoại.
+    Each row is classified locally as create, update or skip against a cached
+    phone/code index, then changes are pushed concurrently.
+    Mỗi dòng được phân loại tại chỗ thành create, update hoặc skip dựa trên chỉ mục
+    số điện thoại/mã (có cache), sau đó các thay đổi được gửi song song.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        customers: List of customers, each item has the same fields as kv_create_customer / Danh sách khách hàng, mỗi item có các trường như kv_create_customer
+            (name, code, contact_number, email, address, gender, birth_date, comments)
+        max_concurrency: Maximum requests sent at the same time (default 4, max 10) / Số request gửi đồng thời tối đa (mặc định 4, tối đa 10)
+        dry_run: Only classify, do not write / Chỉ phân loại, không ghi dữ liệu
+    
+    Returns:
+        results: One item per row with index, action ("create", "update", "skip"), status and customer or error
+        results: Mỗi dòng một item gồm index, action ("create", "update", "skip"), status và customer hoặc error
+        summary: Count per action / Số lượng theo action
+    """
+    client = _create_client(access_token, retailer)
+    index = _customer_index(client, retailer)
+
+    plan: List[Dict[str, Any]] = []
+    seen_rows = set()
+    for i, row in enumerate(customers):
+        body = _build_customer_body(
+            row.get("name"), code=row.get("code"), contact_number=row.get("contact_number"),
+            email=row.get("email"), address=row.get("address"), gender=row.get("gender"),
+            birth_date=row.get("birth_date"), comments=row.get("comments"),
+        )
+        phone = _normalize_phone(body.get("contactNumber"))
+        row_keys = {("code", body.get("code")), ("phone", phone)} - {("code", None), ("phone", None)}
+        item: Dict[str, Any] = {"index": i}
+        existing = index["code"].get(body.get("code")) or index["phone"].get(phone)
+        if row_keys & seen_rows:
+            item.update(action="skip", reason="Duplicate row in input / Dòng trùng trong dữ liệu nhập")
+        elif existing is not None:
+            changes = _customer_changes(existing, body)
+            if changes:
+                item.update(action="update", customer_id=existing["id"], body=changes)
+            else:
+                item.update(action="skip", customer_id=existing["id"], reason="No changes / Không có thay đổi")
+        elif not body.get("name"):
+            item.update(action="skip", reason="Missing name for new customer / Thiếu tên cho khách hàng mới")
+        else:
+            item.update(action="create", body=body)
+        seen_rows |= row_keys
+        plan.append(item)
+
+    progress = ProgressCounter(len(plan), "customers")
+
+    def push(item: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return _push(item)
+        finally:
+            progress.step()
+
+    def _push(item: Dict[str, Any]) -> Dict[str, Any]:
+        result = {k: v for k, v in item.items() if k != "body"}
+        if item["action"] == "skip" or dry_run:
+            result["status"] = "planned" if dry_run and item["action"] != "skip" else "skipped"
+            return result
+        try:
+            if item["action"] == "create":
+                response = client.post("/customers", item["body"])
+            else:
+                response = client.put(f"/customers/{item['customer_id']}", item["body"])
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            return result
+        customer = response.get("data", response) if isinstance(response, dict) else response
+        if isinstance(customer, dict) and customer.get("id") is not None:
+            _index_customer(index, customer)
+        result.update(status="done", customer=customer)
+        return result
+
+    results = map_bounded(push, plan, max_workers=max(1, min(max_concurrency, 10)))
+    if not dry_run:
+        reference_cache.persist((retailer, "customer_index"))
+        invalidate_reads(retailer, "customers")
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result["action"]] = summary.get(result["action"], 0) + 1
+    return {"results": results, "summary": summary}
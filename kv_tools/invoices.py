@@ -0,0 +1,144 @@
+"""
+Invoice tools / Công cụ Hóa đơn
+"""
+from typing import Any, Dict, List, Optional
+
+from kv_deadline import with_deadline
+from kv_freshness import with_staleness
+from kv_scan import parse_date, scan
+from kv_scheduler import BULK, INTERACTIVE, NORMAL
+from kv_tools.common import _create_client, mcp
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("invoices")
+def kv_list_invoices(
+    access_token: str,
+    retailer: str,
+    branch_ids: Optional[List[int]] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    from_purchase_date: Optional[str] = None,
+    to_purchase_date: Optional[str] = None,
+    customer_ids: Optional[List[int]] = None,
+    page_size: int = 50,
+    current_item: int = 0,
+    include_payment: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get list of sales invoices within a time period.
+    Lấy danh sách hóa đơn bán hàng trong khoảng thời gian.
+    Used for use cases: revenue summary, daily analysis, customer analysis, etc.
+    Dùng cho các use case: tổng hợp doanh thu, phân tích theo ngày, theo khách,...
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
+        from_date: From update date (format: YYYY-MM-DD) / Từ ngày cập nhật (format: YYYY-MM-DD)
+        to_date: To update date (format: YYYY-MM-DD) / Đến ngày cập nhật (format: YYYY-MM-DD)
+        from_purchase_date: From transaction date (format: YYYY-MM-DD) / Từ ngày giao dịch (format: YYYY-MM-DD)
+        to_purchase_date: To transaction date (format: YYYY-MM-DD) / Đến ngày giao dịch (format: YYYY-MM-DD)
+        customer_ids: Filter by list of customer IDs / Lọc theo danh sách ID khách hàng
+        page_size: Number of items per page (default 50, max 100) / Số items trong 1 trang (mặc định 50, tối đa 100)
+        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
+        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {
+        "pageSize": min(page_size, 100),
+        "currentItem": current_item,
+        "includePayment": include_payment,
+    }
+    if branch_ids:
+        params["branchIds"] = branch_ids
+    if from_date:
+        params["fromDate"] = from_date
+    if to_date:
+        params["toDate"] = to_date
+    if from_purchase_date:
+        params["fromPurchaseDate"] = from_purchase_date
+    if to_purchase_date:
+        params["toPurchaseDate"] = to_purchase_date
+    if customer_ids:
+        params["customerIds"] = customer_ids
+
+    return client.get("/invoices", params)
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("invoices")
+def kv_scan_invoices(
+    access_token: str,
+    retailer: str,
+    from_purchase_date: str,
+    to_purchase_date: str,
+    branch_ids: Optional[List[int]] = None,
+    customer_ids: Optional[List[int]] = None,
+    include_payment: bool = False,
+    max_rows: int = 10000,
+    stream_chunks: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get all sales invoices in a transaction date range (full scan, no paging needed).
+    Lấy toàn bộ hóa đơn bán hàng trong khoảng ngày giao dịch (quét toàn bộ, không cần phân trang).
+    The range is split into day/hour windows sized by their totals and fetched in parallel.
+    Khoảng ngày được chia thành các cửa sổ ngày/giờ theo total và lấy song song.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        from_purchase_date: From transaction date (format: YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS) / Từ ngày giao dịch (format: YYYY-MM-DD hoặc YYYY-MM-DDTHH:MM:SS)
+        to_purchase_date: To transaction date, inclusive for YYYY-MM-DD / Đến ngày giao dịch, tính cả ngày nếu là YYYY-MM-DD
+        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
+        customer_ids: Filter by list of customer IDs / Lọc theo danh sách ID khách hàng
+        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
+        max_rows: Maximum rows returned (default 10000) / Số dòng tối đa trả về (mặc định 10000)
+        stream_chunks: Also send each fetched page as a log notification (logger "kiotviet.partial") while scanning /
+            Gửi thêm từng trang đã lấy dưới dạng log notification (logger "kiotviet.partial") trong lúc quét
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {"includePayment": include_payment}
+    if branch_ids:
+        params["branchIds"] = branch_ids
+    if customer_ids:
+        params["customerIds"] = customer_ids
+    return scan(
+        client, "/invoices", params,
+        parse_date(from_purchase_date), parse_date(to_purchase_date, end=True),
+        max_rows=max_rows, stream_chunks=stream_chunks,
+    )
+
+
+@mcp.tool
+@with_deadline(INTERACTIVE)
+@with_staleness("invoices")
+def kv_get_invoice(
+    access_token: str,
+    retailer: str,
+    invoice_id: Optional[int] = None,
+    invoice_code: Optional[str] = None,
+    include_payment: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get detailed information of an invoice by ID or invoice code.
+    Lấy thông tin chi tiết của một hóa đơn theo ID hoặc mã hóa đơn.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        invoice_id: Invoice ID / ID hóa đơn
+        invoice_code: Invoice code (if invoice_id is not provided) / Mã hóa đơn (nếu không có invoice_id)
+        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
+    """
+    client = _create_client(access_token, retailer)
+    params = {"includePayment": include_payment} if include_payment else None
+    
+    if invoice_id:
+        return client.get(f"/invoices/{invoice_id}", params)
+    elif invoice_code:
+        return client.get(f"/invoices/code/{invoice_code}", params)
+    else:
+        raise ValueError("Need to provide invoice_id or invoice_code / Cần cung cấp invoice_id hoặc invoice_code")
@@ -0,0 +1,515 @@
+"""
+Order tools / Công cụ Đơn hàng
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from kv_bulk import IdempotencyLedger, map_bounded
+from kv_cache import disk_cache, reference_cache
+from kv_client import KiotVietClient, RequestNotSent
+from kv_deadline import ProgressCounter, with_deadline
+from kv_freshness import invalidate_reads, with_staleness
+from kv_scan import parse_date, scan
+from kv_scheduler import BULK, INTERACTIVE, NORMAL
+from kv_tools.common import _cached, _cached_branches, _create_client, _normalize_phone, mcp
+
+# Outcomes of order submissions, keyed by (retailer, idempotency key); kept on disk with KIOTVIET_CACHE_PATH
+# Kết quả gửi đơn hàng, theo (retailer, khóa idempotency); lưu trên đĩa khi có KIOTVIET_CACHE_PATH
+order_ledger = IdempotencyLedger(disk=disk_cache)
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("orders")
+def kv_list_orders(
+    access_token: str,
+    retailer: str,
+    branch_ids: Optional[List[int]] = None,
+    status: Optional[List[int]] = None,
+    customer_ids: Optional[List[int]] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    page_size: int = 50,
+    current_item: int = 0,
+    include_payment: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get list of orders from KiotViet.
+    Lấy danh sách đơn đặt hàng (orders) từ KiotViet.
+    Used by agent to view revenue, undelivered orders, unpaid orders, etc.
+    Agent dùng để xem doanh thu, đơn chưa giao, đơn chưa thanh toán,...
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
+        status: Filter by order status (list of numbers) / Lọc theo trạng thái đơn hàng (danh sách số)
+        customer_ids: Filter by list of customer IDs / Lọc theo danh sách ID khách hàng
+        from_date: From date (format: YYYY-MM-DD) / Từ ngày (format: YYYY-MM-DD)
+        to_date: To date (format: YYYY-MM-DD) / Đến ngày (format: YYYY-MM-DD)
+        page_size: Number of items per page (default 50, max 100) / Số items trong 1 trang (mặc định 50, tối đa 100)
+        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
+        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {
+        "pageSize": min(page_size, 100),
+        "currentItem": current_item,
+        "includePayment": include_payment,
+    }
+    if branch_ids:
+        params["branchIds"] = branch_ids
+    if status:
+        params["status"] = status
+    if customer_ids:
+        params["customerIds"] = customer_ids
+    if from_date:
+        params["fromDate"] = from_date
+    if to_date:
+        params["toDate"] = to_date
+
+    return client.get("/orders", params)
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("orders")
+def kv_scan_orders(
+    access_token: str,
+    retailer: str,
+    from_purchase_date: str,
+    to_purchase_date: str,
+    branch_ids: Optional[List[int]] = None,
+    status: Optional[List[int]] = None,
+    customer_ids: Optional[List[int]] = None,
+    include_payment: bool = False,
+    max_rows: int = 10000,
+    stream_chunks: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get all orders in a purchase date range (full scan, no paging needed).
+    Lấy toàn bộ đơn đặt hàng trong khoảng ngày đặt (quét toàn bộ, không cần phân trang).
+    The range is split into day/hour windows sized by their totals and fetched in parallel.
+    Khoảng ngày được chia thành các cửa sổ ngày/giờ theo total và lấy song song.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        from_purchase_date: From purchase date (format: YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS) / Từ ngày đặt (format: YYYY-MM-DD hoặc YYYY-MM-DDTHH:MM:SS)
+        to_purchase_date: To purchase date, inclusive for YYYY-MM-DD / Đến ngày đặt, tính cả ngày nếu là YYYY-MM-DD
+        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
+        status: Filter by order status (list of numbers) / Lọc theo trạng thái đơn hàng (danh sách số)
+        customer_ids: Filter by list of customer IDs / Lọc theo danh sách ID khách hàng
+        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
+        max_rows: Maximum rows returned (default 10000) / Số dòng tối đa trả về (mặc định 10000)
+        stream_chunks: Also send each fetched page as a log notification (logger "kiotviet.partial") while scanning /
+            Gửi thêm từng trang đã lấy dưới dạng log notification (logger "kiotviet.partial") trong lúc quét
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {"includePayment": include_payment}
+    if branch_ids:
+        params["branchIds"] = branch_ids
+    if status:
+        params["status"] = status
+    if customer_ids:
+        params["customerIds"] = customer_ids
+    return scan(
+        client, "/orders", params,
+        parse_date(from_purchase_date), parse_date(to_purchase_date, end=True),
+        max_rows=max_rows, stream_chunks=stream_chunks,
+    )
+
+
+@mcp.tool
+@with_deadline(INTERACTIVE)
+@with_staleness("orders")
+def kv_get_order(
+    access_token: str,
+    retailer: str,
+    order_id: Optional[int] = None,
+    order_code: Optional[str] = None,
+    include_payment: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get detailed information of an order by ID or order code.
+    Lấy thông tin chi tiết của một đơn hàng theo ID hoặc mã đơn hàng.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        order_id: Order ID / ID đơn hàng
+        order_code: Order code (if order_id is not provided) / Mã đơn hàng (nếu không có order_id)
+        include_payment: Whether to include payment information / Có lấy thông tin thanh toán hay không
+    """
+    client = _create_client(access_token, retailer)
+    params = {"includePayment": include_payment} if include_payment else None
+    
+    if order_id:
+        return client.get(f"/orders/{order_id}", params)
+    elif order_code:
+        return client.get(f"/orders/code/{order_code}", params)
+    else:
+        raise ValueError("Need to provide order_id or order_code / Cần cung cấp order_id hoặc order_code")
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+def kv_create_order(
+    access_token: str,
+    retailer: str,
+    branch_id: int,
+    purchase_date: str,
+    order_details: List[Dict[str, Any]],
+    customer_id: Optional[int] = None,
+    description: Optional[str] = None,
+    total_payment: Optional[float] = None,
+    discount: Optional[float] = None,
+    method: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Create a new KiotViet order. Only call after user has confirmed the content.
+    Tạo mới đơn đặt hàng KiotViet. Chỉ gọi sau khi user đã xác nhận nội dung.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        branch_id: Branch ID / ID chi nhánh
+        purchase_date: Purchase date (format: YYYY-MM-DD) / Ngày đặt hàng (format: YYYY-MM-DD)
+        order_details: List of products, each item includes: / Danh sách sản phẩm, mỗi item gồm:
+            - productId: Product ID / ID sản phẩm
+            - quantity: Quantity / Số lượng
+            - price: Price / Giá
+            - discount (optional): Discount / Giảm giá
+        customer_id: Customer ID (optional) / ID khách hàng (optional)
+        description: Notes / Ghi chú
+        total_payment: Total amount paid by customer / Tổng tiền khách đã trả
+        discount: Order discount / Giảm giá trên đơn
+        method: Payment method (Cash, Card, Transfer) / Phương thức thanh toán (Cash, Card, Transfer)
+    """
+    client = _create_client(access_token, retailer)
+    body = _build_order_body(
+        branch_id, purchase_date, order_details,
+        customer_id=customer_id, description=description,
+        total_payment=total_payment, discount=discount, method=method,
+    )
+    created = client.post("/orders", body)
+    invalidate_reads(retailer, "orders")
+    invalidate_reads(retailer, "counts")
+    return created
+
+
+def _build_order_body(
+    branch_id: int,
+    purchase_date: str,
+    order_details: List[Dict[str, Any]],
+    customer_id: Optional[int] = None,
+    description: Optional[str] = None,
+    total_payment: Optional[float] = None,
+    discount: Optional[float] = None,
+    method: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build the POST /orders body. / Tạo body cho POST /orders."""
+    body: Dict[str, Any] = {
+        "branchId": branch_id,
+        "purchaseDate": purchase_date,
+        "orderDetails": order_details,
+    }
+    if customer_id:
+        body["customer"] = {"id": customer_id}
+    if description:
+        body["description"] = description
+    if total_payment is not None:
+        body["totalPayment"] = total_payment
+    if discount is not None:
+        body["discount"] = discount
+    if method:
+        body["method"] = method
+    return body
+
+
+@mcp.tool
+@with_deadline(BULK)
+def kv_create_orders_bulk(
+    access_token: str,
+    retailer: str,
+    orders: List[Dict[str, Any]],
+    max_concurrency: int = 4,
+) -> Dict[str, Any]:
+    """
+    Create many KiotViet orders in one call. Only call after user has confirmed the content.
+    Tạo nhiều đơn đặt hàng KiotViet trong một lần gọi. Chỉ gọi sau khi user đã xác nhận nội dung.
+    Orders are submitted concurrently; resending an order with the same idempotency_key
+    never creates it twice.
+    Các đơn được gửi song song; gửi lại đơn có cùng idempotency_key không tạo trùng.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        orders: List of orders, each item has the same fields as kv_create_order: / Danh sách đơn, mỗi item có các trường như kv_create_order:
+            - branch_id, purchase_date, order_details (required / bắt buộc)
+            - customer_id, description, total_payment, discount, method (optional)
+            - idempotency_key (optional): client-generated key, e.g. the source order id; orders without
+              a key are always sent / khóa do client tạo, ví dụ mã đơn nguồn; đơn không có khóa luôn được gửi
+        max_concurrency: Maximum orders sent at the same time (default 4, max 10) / Số đơn gửi đồng thời tối đa (mặc định 4, tối đa 10)
+    
+    Returns:
+        results: One item per order with index, idempotency_key, status
+            ("created", "duplicate", "failed", "unknown") and order or error
+        results: Mỗi đơn một item gồm index, idempotency_key, status
+            ("created", "duplicate", "failed", "unknown") và order hoặc error
+        summary: Count per status / Số lượng theo trạng thái
+    """
+    client = _create_client(access_token, retailer)
+    progress = ProgressCounter(len(orders), "orders")
+
+    def submit(indexed: Any) -> Dict[str, Any]:
+        try:
+            return _submit(indexed)
+        finally:
+            progress.step()
+
+    def _submit(indexed: Any) -> Dict[str, Any]:
+        index, order = indexed
+        result: Dict[str, Any] = {"index": index}
+        try:
+            body = _build_order_body(
+                order["branch_id"], order["purchase_date"], order["order_details"],
+                customer_id=order.get("customer_id"), description=order.get("description"),
+                total_payment=order.get("total_payment"), discount=order.get("discount"),
+                method=order.get("method"),
+            )
+        except KeyError as e:
+            result.update(status="failed", error=f"Missing field {e} / Thiếu trường {e}")
+            return result
+        # Identical content may be two real orders, so only a client key deduplicates
+        # Nội dung giống nhau có thể là hai đơn thật, nên chỉ khóa do client gửi mới dùng để chống trùng
+        key = order.get("idempotency_key")
+        result["idempotency_key"] = key
+
+        entry = None
+        if key:
+            owner, entry = order_ledger.begin(retailer, key)
+            if not owner:
+                entry = order_ledger.wait(entry)
+                if entry.state == "done":
+                    result.update(status="duplicate", order=entry.result)
+                elif entry.state == "unknown":
+                    result.update(status="unknown", error=entry.result)
+                else:
+                    result.update(status="failed", error="Concurrent attempt did not finish / Lần gửi song song chưa hoàn tất")
+                return result
+
+        def finish(state: str, outcome: Any = None) -> None:
+            if entry is not None:
+                order_ledger.finish(retailer, key, entry, state, outcome)
+        try:
+            created = client.post("/orders", body)
+        except httpx.HTTPStatusError as e:
+            # KiotViet answered, so the order was not created / KiotViet đã phản hồi lỗi nên đơn chưa được tạo
+            finish("failed")
+            result.update(status="failed", error=f"{e.response.status_code}: {e.response.text}")
+        except (httpx.ConnectError, RequestNotSent) as e:
+            # Request never reached KiotViet, the key can be retried / Request chưa tới KiotViet, có thể gửi lại khóa này
+            finish("failed")
+            result.update(status="failed", error=str(e))
+        except Exception as e:
+            # Sent without an answer: the order may exist, do not resend automatically
+            # Đã gửi nhưng không có phản hồi: đơn có thể đã tạo, không tự gửi lại
+            message = (
+                f"{e}. Order may have been created, check kv_list_orders before retrying with a new key"
+                f" / Đơn có thể đã được tạo, kiểm tra kv_list_orders trước khi thử lại với khóa mới"
+            )
+            finish("unknown", message)
+            result.update(status="unknown", error=message)
+        else:
+            finish("done", created)
+            result.update(status="created", order=created)
+        return result
+
+    results = map_bounded(submit, enumerate(orders), max_workers=max(1, min(max_concurrency, 10)))
+    invalidate_reads(retailer, "orders")
+    invalidate_reads(retailer, "counts")
+    summary: Dict[str, int] = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return {"results": results, "summary": summary}
+
+
+def _cached_product_by_code(client: KiotVietClient, retailer: str, code: str) -> Dict[str, Any]:
+    """Product by code, cached briefly since stock changes. / Sản phẩm theo mã, cache ngắn vì tồn kho thay đổi."""
+    return _cached(client, (retailer, "product_code", code), lambda: client.get(f"/products/code/{code}"), ttl=60.0)
+
+
+def _match_by_name(rows: List[Dict[str, Any]], field: str, name: str) -> List[Dict[str, Any]]:
+    """Exact (case-insensitive) matches, else substring matches. / Khớp chính xác (không phân biệt hoa thường), nếu không thì khớp chuỗi con."""
+    wanted = name.strip().lower()
+    exact = [r for r in rows if str(r.get(field, "")).strip().lower() == wanted]
+    return exact or [r for r in rows if wanted in str(r.get(field, "")).lower()]
+
+
+@mcp.tool
+@with_deadline(INTERACTIVE)
+def kv_prepare_order(
+    access_token: str,
+    retailer: str,
+    items: List[Dict[str, Any]],
+    branch_name: Optional[str] = None,
+    branch_id: Optional[int] = None,
+    customer_phone: Optional[str] = None,
+    customer_code: Optional[str] = None,
+    purchase_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Prepare an order draft from product codes/names, customer phone and branch name in one call.
+    Chuẩn bị bản nháp đơn hàng từ mã/tên sản phẩm, số điện thoại khách và tên chi nhánh trong một lần gọi.
+    Resolves branch, customer and products concurrently, checks prices and stock,
+    and returns the arguments for kv_create_order. Does not create the order.
+    Tra cứu chi nhánh, khách hàng, sản phẩm song song, kiểm tra giá và tồn kho,
+    và trả về tham số cho kv_create_order. Không tạo đơn hàng.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        items: List of products, each item includes: / Danh sách sản phẩm, mỗi item gồm:
+            - code or name: Product code or name / Mã hoặc tên sản phẩm
+            - quantity: Quantity (default 1) / Số lượng (mặc định 1)
+            - price (optional): Override the base price / Giá thay cho giá bán
+            - discount (optional): Discount / Giảm giá
+        branch_name: Branch name / Tên chi nhánh
+        branch_id: Branch ID (if known) / ID chi nhánh (nếu đã biết)
+        customer_phone: Customer phone number / Số điện thoại khách hàng
+        customer_code: Customer code / Mã khách hàng
+        purchase_date: Purchase date (format: YYYY-MM-DD, default today) / Ngày đặt hàng (format: YYYY-MM-DD, mặc định hôm nay)
+    
+    Returns:
+        ready: True when the draft can be passed to kv_create_order / True khi bản nháp có thể truyền cho kv_create_order
+        order: Arguments for kv_create_order / Tham số cho kv_create_order
+        lines: Resolved products with price, quantity, onHand / Sản phẩm đã tra cứu với giá, số lượng, tồn kho
+        errors, warnings: Problems found / Các vấn đề phát hiện
+    """
+    client = _create_client(access_token, retailer)
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    def resolve_branch() -> Optional[Dict[str, Any]]:
+        if branch_id is None and not branch_name:
+            return None
+        branches = _cached_branches(client, retailer)
+        if branch_id is not None:
+            matches = [b for b in branches if b.get("id") == branch_id]
+        else:
+            matches = _match_by_name(branches, "branchName", branch_name)
+        if len(matches) != 1:
+            names = ", ".join(str(b.get("branchName")) for b in (matches or branches))
+            errors.append(f"Branch not resolved ({branch_name or branch_id}), candidates: {names} / Không xác định được chi nhánh")
+            return None
+        return matches[0]
+
+    def resolve_customer() -> Optional[Dict[str, Any]]:
+        phone = _normalize_phone(customer_phone)
+        if not phone and not customer_code:
+            return None
+        # Use the customer index only if it is already loaded / Chỉ dùng chỉ mục khách hàng nếu đã được tải
+        index = reference_cache.get((retailer, "customer_index"))
+        if index is not None:
+            client.ensure_authenticated()
+            found = index["code"].get(customer_code) or index["phone"].get(phone)
+            if found is not None:
+                return found
+        if customer_code:
+            try:
+                return client.get(f"/customers/code/{customer_code}")
+            except httpx.HTTPStatusError as e:
+                # Only 404 means not found; other errors are reported as they are
+                # Chỉ 404 là không tìm thấy; lỗi khác được báo nguyên trạng
+                if e.response.status_code != 404:
+                    raise
+                rows = []
+        else:
+            rows = client.get("/customers", {"contactNumber": customer_phone, "pageSize": 5}).get("data") or []
+        if len(rows) != 1:
+            errors.append(
+                f"Customer not resolved ({customer_code or customer_phone}), {len(rows)} matches"
+                f" / Không xác định được khách hàng, {len(rows)} kết quả"
+            )
+            return None
+        return rows[0]
+
+    def resolve_product(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if item.get("code"):
+            try:
+                return _cached_product_by_code(client, retailer, item["code"])
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                errors.append(f"Product code not found: {item['code']} / Không tìm thấy mã sản phẩm")
+                return None
+        if item.get("name"):
+            rows = client.get("/products", {"name": item["name"], "pageSize": 10, "includeInventory": True}).get("data") or []
+            matches = _match_by_name(rows, "name", item["name"])
+            if len(matches) == 1:
+                return matches[0]
+            candidates = ", ".join(f"{r.get('code')} {r.get('name')}" for r in matches[:5])
+            errors.append(
+                f"Product name not resolved ({item['name']}): {len(matches)} matches {candidates}"
+                f" / Không xác định được sản phẩm theo tên"
+            )
+            return None
+        errors.append("Item needs code or name / Item cần có code hoặc name")
+        return None
+
+    tasks = [resolve_branch, resolve_customer] + [lambda item=item: resolve_product(item) for item in items]
+    branch, customer, *products = map_bounded(lambda task: task(), tasks, max_workers=6)
+
+    lines: List[Dict[str, Any]] = []
+    order_details: List[Dict[str, Any]] = []
+    total = 0.0
+    for item, product in zip(items, products):
+        if product is None:
+            continue
+        quantity = item.get("quantity", 1)
+        price = item.get("price", product.get("basePrice"))
+        line: Dict[str, Any] = {
+            "productId": product.get("id"),
+            "productCode": product.get("code"),
+            "productName": product.get("name"),
+            "quantity": quantity,
+            "price": price,
+        }
+        if branch is not None:
+            on_hand = sum(
+                inv.get("onHand") or 0 for inv in product.get("inventories") or [] if inv.get("branchId") == branch.get("id")
+            )
+            line["onHand"] = on_hand
+            if quantity > on_hand:
+                warnings.append(
+                    f"{product.get('code')}: quantity {quantity} exceeds stock {on_hand} / số lượng vượt tồn kho"
+                )
+        detail = {"productId": product.get("id"), "quantity": quantity, "price": price}
+        if item.get("discount") is not None:
+            detail["discount"] = item["discount"]
+        lines.append(line)
+        order_details.append(detail)
+        total += (price or 0) * quantity - (item.get("discount") or 0)
+    if branch is None and not any(e.startswith("Branch") for e in errors):
+        errors.append("branch_name or branch_id is required / Cần branch_name hoặc branch_id")
+
+    order: Dict[str, Any] = {
+        "branch_id": branch.get("id") if branch else None,
+        "purchase_date": purchase_date or date.today().isoformat(),
+        "order_details": order_details,
+    }
+    if customer is not None:
+        order["customer_id"] = customer.get("id")
+    return {
+        "ready": not errors,
+        "order": order,
+        "lines": lines,
+        "branch": {"id": branch.get("id"), "branchName": branch.get("branchName")} if branch else None,
+        "customer": {k: customer.get(k) for k in ("id", "code", "name", "contactNumber")} if customer else None,
+        "total": total,
+        "errors": errors,
+        "warnings": warnings,
+    }
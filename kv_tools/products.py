@@ -0,0 +1,145 @@
+"""
+Product tools / Công cụ Sản phẩm
+"""
+from typing import Any, Dict, List, Optional
+
+from kv_bulk import map_bounded
+from kv_deadline import ProgressCounter, with_deadline
+from kv_freshness import with_staleness
+from kv_scheduler import BULK, INTERACTIVE, NORMAL
+from kv_tools.common import _category_index, _create_client, mcp
+
+
+@mcp.tool
+@with_deadline(NORMAL)
+@with_staleness("products")
+def kv_list_products(
+    access_token: str,
+    retailer: str,
+    page_size: int = 50,
+    current_item: int = 0,
+    name: Optional[str] = None,
+    category_id: Optional[int] = None,
+    include_inventory: bool = True,
+    order_by: Optional[str] = None,
+    order_direction: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Get list of KiotViet products.
+    Lấy danh sách sản phẩm KiotViet.
+    Used when agent wants to look up products, reports, price consultation, inventory, etc.
+    Dùng khi agent muốn tra cứu hàng hóa, báo cáo, tư vấn giá, tồn kho,...
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        page_size: Number of items per page (default 50, max 100) / Số items trong 1 trang (mặc định 50, tối đa 100)
+        current_item: Get data from current record (default 0) / Lấy dữ liệu từ bản ghi hiện tại (mặc định 0)
+        name: Search by product name / Tìm kiếm theo tên sản phẩm
+        category_id: Filter by category ID / Lọc theo ID nhóm hàng
+        include_inventory: Whether to include inventory information / Có lấy thông tin tồn kho hay không
+        order_by: Sort by field (e.g., "name", "code") / Sắp xếp theo trường (ví dụ: "name", "code")
+        order_direction: Sort direction ("Asc" or "Desc") / Hướng sắp xếp ("Asc" hoặc "Desc")
+    """
+    client = _create_client(access_token, retailer)
+    params: Dict[str, Any] = {
+        "pageSize": min(page_size, 100),  # Max 100 / Tối đa 100
+        "currentItem": current_item,
+        "includeInventory": include_inventory,
+    }
+    if name:
+        params["name"] = name
+    if category_id:
+        params["categoryId"] = category_id
+    if order_by:
+        params["orderBy"] = order_by
+    if order_direction:
+        params["orderDirection"] = order_direction
+
+    return client.get("/products", params)
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("products")
+def kv_list_products_in_category(
+    access_token: str,
+    retailer: str,
+    category_id: Optional[int] = None,
+    category_name: Optional[str] = None,
+    name: Optional[str] = None,
+    include_inventory: bool = True,
+    max_rows: int = 2000,
+) -> Dict[str, Any]:
+    """
+    Get all products of a category including its sub-categories (whole subtree).
+    Lấy toàn bộ sản phẩm của một nhóm hàng kể cả các nhóm con (cả nhánh).
+    The subtree comes from the cached category tree; categories are fetched concurrently and merged.
+    Nhánh được lấy từ cây nhóm hàng có cache; các nhóm được lấy song song rồi gộp lại.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        category_id: Root category ID / ID nhóm hàng gốc
+        category_name: Root category name (if category_id is not provided) / Tên nhóm hàng gốc (nếu không có category_id)
+        name: Search by product name / Tìm kiếm theo tên sản phẩm
+        include_inventory: Whether to include inventory information / Có lấy thông tin tồn kho hay không
+        max_rows: Maximum rows returned (default 2000) / Số dòng tối đa trả về (mặc định 2000)
+    
+    Returns:
+        total: Number of products returned / Số sản phẩm trả về
+        truncated: True if max_rows was reached / True nếu đã chạm max_rows
+        categories: Category IDs of the subtree / ID các nhóm hàng trong nhánh
+        data: Products / Danh sách sản phẩm
+    """
+    client = _create_client(access_token, retailer)
+    index = _category_index(client, retailer)
+    category_ids = index.subtrees(index.resolve(category_id, category_name))
+    params: Dict[str, Any] = {"includeInventory": include_inventory}
+    if name:
+        params["name"] = name
+    progress = ProgressCounter(len(category_ids), "categories")
+
+    def fetch(cid: int) -> List[Dict[str, Any]]:
+        rows = client.get_all("/products", dict(params, categoryId=cid), max_workers=1, max_items=max_rows + 1)
+        progress.step()
+        return rows
+
+    seen = set()
+    rows: List[Dict[str, Any]] = []
+    for page in map_bounded(fetch, category_ids, max_workers=4):
+        for row in page:
+            if row.get("id") in seen:
+                continue
+            seen.add(row.get("id"))
+            rows.append(row)
+    truncated = len(rows) > max_rows
+    return {"total": min(len(rows), max_rows), "truncated": truncated, "categories": category_ids, "data": rows[:max_rows]}
+
+
+@mcp.tool
+@with_deadline(INTERACTIVE)
+@with_staleness("products")
+def kv_get_product(
+    access_token: str,
+    retailer: str,
+    product_id: Optional[int] = None,
+    product_code: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Get detailed information of a product by ID or product code.
+    Lấy thông tin chi tiết của một sản phẩm theo ID hoặc mã sản phẩm.
+    
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        product_id: Product ID / ID sản phẩm
+        product_code: Product code (if product_id is not provided) / Mã sản phẩm (nếu không có product_id)
+    """
+    client = _create_client(access_token, retailer)
+    if product_id:
+        return client.get(f"/products/{product_id}")
+    elif product_code:
+        return client.get(f"/products/code/{product_code}")
+    else:
+        raise ValueError("Need to provide product_id or product_code / Cần cung cấp product_id hoặc product_code")
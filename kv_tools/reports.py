@@ -0,0 +1,222 @@
+"""
+Report tools computed server-side / Công cụ báo cáo tính toán phía server
+"""
+import heapq
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from kv_analytics import AGING_BUCKETS, CANCELLED_INVOICE, RFMAccumulator, age_debt, parse_timestamp
+from kv_bulk import map_bounded
+from kv_deadline import with_deadline
+from kv_freshness import with_staleness
+from kv_reconcile import Reconciler
+from kv_scan import parse_date, scan
+from kv_scheduler import BULK
+from kv_tools.common import _create_client, mcp
+
+
+def _report_window(as_of: Optional[str], lookback_days: int) -> Tuple[Any, Any]:
+    """[as_of - lookback_days, end of as_of) / [as_of - lookback_days, hết ngày as_of)"""
+    end = parse_date(as_of or date.today().isoformat(), end=True)
+    return end - timedelta(days=max(lookback_days, 1)), end
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("reports")
+def kv_customer_receivables(
+    access_token: str,
+    retailer: str,
+    top_n: int = 20,
+    lookback_days: int = 365,
+    as_of: Optional[str] = None,
+    branch_ids: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """
+    Who owes us the most: customers with debt, aged by invoice date (0-30, 31-60, 61-90, over 90 days).
+    Ai nợ nhiều nhất: khách hàng còn nợ, phân theo tuổi nợ (0-30, 31-60, 61-90, trên 90 ngày).
+    Debt is matched to each customer's newest invoices first; debt older than the
+    lookback window counts as over 90 days. Only the top_n rows are returned.
+    Dư nợ được khớp với hóa đơn mới nhất của khách trước; phần nợ cũ hơn khoảng
+    lookback được tính là trên 90 ngày. Chỉ trả về top_n dòng.
+
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        top_n: Number of customers returned (default 20) / Số khách hàng trả về (mặc định 20)
+        lookback_days: Days of invoices scanned for aging (default 365) / Số ngày hóa đơn được quét để tính tuổi nợ (mặc định 365)
+        as_of: Report date (format: YYYY-MM-DD, default today) / Ngày báo cáo (format: YYYY-MM-DD, mặc định hôm nay)
+        branch_ids: Only age with invoices of these branches / Chỉ tính tuổi nợ theo hóa đơn của các chi nhánh này
+
+    Returns:
+        summary: total_debt, debtors, amount per aging bucket / tổng nợ, số khách nợ, số tiền theo nhóm tuổi nợ
+        data: Top customers by debt with code, name, contactNumber, debt, aging, oldestUnpaidDays
+        data: Khách nợ nhiều nhất gồm mã, tên, số điện thoại, dư nợ, tuổi nợ, số ngày nợ lâu nhất
+    """
+    client = _create_client(access_token, retailer)
+    # Only debtors are kept while customer pages stream in / Chỉ giữ khách còn nợ khi các trang khách hàng đổ về
+    debtors: Dict[Any, Dict[str, Any]] = {}
+
+    def keep_debtors(rows: List[Dict[str, Any]], _total: int) -> None:
+        for customer in rows:
+            if (customer.get("debt") or 0) > 0:
+                debtors[customer["id"]] = customer
+
+    client.get_all("/customers", {"includeTotal": True}, on_page=keep_debtors, collect=False)
+    start, end = _report_window(as_of, lookback_days)
+    invoices: Dict[Any, List[Tuple[Any, float]]] = {cid: [] for cid in debtors}
+
+    def fold(rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            purchased = parse_timestamp(row.get("purchaseDate"))
+            history = invoices.get(row.get("customerId"))
+            if history is not None and purchased is not None and row.get("status") != CANCELLED_INVOICE:
+                history.append((purchased, float(row.get("total") or 0)))
+
+    params: Dict[str, Any] = {"branchIds": branch_ids} if branch_ids else {}
+    if debtors:
+        scan(client, "/invoices", params, start, end, on_rows=fold, collect=False)
+
+    totals = {label: 0.0 for label, _ in AGING_BUCKETS}
+    rows: List[Dict[str, Any]] = []
+    for customer_id, customer in debtors.items():
+        buckets, oldest = age_debt(float(customer["debt"]), invoices[customer_id], end)
+        for label, amount in buckets.items():
+            totals[label] += amount
+        rows.append({
+            "customerId": customer_id,
+            "code": customer.get("code"),
+            "name": customer.get("name"),
+            "contactNumber": customer.get("contactNumber"),
+            "debt": customer["debt"],
+            "aging": buckets,
+            "oldestUnpaidDays": oldest,
+        })
+    top = heapq.nlargest(max(top_n, 0), rows, key=lambda row: row["debt"])
+    return {
+        "as_of": (end - timedelta(days=1)).date().isoformat(),
+        "summary": {
+            "total_debt": sum(row["debt"] for row in rows),
+            "debtors": len(rows),
+            "aging": totals,
+        },
+        "data": top,
+    }
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("reports")
+def kv_customer_rfm(
+    access_token: str,
+    retailer: str,
+    top_n: int = 20,
+    lookback_days: int = 365,
+    as_of: Optional[str] = None,
+    branch_ids: Optional[List[int]] = None,
+    segment: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Best customers by RFM (recency, frequency, monetary) computed from invoices.
+    Khách hàng tốt nhất theo RFM (gần đây, tần suất, giá trị) tính từ hóa đơn.
+    Each dimension is scored 1-5 by quintiles; segments: champions, loyal,
+    new_or_promising, at_risk, lost, needs_attention. Only the top_n rows are returned.
+    Mỗi tiêu chí được chấm 1-5 theo ngũ phân vị; phân khúc: champions, loyal,
+    new_or_promising, at_risk, lost, needs_attention. Chỉ trả về top_n dòng.
+
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        top_n: Number of customers returned (default 20) / Số khách hàng trả về (mặc định 20)
+        lookback_days: Days of invoices scanned (default 365) / Số ngày hóa đơn được quét (mặc định 365)
+        as_of: Report date (format: YYYY-MM-DD, default today) / Ngày báo cáo (format: YYYY-MM-DD, mặc định hôm nay)
+        branch_ids: Only invoices of these branches / Chỉ hóa đơn của các chi nhánh này
+        segment: Only return customers of this segment / Chỉ trả về khách hàng thuộc phân khúc này
+
+    Returns:
+        summary: customers, invoices, customers per segment, quintile cut points / số khách, số hóa đơn, số khách theo phân khúc, điểm cắt
+        data: Top customers by RFM score with r, f, m, rfm, score, segment / Khách hàng điểm RFM cao nhất
+    """
+    client = _create_client(access_token, retailer)
+    start, end = _report_window(as_of, lookback_days)
+    accumulator = RFMAccumulator()
+    params: Dict[str, Any] = {"branchIds": branch_ids} if branch_ids else {}
+    scan(client, "/invoices", params, start, end, on_rows=accumulator.add, collect=False)
+
+    rows, edges = accumulator.scores(end)
+    segments: Dict[str, int] = {}
+    for row in rows.values():
+        segments[row["segment"]] = segments.get(row["segment"], 0) + 1
+    candidates = [row for row in rows.values() if segment is None or row["segment"] == segment]
+    top = heapq.nlargest(max(top_n, 0), candidates, key=lambda row: (row["score"], row["monetary"]))
+    return {
+        "as_of": (end - timedelta(days=1)).date().isoformat(),
+        "summary": {
+            "customers": len(rows),
+            "invoices": accumulator.invoices,
+            "segments": segments,
+            "quintile_edges": edges,
+        },
+        "data": top,
+    }
+
+
+@mcp.tool
+@with_deadline(BULK)
+@with_staleness("reports")
+def kv_reconcile(
+    access_token: str,
+    retailer: str,
+    from_purchase_date: str,
+    to_purchase_date: str,
+    branch_ids: Optional[List[int]] = None,
+    invoice_grace_days: int = 7,
+    max_mismatches: int = 500,
+) -> Dict[str, Any]:
+    """
+    Reconcile orders against invoices in a date range and return only the mismatches.
+    Đối soát đơn hàng với hóa đơn trong khoảng ngày và chỉ trả về các chênh lệch.
+    Orders and invoices are scanned concurrently and joined on the order code.
+    Mismatch types: not_invoiced, amount_mismatch, unpaid, cancelled_order_invoiced,
+    invoice_without_order (its order is outside the range or missing).
+    Đơn hàng và hóa đơn được quét song song và nối theo mã đơn.
+    Loại chênh lệch: not_invoiced (chưa xuất hóa đơn), amount_mismatch (lệch tiền),
+    unpaid (chưa thanh toán), cancelled_order_invoiced (đơn hủy nhưng có hóa đơn),
+    invoice_without_order (đơn nằm ngoài khoảng ngày hoặc không tồn tại).
+
+    Args:
+        access_token: OAuth2 access token (provided by Culi) / Token OAuth2 (do Culi cung cấp)
+        retailer: KiotViet retailer name / Tên gian hàng KiotViet
+        from_purchase_date: From transaction date (format: YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS) / Từ ngày giao dịch (format: YYYY-MM-DD hoặc YYYY-MM-DDTHH:MM:SS)
+        to_purchase_date: To transaction date, inclusive for YYYY-MM-DD / Đến ngày giao dịch, tính cả ngày nếu là YYYY-MM-DD
+        branch_ids: Filter by list of branch IDs / Lọc theo danh sách ID chi nhánh
+        invoice_grace_days: Also match invoices issued this many days after the range (default 7) /
+            Khớp thêm hóa đơn xuất trong số ngày này sau khoảng ngày (mặc định 7)
+        max_mismatches: Maximum mismatch rows returned (default 500) / Số dòng chênh lệch tối đa trả về (mặc định 500)
+
+    Returns:
+        summary: orders, invoices, matched, count per mismatch type, totals (ordered, invoiced, paid, unpaid),
+            by_day_branch (days and branches with mismatches)
+        summary: số đơn, số hóa đơn, số đơn khớp, số chênh lệch theo loại, tổng tiền, by_day_branch (ngày/chi nhánh có chênh lệch)
+        data: One row per mismatch / Mỗi chênh lệch một dòng
+    """
+    client = _create_client(access_token, retailer)
+    start = parse_date(from_purchase_date)
+    end = parse_date(to_purchase_date, end=True)
+    if end <= start:
+        raise ValueError("to_purchase_date must be after from_purchase_date / to_purchase_date phải sau from_purchase_date")
+    params: Dict[str, Any] = {"branchIds": branch_ids} if branch_ids else {}
+    reconciler = Reconciler()
+    sides = [
+        ("/orders", end, reconciler.add_orders),
+        ("/invoices", end + timedelta(days=max(invoice_grace_days, 0)), reconciler.add_invoices),
+    ]
+    map_bounded(
+        lambda side: scan(client, side[0], params, start, side[1], on_rows=side[2], collect=False),
+        sides, max_workers=2,
+    )
+    return {
+        "from": from_purchase_date,
+        "to": to_purchase_date,
+        **reconciler.result(end, max(max_mismatches, 0)),
+    }
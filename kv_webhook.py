@@ -0,0 +1,228 @@
+"""
+Optional HTTP receiver for KiotViet webhooks, running next to the MCP transport.
+Events are verified, queued in a bounded queue and applied to the caches in batches.
+
+Receiver HTTP tùy chọn cho webhook KiotViet, chạy song song với MCP transport.
+Sự kiện được xác thực, đưa vào hàng đợi có giới hạn và áp dụng vào cache theo lô.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+
+class WebhookEvent:
+    """
+    One notification of a webhook request.
+    Một notification trong request webhook.
+    entity/action/retailer_id come from KiotViet's "Action"
+    ("product.update.<retailerId>" -> "product", "update", "<retailerId>").
+    entity/action/retailer_id lấy từ "Action" của KiotViet
+    ("product.update.<retailerId>" -> "product", "update", "<retailerId>").
+    """
+
+    __slots__ = ("retailer", "entity", "action", "data", "retailer_id")
+
+    def __init__(self, retailer: str, entity: str, action: str, data: List[Dict[str, Any]],
+                 retailer_id: Optional[str] = None):
+        self.retailer = retailer
+        self.entity = entity
+        self.action = action
+        self.data = data
+        self.retailer_id = retailer_id
+
+
+def sign(secret: str, body: bytes) -> str:
+    """HMAC-SHA256 signature of a body, base64-encoded. / Chữ ký HMAC-SHA256 của body, mã hóa base64."""
+    return base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode("ascii")
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Check a signature header, accepting base64 or hex digests with an optional "sha256=" prefix.
+    Kiểm tra header chữ ký, chấp nhận digest base64 hoặc hex, có thể có tiền tố "sha256=".
+    """
+    if not signature:
+        return False
+    signature = signature.strip()
+    if signature.lower().startswith("sha256="):
+        signature = signature[len("sha256="):]
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()
+    return hmac.compare_digest(signature, base64.b64encode(digest).decode("ascii")) or hmac.compare_digest(
+        signature.lower(), digest.hex()
+    )
+
+
+def parse_events(retailer: str, payload: Dict[str, Any]) -> List[WebhookEvent]:
+    """Split a webhook payload into events. / Tách payload webhook thành các sự kiện."""
+    events = []
+    for notification in payload.get("Notifications") or []:
+        parts = str(notification.get("Action", "")).split(".")
+        if len(parts) < 2:
+            continue
+        events.append(WebhookEvent(
+            retailer, parts[0].lower(), parts[1].lower(), notification.get("Data") or [],
+            parts[2] if len(parts) > 2 else None,
+        ))
+    return events
+
+
+def parse_retailer_ids(value: str) -> Dict[str, str]:
+    """
+    Parse "retailer:retailerId,..." into {retailer: retailerId}.
+    Tách "retailer:retailerId,..." thành {retailer: retailerId}.
+    """
+    retailer_ids = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        retailer, sep, retailer_id = item.partition(":")
+        if not sep or not retailer.strip() or not retailer_id.strip():
+            raise ValueError(
+                f"Invalid retailer mapping '{item}', expected retailer:retailerId"
+                f" / Ánh xạ gian hàng '{item}' không hợp lệ, cần dạng retailer:retailerId"
+            )
+        retailer_ids[retailer.strip()] = retailer_id.strip()
+    return retailer_ids
+
+
+class WebhookReceiver:
+    """
+    Receives POST /webhooks/<retailer>, verifies X-Hub-Signature and queues the events.
+    Nhận POST /webhooks/<retailer>, xác thực X-Hub-Signature và đưa sự kiện vào hàng đợi.
+    The retailer in the path must be configured and every notification must carry
+    its KiotViet retailer id, so a signed payload cannot be replayed to another tenant.
+    Gian hàng trên đường dẫn phải được cấu hình và mọi notification phải mang đúng
+    retailer id KiotViet của nó, nên payload đã ký không thể gửi lại cho gian hàng khác.
+    When the queue is full the request gets 503 so KiotViet retries later (back-pressure).
+    Khi hàng đợi đầy, request nhận 503 để KiotViet gửi lại sau (back-pressure).
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        retailer_ids: Dict[str, str],
+        apply_batch: Callable[[List[WebhookEvent]], None],
+        host: str = "127.0.0.1",
+        port: int = 8090,
+        max_queue: int = 1000,
+        batch_size: int = 100,
+        batch_wait: float = 0.5,
+        max_body: int = 1024 * 1024,
+    ):
+        """
+        Args:
+            secret: Shared secret registered with the webhook / Secret đã đăng ký với webhook
+            retailer_ids: {retailer name: KiotViet retailer id} accepted by the receiver /
+                {tên gian hàng: retailer id KiotViet} được receiver chấp nhận
+            apply_batch: Called with a list of events from the worker thread / Được gọi với danh sách sự kiện từ worker thread
+            host, port: Listen address / Địa chỉ lắng nghe
+            max_queue: Maximum queued requests before answering 503 / Số request tối đa trong hàng đợi trước khi trả 503
+            batch_size: Maximum requests applied per batch / Số request tối đa áp dụng mỗi lô
+            batch_wait: Seconds to wait for more requests before applying a batch / Số giây chờ thêm request trước khi áp dụng lô
+            max_body: Largest accepted body in bytes, larger requests get 413 / Kích thước body tối đa (byte), lớn hơn nhận 413
+        """
+        self.secret = secret
+        self.retailer_ids = retailer_ids
+        self.max_body = max_body
+        self.apply_batch = apply_batch
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue: "queue.Queue[List[WebhookEvent]]" = queue.Queue(maxsize=max_queue)
+        self.stats = {"received": 0, "rejected": 0, "throttled": 0, "applied": 0, "failed": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def address(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self) -> type:
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _reply(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                parts = self.path.split("?", 1)[0].strip("/").split("/")
+                if len(parts) != 2 or parts[0] != "webhooks" or parts[1] not in receiver.retailer_ids:
+                    return self._reply(404, {"error": "not found"})
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    receiver.stats["rejected"] += 1
+                    return self._reply(400, {"error": "invalid Content-Length"})
+                # Checked before reading, the signature needs the whole body / Kiểm tra trước khi đọc, vì chữ ký cần cả body
+                if length < 0 or length > receiver.max_body:
+                    receiver.stats["rejected"] += 1
+                    self.close_connection = True
+                    return self._reply(413, {"error": "payload too large"})
+                body = self.rfile.read(length)
+                if not verify_signature(receiver.secret, body, self.headers.get("X-Hub-Signature")):
+                    receiver.stats["rejected"] += 1
+                    return self._reply(401, {"error": "invalid signature"})
+                try:
+                    events = parse_events(parts[1], json.loads(body))
+                except (ValueError, AttributeError):
+                    receiver.stats["rejected"] += 1
+                    return self._reply(400, {"error": "invalid payload"})
+                if any(event.retailer_id != receiver.retailer_ids[parts[1]] for event in events):
+                    receiver.stats["rejected"] += 1
+                    return self._reply(403, {"error": "retailer mismatch"})
+                try:
+                    receiver.queue.put_nowait(events)
+                except queue.Full:
+                    receiver.stats["throttled"] += 1
+                    return self._reply(503, {"error": "busy"}, {"Retry-After": "5"})
+                receiver.stats["received"] += 1
+                self._reply(200, {"queued": len(events)})
+
+        return Handler
+
+    def start(self) -> "WebhookReceiver":
+        """Start the HTTP server and the batch worker. / Khởi động HTTP server và worker xử lý lô."""
+        for target, name in ((self._server.serve_forever, "kv-webhook-http"), (self._run_worker, "kv-webhook-worker")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _run_worker(self) -> None:
+        while True:
+            batch = list(self.queue.get())
+            requests = 1
+            try:
+                while requests < self.batch_size:
+                    batch.extend(self.queue.get(timeout=self.batch_wait))
+                    requests += 1
+            except queue.Empty:
+                pass
+            try:
+                self.apply_batch(batch)
+                self.stats["applied"] += len(batch)
+            except Exception:
+                self.stats["failed"] += len(batch)
+            finally:
+                for _ in range(requests):
+                    self.queue.task_done()
+
+    def stop(self) -> None:
+        """Stop the HTTP server. / Dừng HTTP server."""
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,130 @@
+"""
+Startup benchmark: import time of kiotviet_mcp_server and time to the first
+tools/list response over stdio, checked against a budget.
+Benchmark khởi động: thời gian import kiotviet_mcp_server và thời gian tới phản
+hồi tools/list đầu tiên qua stdio, so với ngân sách cho phép.
+
+Usage / Cách dùng:
+    python tests/bench_startup.py [--runs 5] [--output bench_output.txt]
+
+Budgets (milliseconds, median of the runs) / Ngân sách (mili giây, trung vị các lần chạy):
+    KIOTVIET_BUDGET_IMPORT_MS      (default 1500)
+    KIOTVIET_BUDGET_TOOLS_LIST_MS  (default 2000)
+Exits with code 1 when a budget is exceeded / Thoát với mã 1 khi vượt ngân sách.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, "kiotviet_mcp_server.py")
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import kiotviet_mcp_server; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def measure_import() -> float:
+    """Import time in a fresh interpreter (ms). / Thời gian import trong interpreter mới (ms)."""
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _send(process: subprocess.Popen, message: Dict[str, Any]) -> None:
+    process.stdin.write(json.dumps(message) + "\n")
+    process.stdin.flush()
+
+
+def _receive(process: subprocess.Popen, request_id: int) -> Dict[str, Any]:
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("Server exited before answering / Server thoát trước khi phản hồi")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            return message
+
+
+def measure_tools_list() -> Dict[str, float]:
+    """
+    Spawn the server over stdio and time initialize + tools/list (ms, from process start).
+    Chạy server qua stdio và đo initialize + tools/list (ms, tính từ lúc khởi động tiến trình).
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, SERVER], cwd=ROOT, text=True,
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+    )
+    try:
+        _send(process, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-06-18",
+                "capabilities": {},
+                "clientInfo": {"name": "bench_startup", "version": "1"},
+            },
+        })
+        _receive(process, 1)
+        initialized = (time.perf_counter() - started) * 1000
+        _send(process, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        _send(process, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        tools = _receive(process, 2)["result"]["tools"]
+        return {
+            "initialize_ms": initialized,
+            "tools_list_ms": (time.perf_counter() - started) * 1000,
+            "tools": len(tools),
+        }
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Also write the report to this file / Ghi thêm báo cáo ra file")
+    args = parser.parse_args()
+
+    budgets = {
+        "import_ms": float(os.getenv("KIOTVIET_BUDGET_IMPORT_MS", "1500")),
+        "tools_list_ms": float(os.getenv("KIOTVIET_BUDGET_TOOLS_LIST_MS", "2000")),
+    }
+    imports: List[float] = []
+    startups: List[Dict[str, float]] = []
+    for _ in range(args.runs):
+        imports.append(measure_import())
+        startups.append(measure_tools_list())
+
+    results = {
+        "import_ms": statistics.median(imports),
+        "initialize_ms": statistics.median(s["initialize_ms"] for s in startups),
+        "tools_list_ms": statistics.median(s["tools_list_ms"] for s in startups),
+    }
+    lines = [f"runs: {args.runs}, tools: {startups[-1]['tools']}"]
+    failed = False
+    for name, value in results.items():
+        budget = budgets.get(name)
+        status = ""
+        if budget is not None:
+            over = value > budget
+            failed = failed or over
+            status = f"  (budget {budget:.0f} ms: {'OVER' if over else 'ok'})"
+        lines.append(f"{name}: {value:.0f} ms{status}")
+    report = "\n".join(lines)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
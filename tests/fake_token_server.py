@@ -0,0 +1,56 @@
+"""
+Token endpoint giả lập local để test chế độ token provider mà không gọi id.kiotviet.vn.
+
+Usage:
+    python tests/fake_token_server.py [port]        # Mặc định port 8095
+
+Biến môi trường:
+    CLIENT_ID, CLIENT_SECRET   Credentials được chấp nhận (giống server)
+    FAKE_TOKEN_EXPIRES_IN      Thời hạn token trả về, tính bằng giây (mặc định 86400)
+
+Sau đó chạy server với KIOTVIET_TOKEN_URL=http://127.0.0.1:<port>/connect/token.
+"""
+import json
+import os
+import secrets
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class TokenHandler(BaseHTTPRequestHandler):
+    """Trả token client_credentials giống id.kiotviet.vn."""
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        if self.path.split("?", 1)[0] != "/connect/token":
+            return self._reply(404, {"error": "not_found"})
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8"))
+        client_id = (form.get("client_id") or [""])[0]
+        client_secret = (form.get("client_secret") or [""])[0]
+        if (form.get("grant_type") or [""])[0] != "client_credentials":
+            return self._reply(400, {"error": "unsupported_grant_type"})
+        if client_id != os.getenv("CLIENT_ID") or client_secret != os.getenv("CLIENT_SECRET"):
+            return self._reply(400, {"error": "invalid_client"})
+        expires_in = int(os.getenv("FAKE_TOKEN_EXPIRES_IN", "86400"))
+        token = f"fake-{secrets.token_hex(8)}"
+        print(f"Cấp token {token} cho {client_id} ({expires_in}s)")
+        self._reply(200, {"access_token": token, "expires_in": expires_in, "token_type": "Bearer"})
+
+
+if __name__ == "__main__":
+    if not os.getenv("CLIENT_ID") or not os.getenv("CLIENT_SECRET"):
+        print("Usage: python tests/fake_token_server.py [port]")
+        print("   cần set CLIENT_ID và CLIENT_SECRET giống server")
+        sys.exit(1)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8095
+    server = ThreadingHTTPServer(("127.0.0.1", port), TokenHandler)
+    print(f"Token endpoint giả lập: http://127.0.0.1:{port}/connect/token")
+    server.serve_forever()
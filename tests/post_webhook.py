@@ -0,0 +1,45 @@
+"""
+Script để gửi payload webhook mẫu tới webhook receiver chạy local.
+
+Usage:
+    python tests/post_webhook.py <retailer> [file.json ...]
+
+Biến môi trường:
+    KIOTVIET_WEBHOOK_SECRET   Secret dùng để ký payload (giống server)
+    KIOTVIET_WEBHOOK_URL      Mặc định http://127.0.0.1:8090
+
+Các file mẫu dùng retailerId 500000001, server cần KIOTVIET_WEBHOOK_RETAILERS=<retailer>:500000001.
+"""
+import httpx
+import os
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from kv_webhook import sign
+
+SAMPLES_DIR = Path(__file__).parent / "webhook_samples"
+
+
+def post_sample(url: str, retailer: str, secret: str, path: Path) -> None:
+    """Ký và gửi một file payload."""
+    body = path.read_bytes()
+    headers = {"Content-Type": "application/json", "X-Hub-Signature": sign(secret, body)}
+    resp = httpx.post(f"{url}/webhooks/{retailer}", content=body, headers=headers, timeout=10)
+    print(f"{path.name}: {resp.status_code} {resp.text}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    secret = os.getenv("KIOTVIET_WEBHOOK_SECRET")
+    if not args or not secret:
+        print("Usage: python tests/post_webhook.py <retailer> [file.json ...]")
+        print("   cần set KIOTVIET_WEBHOOK_SECRET giống server")
+        sys.exit(1)
+
+    url = os.getenv("KIOTVIET_WEBHOOK_URL", "http://127.0.0.1:8090")
+    files = [Path(a) for a in args[1:]] or sorted(SAMPLES_DIR.glob("*.json"))
+    for path in files:
+        post_sample(url, args[0], secret, path)
@@ -0,0 +1,33 @@
+"""
+Unit test cho chấm điểm RFM (không cần KiotViet).
+
+Usage:
+    python -m pytest tests/test_analytics.py
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from kv_analytics import quantile_edges, score
+
+
+def test_distinct_values_split_into_equal_groups():
+    values = list(range(1, 11))
+    edges = quantile_edges(values)
+    assert [score(v, edges) for v in values] == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+
+
+def test_ties_get_the_lowest_score():
+    # 70 khách mua 1 lần, 20 khách mua 2 lần, 10 khách mua 5 lần
+    frequency = [1] * 70 + [2] * 20 + [5] * 10
+    edges = quantile_edges(frequency)
+    assert score(1, edges) == 1
+    assert score(2, edges) == 4
+    assert score(5, edges) == 5
+
+
+def test_all_equal_values_score_one():
+    edges = quantile_edges([3] * 50)
+    assert score(3, edges) == 1
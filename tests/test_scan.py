@@ -0,0 +1,45 @@
+"""
+Unit test cho việc chia cửa sổ quét (không cần KiotViet).
+
+Usage:
+    python -m pytest tests/test_scan.py
+"""
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from kv_scan import _split
+
+
+def test_aligned_days_split_at_midnight():
+    assert _split(datetime(2024, 1, 1), datetime(2024, 1, 5)) == [
+        (datetime(2024, 1, 1), datetime(2024, 1, 3)),
+        (datetime(2024, 1, 3), datetime(2024, 1, 5)),
+    ]
+
+
+def test_unaligned_window_under_two_days_is_split():
+    start, end = datetime(2024, 1, 1, 8), datetime(2024, 1, 2, 20)
+    assert _split(start, end) == [(start, datetime(2024, 1, 2)), (datetime(2024, 1, 2), end)]
+
+
+def test_unaligned_halves_keep_splitting_down_to_an_hour():
+    pending = [(datetime(2024, 1, 1, 8), datetime(2024, 1, 10, 20, 30))]
+    leaves = []
+    while pending:
+        start, end = pending.pop()
+        halves = _split(start, end)
+        if len(halves) == 1:
+            leaves.append((start, end))
+        else:
+            assert halves[0][0] == start and halves[0][1] == halves[1][0] and halves[1][1] == end
+            pending.extend(halves)
+    assert all(end - start <= datetime(2024, 1, 1, 1) - datetime(2024, 1, 1) for start, end in leaves)
+
+
+def test_window_of_one_hour_is_not_split():
+    start, end = datetime(2024, 1, 1, 8, 30), datetime(2024, 1, 1, 9, 30)
+    assert _split(start, end) == [(start, end)]